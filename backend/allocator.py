@@ -0,0 +1,271 @@
+import os
+import uuid
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timedelta, date
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text, func
+from sqlalchemy.orm import Session
+
+import database
+import models
+from deadline_scheduler import acquire_lease, release_lease
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+WORK_UNIT_IMAGES = int(os.getenv("WORK_UNIT_IMAGES", 100)) # Auto-assigned uploads are split into projects of this size
+ALLOCATOR_INTERVAL_SECONDS = int(os.getenv("ALLOCATOR_INTERVAL_SECONDS", 60))
+ALLOCATOR_MAX_OPEN_UNITS = int(os.getenv("ALLOCATOR_MAX_OPEN_UNITS", 2)) # Unfinalized projects one annotator may hold
+ALLOCATOR_ACTIVE_DAYS = int(os.getenv("ALLOCATOR_ACTIVE_DAYS", 3)) # Only annotators who logged in this recently get new work
+ALLOCATOR_STATS_DAYS = 14
+ALLOCATOR_MIN_ELAPSED = 0.25 # Share of a unit's time window that must pass before its pace is judged
+ALLOCATOR_MIN_SPLIT_IMAGES = 10 # Smaller shortfalls are left with the assignee
+ALLOCATOR_LEASE_SECONDS = 300
+DEFAULT_IMAGES_PER_HOUR = 60.0 # Throughput prior for annotators without timed work
+ALLOCATOR_MIN_TIMED_IMAGES = 50 # Measured throughput is blended with the prior until this many images were timed
+ALLOCATOR_MAX_IMAGES_PER_HOUR = 600.0 # Six seconds an image; faster measurements are timer noise
+DEFAULT_QUALITY = 0.8 # Quality prior for annotators without scores or decisions
+
+_OPEN_LOAD_SQL = """
+    SELECT p.assigned_to_id, COUNT(DISTINCT p.id), COUNT(i.id) - COUNT(a.id)
+    FROM projects p JOIN images i ON i.project_id = p.id
+    LEFT JOIN assignments a ON a.image_id = i.id AND a.user_id = p.assigned_to_id
+    WHERE p.is_finalized = 0 AND p.assigned_to_id IS NOT NULL
+    GROUP BY p.assigned_to_id"""
+
+_UNIT_PROGRESS_SQL = """
+    SELECT p.id, p.assigned_to_id, p.assigned_at, p.deadline, p.is_finalized, COUNT(i.id), COUNT(a.id)
+    FROM projects p JOIN images i ON i.project_id = p.id
+    LEFT JOIN assignments a ON a.image_id = i.id AND a.user_id = p.assigned_to_id
+    WHERE p.auto_assign = 1 AND p.is_approved = 0 AND p.assigned_to_id IS NOT NULL AND p.deadline IS NOT NULL
+      AND (p.status IS NULL OR p.status != 'REJECTED')
+    GROUP BY p.id"""
+
+# Only images nobody has labelled move: co-annotator labels stay with the unit they are paid and scored on
+_UNLABELLED_SQL = """
+    SELECT i.id FROM images i
+    WHERE i.project_id = :pid AND NOT EXISTS (SELECT 1 FROM assignments a WHERE a.image_id = i.id)
+    ORDER BY i.sequence_index DESC LIMIT :n"""
+
+
+def work_unit_position(batch_id: str, index: int, total: int, unit_size: int) -> Tuple[str, int]:
+    """(project id, sequence index) of the index-th image of an upload split into units of unit_size."""
+    if unit_size <= 0 or total <= unit_size: return batch_id, index + 1
+    return f"{batch_id}-U{index // unit_size + 1:02d}", index % unit_size + 1
+
+
+def blended_images_per_hour(timed: int, seconds: float) -> float:
+    """Measured throughput, clamped, weighted against DEFAULT_IMAGES_PER_HOUR by how many images were timed."""
+    if not timed or not seconds: return DEFAULT_IMAGES_PER_HOUR
+    measured = min(timed / (seconds / 3600), ALLOCATOR_MAX_IMAGES_PER_HOUR)
+    weight = min(timed / ALLOCATOR_MIN_TIMED_IMAGES, 1.0)
+    return weight * measured + (1 - weight) * DEFAULT_IMAGES_PER_HOUR
+
+
+def _score(profile: Dict[str, Any]) -> float:
+    return profile["quality"] * profile["images_per_hour"] / (1 + profile["open_images"] / WORK_UNIT_IMAGES)
+
+
+def annotator_profiles(db: Session, now: datetime) -> Dict[str, Dict[str, Any]]:
+    """Active annotators with throughput, quality and current load, read with four grouped queries."""
+    employees = db.query(models.Employee.id, models.Employee.username).filter(
+        models.Employee.role == "EMPLOYEE", models.Employee.status == "ACTIVE",
+        models.Employee.last_login >= now - timedelta(days=ALLOCATOR_ACTIVE_DAYS)
+    ).all()
+    profiles = {e.id: {"employee_id": e.id, "username": e.username, "images_per_hour": DEFAULT_IMAGES_PER_HOUR,
+                       "quality": DEFAULT_QUALITY, "open_units": 0, "open_images": 0} for e in employees}
+    if not profiles: return profiles
+
+    s = models.EmployeeDailyStat
+    stats = db.query(s.employee_id, func.sum(s.timed_images), func.sum(s.time_spent_seconds), func.sum(s.approvals), func.sum(s.rejections)).filter(
+        s.day >= date.today() - timedelta(days=ALLOCATOR_STATS_DAYS)).group_by(s.employee_id).all()
+    for employee_id, timed, seconds, approvals, rejections in stats:
+        p = profiles.get(employee_id)
+        if not p: continue
+        p["images_per_hour"] = round(blended_images_per_hour(timed, seconds), 2)
+        if approvals or rejections: p["quality"] = (approvals or 0) / ((approvals or 0) + (rejections or 0))
+
+    # Scored quality (quality_engine) outranks approval rate: gold accuracy first, then agreement
+    q = models.AnnotatorQuality
+    scored = db.query(q.user_id, func.sum(q.gold_accuracy * q.gold_items), func.sum(q.gold_items), func.sum(q.agreement * q.items), func.sum(q.items)).group_by(q.user_id).all()
+    for user_id, correct, gold_items, agree, items in scored:
+        p = profiles.get(user_id)
+        if not p: continue
+        if gold_items: p["quality"] = correct / gold_items
+        elif items: p["quality"] = agree / items
+
+    for user_id, units, remaining in db.execute(text(_OPEN_LOAD_SQL)):
+        if user_id in profiles: profiles[user_id].update(open_units=units, open_images=remaining)
+    for p in profiles.values():
+        p["score"] = round(_score(p), 4)
+    return profiles
+
+
+def ranked_annotators(db: Session) -> List[Dict[str, Any]]:
+    return sorted(annotator_profiles(db, datetime.now()).values(), key=lambda p: -p["score"])
+
+
+def rebalance_units(db: Session, now: datetime) -> List[Dict[str, Any]]:
+    """
+    Splits the unlabelled tail off auto-assigned units that will miss (or have missed) their deadline.
+
+    A unit past its deadline gives up every image nobody has labelled. An open unit whose pace so far
+    (labelled images per hour since assignment) cannot finish in the remaining time keeps what that
+    pace covers; the rest moves to a new unassigned unit for the allocator. Each move re-checks that
+    the image is still unlabelled, so a label submitted meanwhile keeps its image in place.
+    """
+    splits = []
+    for project_id, assignee, assigned_at, deadline, is_finalized, total, done in db.execute(text(_UNIT_PROGRESS_SQL)).fetchall():
+        deadline = deadline if isinstance(deadline, datetime) else datetime.fromisoformat(deadline)
+        assigned_at = assigned_at if isinstance(assigned_at, datetime) or assigned_at is None else datetime.fromisoformat(assigned_at)
+        remaining = total - done
+        if remaining < ALLOCATOR_MIN_SPLIT_IMAGES: continue
+        if deadline <= now:
+            if not is_finalized: continue # The deadline scheduler locks it first; the next cycle picks it up
+            surplus = remaining
+        elif is_finalized or assigned_at is None:
+            continue
+        else:
+            window = (deadline - assigned_at).total_seconds()
+            elapsed = (now - assigned_at).total_seconds()
+            if window <= 0 or elapsed < window * ALLOCATOR_MIN_ELAPSED: continue
+            pace = done / (elapsed / 3600)
+            surplus = remaining - int(pace * (deadline - now).total_seconds() / 3600)
+        if surplus < ALLOCATOR_MIN_SPLIT_IMAGES: continue
+
+        image_ids = [r[0] for r in db.execute(text(_UNLABELLED_SQL), {"pid": project_id, "n": surplus})][::-1]
+        if len(image_ids) < ALLOCATOR_MIN_SPLIT_IMAGES: continue # The rest carries co-annotator labels
+        project = db.query(models.Project).filter(models.Project.id == project_id).first()
+        base = project_id.rsplit("-S", 1)[0] if project.split_from_id else project_id # Splits of a split stay one level deep
+        unit_id = f"{base}-S{uuid.uuid4().hex[:4].upper()}"
+        db.add(models.Project(id=unit_id, salary_per_completion=project.salary_per_completion, security_amount=0.0,
+                              time_limit_hours=project.time_limit_hours, auto_assign=True, split_from_id=project_id))
+        db.flush()
+        moved = db.execute(text("""
+            UPDATE images SET project_id = :unit, sequence_index = :seq WHERE id = :id AND project_id = :pid
+              AND NOT EXISTS (SELECT 1 FROM assignments a WHERE a.image_id = images.id)"""),
+            [{"unit": unit_id, "seq": n + 1, "id": image_id, "pid": project_id} for n, image_id in enumerate(image_ids)]).rowcount
+        if moved == 0:
+            db.query(models.Project).filter(models.Project.id == unit_id).delete(synchronize_session=False); continue
+        if moved < len(image_ids): # Some were labelled meanwhile; close the gaps they left in the sequence
+            kept = [r[0] for r in db.execute(text("SELECT id FROM images WHERE project_id = :unit ORDER BY sequence_index"), {"unit": unit_id})]
+            db.execute(text("UPDATE images SET sequence_index = :seq WHERE id = :id"), [{"seq": n + 1, "id": i} for n, i in enumerate(kept)])
+        splits.append({"from": project_id, "unit": unit_id, "images": moved, "assignee": assignee, "missed_deadline": deadline <= now})
+        logger.info(f"Rebalanced {moved} images from {project_id} to {unit_id}")
+    return splits
+
+
+def assign_units(db: Session, now: datetime) -> List[Dict[str, Any]]:
+    """
+    Hands unassigned auto-assign units to the best-ranked annotators with spare capacity.
+
+    Annotators sit in a max-heap by score; each assignment adds the unit to their load, so they are
+    re-pushed with a lower score and work spreads across the team instead of piling on one person.
+    """
+    units = db.execute(text("""
+        SELECT p.id, p.split_from_id, p.time_limit_hours, COUNT(i.id) FROM projects p JOIN images i ON i.project_id = p.id
+        WHERE p.auto_assign = 1 AND p.assigned_to_id IS NULL AND p.is_approved = 0
+        GROUP BY p.id ORDER BY p.id""")).fetchall()
+    if not units: return []
+    profiles = annotator_profiles(db, now)
+    heap = [(-p["score"], user_id) for user_id, p in profiles.items() if p["open_units"] < ALLOCATOR_MAX_OPEN_UNITS]
+    heapq.heapify(heap)
+    split_sources = dict(db.query(models.Project.id, models.Project.assigned_to_id).filter(
+        models.Project.id.in_([u[1] for u in units if u[1]])).all())
+
+    assigned = []
+    for unit_id, split_from, hours, images in units:
+        skipped, choice = [], None
+        while heap:
+            entry = heapq.heappop(heap)
+            if entry[1] == split_sources.get(split_from): # Not back to the annotator who fell behind on it
+                skipped.append(entry); continue
+            choice = entry[1]; break
+        for entry in skipped: heapq.heappush(heap, entry)
+        if choice is None: break
+
+        deadline = now + timedelta(hours=hours or 48)
+        claimed = db.query(models.Project).filter(models.Project.id == unit_id, models.Project.assigned_to_id == None).update(
+            {"assigned_to_id": choice, "assigned_at": now, "deadline": deadline, "is_finalized": False, "status": "IN_PROGRESS"},
+            synchronize_session=False)
+        profile = profiles[choice]
+        if claimed:
+            assigned.append({"project_id": unit_id, "employee_id": choice, "username": profile["username"], "images": images, "deadline": deadline})
+            profile["open_units"] += 1; profile["open_images"] += images
+            profile["score"] = round(_score(profile), 4)
+        if profile["open_units"] < ALLOCATOR_MAX_OPEN_UNITS: heapq.heappush(heap, (-profile["score"], choice))
+    return assigned
+
+
+def run_allocation_cycle(owner: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Rebalances slipping units, then assigns open ones. Returns None when another process is mid-cycle."""
+    owner = owner or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+    if not acquire_lease(WorkAllocator.LEASE_NAME, owner, ALLOCATOR_LEASE_SECONDS): return None
+    db = database.SessionLocal()
+    try:
+        now = datetime.now()
+        splits = rebalance_units(db, now)
+        db.commit()
+        assigned = assign_units(db, now)
+        db.commit()
+        return {"split": splits, "assigned": assigned}
+    finally:
+        db.close()
+        release_lease(WorkAllocator.LEASE_NAME, owner)
+
+
+class WorkAllocator:
+    """
+    Runs allocation cycles every ALLOCATOR_INTERVAL_SECONDS, or sooner after `wake()` (e.g. an upload).
+
+    Each cycle holds the DB lease, so with several API workers only one allocates at a time.
+    `on_assigned(assignment)` is called on the event loop for every unit handed out.
+    """
+
+    LEASE_NAME = "work_allocator"
+
+    def __init__(self, on_assigned: Optional[Callable[[Dict[str, Any]], None]] = None, interval: int = ALLOCATOR_INTERVAL_SECONDS):
+        self.on_assigned = on_assigned
+        self.interval = interval
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.last_cycle: Optional[Dict[str, Any]] = None
+        self._wakeup = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.interval <= 0: return
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Runs a cycle now. Safe to call from sync route handlers running in the threadpool."""
+        if self._loop is not None: self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def _run(self):
+        while True:
+            try:
+                result = await asyncio.to_thread(run_allocation_cycle, self.owner)
+                if result is not None:
+                    self.last_cycle = {**result, "at": datetime.now()}
+                    for assignment in result["assigned"]:
+                        if self.on_assigned: self.on_assigned(assignment)
+            except Exception as e:
+                logger.error(f"Work Allocator Error: {e}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+from typing import Optional, List, Dict, Any
+
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import database
+import models
+
+# Wallet credits that count as earnings
+EARNING_TYPES = ("PROJECT_PAYOUT", "LOGIN_BONUS", "CHALLENGE_REWARD")
+STAT_FIELDS = ("earnings", "images_completed", "approvals", "rejections", "time_spent_seconds", "timed_images")
+SERIES_DAYS = (7, 30, 90)
+
+
+def record_daily_stat(db: Session, employee_id: str, day: Optional[date] = None, **increments):
+    """
+    Adds increments to the employee's rollup row for the day (upsert, no commit).
+    Days are local calendar days, the clock rebuild_daily_stats and build_series use too.
+    Example: record_daily_stat(db, user_id, earnings=10.0)
+    """
+    if not employee_id or not increments: return
+    values = {"employee_id": employee_id, "day": day or date.today()}
+    values.update({field: 0 for field in STAT_FIELDS})
+    values.update(increments)
+    stmt = sqlite_insert(models.EmployeeDailyStat).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.EmployeeDailyStat.employee_id, models.EmployeeDailyStat.day],
+        set_={field: getattr(models.EmployeeDailyStat, field) + stmt.excluded[field] for field in increments}
+    )
+    db.execute(stmt)
+
+
+def rebuild_daily_stats():
+    """
+    Backfills the rollup from wallet, assignment and project history if it is empty.
+
+    wallet_transactions.timestamp and assignments.started_at come from CURRENT_TIMESTAMP, which
+    SQLite stores in UTC, so they are shifted to local time before bucketing; completed_at is
+    written with datetime.now() and already local. Events then land on the same day as live upserts.
+
+    Despite its name, assignments.started_at is the submission time: /work/submit inserts the row on
+    an image's first submission (edits update it in place), the same event that counts images_completed live.
+    """
+    db = database.SessionLocal()
+    try:
+        if db.query(models.EmployeeDailyStat.employee_id).first(): return
+        types = ", ".join(f"'{t}'" for t in EARNING_TYPES)
+        db.execute(text(f"""
+            INSERT INTO employee_daily_stats (employee_id, day, earnings, images_completed, approvals, rejections, time_spent_seconds, timed_images)
+            SELECT employee_id, date(timestamp, 'localtime'), SUM(amount), 0, 0, 0, 0, 0 FROM wallet_transactions
+            WHERE amount > 0 AND transaction_type IN ({types}) AND timestamp IS NOT NULL
+            GROUP BY employee_id, date(timestamp, 'localtime')
+        """))
+        # WHERE ... AND true (here and below): required by SQLite to disambiguate INSERT ... SELECT ... ON CONFLICT
+        db.execute(text("""
+            INSERT INTO employee_daily_stats (employee_id, day, earnings, images_completed, approvals, rejections, time_spent_seconds, timed_images)
+            SELECT user_id, date(started_at, 'localtime'), 0, COUNT(*), 0, 0, 0, 0 FROM assignments
+            WHERE user_id IS NOT NULL AND started_at IS NOT NULL AND true
+            GROUP BY user_id, date(started_at, 'localtime')
+            ON CONFLICT (employee_id, day) DO UPDATE SET images_completed = images_completed + excluded.images_completed
+        """))
+        db.execute(text("""
+            INSERT INTO employee_daily_stats (employee_id, day, earnings, images_completed, approvals, rejections, time_spent_seconds, timed_images)
+            SELECT assigned_to_id, date(completed_at), 0, 0, COUNT(*), 0, 0, 0 FROM projects
+            WHERE is_approved = 1 AND assigned_to_id IS NOT NULL AND completed_at IS NOT NULL AND true
+            GROUP BY assigned_to_id, date(completed_at)
+            ON CONFLICT (employee_id, day) DO UPDATE SET approvals = approvals + excluded.approvals
+        """))
+        db.commit()
+    finally:
+        db.close()
+
+
+def build_series(db: Session, employee_id: str, days: int, today: Optional[date] = None) -> List[Dict[str, Any]]:
+    """Returns one zero-filled entry per day for the last `days` days, oldest first."""
+    today = today or date.today()
+    start = today - timedelta(days=days - 1)
+    rows = {r.day: r for r in db.query(models.EmployeeDailyStat).filter(
+        models.EmployeeDailyStat.employee_id == employee_id, models.EmployeeDailyStat.day >= start
+    ).all()}
+    series = []
+    for i in range(days):
+        d = start + timedelta(days=i)
+        r = rows.get(d)
+        series.append({
+            "date": d.strftime("%Y-%m-%d"),
+            "earnings": round(r.earnings or 0.0, 2) if r else 0.0,
+            "images_completed": r.images_completed or 0 if r else 0,
+            "approvals": r.approvals or 0 if r else 0,
+            "rejections": r.rejections or 0 if r else 0,
+            "time_spent_seconds": round(r.time_spent_seconds or 0.0, 1) if r else 0.0,
+            "timed_images": r.timed_images or 0 if r else 0,
+            "avg_seconds_per_image": round(r.time_spent_seconds / r.timed_images, 1) if r and r.timed_images else None
+        })
+    return series
@@ -0,0 +1,294 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import argparse
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from sqlalchemy import text, tuple_
+from sqlalchemy.orm import Session
+
+import database
+import models
+from fts_index import ensure_fts_table, to_match_query
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("AUDIT_FLUSH_INTERVAL_MS", 20))
+AUDIT_FLUSH_MAX_BATCH = int(os.getenv("AUDIT_FLUSH_MAX_BATCH", 1000))
+AUDIT_VERIFY_PAGE = int(os.getenv("AUDIT_VERIFY_PAGE", 5000)) # Rows per keyset page while verifying
+AUDIT_PAGE_DEFAULT = 50
+AUDIT_PAGE_MAX = 500
+GENESIS_HASH = "0" * 64
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f" # How SQLAlchemy stores DateTime in SQLite; hashed verbatim
+
+
+def compute_block_hash(prev_hash: str, entry_id: int, timestamp: str, user_id: Optional[str], username: Optional[str],
+                       action: Optional[str], details: Optional[str], ip_address: Optional[str]) -> str:
+    """sha256(prev_hash || canonical JSON of the entry). The id is included so rows cannot be reordered."""
+    payload = json.dumps([entry_id, timestamp, user_id, username, action, details, ip_address], separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256((prev_hash + payload).encode("utf-8")).hexdigest()
+
+
+def _chain_tail(conn) -> Tuple[int, str]:
+    row = conn.execute(text("SELECT id, block_hash FROM audit_logs ORDER BY id DESC LIMIT 1")).fetchone()
+    return (row[0], row[1] or GENESIS_HASH) if row else (0, GENESIS_HASH)
+
+
+def append_entries(entries: List[Dict[str, Any]]) -> int:
+    """
+    Appends a batch to the chain in one transaction and returns the last id written.
+
+    BEGIN IMMEDIATE takes SQLite's write lock before the tail is read, so appenders in other
+    worker processes queue up behind it and the chain can never fork.
+    """
+    with database.engine.connect() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            last_id, prev_hash = _chain_tail(conn)
+            rows = []
+            for entry in entries:
+                last_id += 1
+                ts = entry["timestamp"].strftime(TIMESTAMP_FORMAT)
+                block_hash = compute_block_hash(prev_hash, last_id, ts, entry.get("user_id"), entry.get("username"),
+                                                entry.get("action"), entry.get("details"), entry.get("ip_address"))
+                rows.append({"id": last_id, "user_id": entry.get("user_id"), "username": entry.get("username"), "action": entry.get("action"),
+                             "details": entry.get("details"), "ip_address": entry.get("ip_address"), "timestamp": ts,
+                             "prev_hash": prev_hash, "block_hash": block_hash})
+                prev_hash = block_hash
+            conn.execute(text("""
+                INSERT INTO audit_logs (id, user_id, username, action, details, ip_address, timestamp, prev_hash, block_hash)
+                VALUES (:id, :user_id, :username, :action, :details, :ip_address, :timestamp, :prev_hash, :block_hash)
+            """), rows)
+            conn.commit()
+            return last_id
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def seal_legacy_entries():
+    """
+    Hashes pre-existing audit rows in id order if the chain has never been started.
+
+    Runs once: as soon as any row carries a block_hash, unhashed rows are treated as
+    tampering by the verifier instead of being silently sealed.
+    """
+    with database.engine.connect() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            if conn.execute(text("SELECT 1 FROM audit_logs WHERE block_hash IS NOT NULL LIMIT 1")).fetchone():
+                conn.rollback()
+                return
+            prev_hash, after, sealed = GENESIS_HASH, 0, 0
+            while True:
+                page = conn.execute(text("""
+                    SELECT id, timestamp, user_id, username, action, details, ip_address FROM audit_logs
+                    WHERE id > :after ORDER BY id LIMIT :page
+                """), {"after": after, "page": AUDIT_VERIFY_PAGE}).fetchall()
+                if not page: break
+                updates = []
+                for row in page:
+                    block_hash = compute_block_hash(prev_hash, row[0], row[1] or "", *row[2:])
+                    updates.append({"id": row[0], "prev_hash": prev_hash, "block_hash": block_hash})
+                    prev_hash = block_hash
+                conn.execute(text("UPDATE audit_logs SET prev_hash = :prev_hash, block_hash = :block_hash WHERE id = :id"), updates)
+                after = page[-1][0]
+                sealed += len(page)
+            conn.commit()
+            if sealed: logger.info(f"Audit chain started: sealed {sealed} existing entries")
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def verify_chain(full: bool = False, save_checkpoint: bool = True) -> Dict[str, Any]:
+    """
+    Streams the chain in keyset pages (constant memory) and recomputes every hash.
+
+    Starts after the latest checkpoint unless `full`; the checkpointed row itself is re-hashed
+    first, so truncating or rewriting the tail behind a checkpoint is still caught. Successful
+    runs store a new checkpoint at the last verified entry.
+    """
+    started = time.perf_counter()
+    result = {"valid": True, "from_checkpoint": None, "entries_checked": 0, "last_id": 0, "first_bad_id": None, "reason": None}
+    with database.engine.connect() as conn:
+        after, prev_hash = 0, GENESIS_HASH
+        checkpoint = None if full else conn.execute(text(
+            "SELECT last_entry_id, last_hash FROM audit_checkpoints ORDER BY last_entry_id DESC LIMIT 1"
+        )).fetchone()
+        if checkpoint:
+            row = conn.execute(text("""
+                SELECT id, timestamp, user_id, username, action, details, ip_address, prev_hash, block_hash FROM audit_logs WHERE id = :id
+            """), {"id": checkpoint[0]}).fetchone()
+            if row is None or row[8] != checkpoint[1] or compute_block_hash(row[7], row[0], row[1] or "", *row[2:7]) != checkpoint[1]:
+                result.update(valid=False, first_bad_id=checkpoint[0], reason="checkpointed entry missing or modified")
+                result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                return result
+            after, prev_hash = checkpoint
+            result["from_checkpoint"] = after
+        result["last_id"] = after
+
+        while True:
+            page = conn.execute(text("""
+                SELECT id, timestamp, user_id, username, action, details, ip_address, prev_hash, block_hash FROM audit_logs
+                WHERE id > :after ORDER BY id LIMIT :page
+            """), {"after": after, "page": AUDIT_VERIFY_PAGE}).fetchall()
+            if not page: break
+            for row in page:
+                if row[7] != prev_hash:
+                    result.update(valid=False, first_bad_id=row[0], reason="prev_hash does not link to the previous entry (entry removed or reordered)")
+                    break
+                if row[8] is None or compute_block_hash(prev_hash, row[0], row[1] or "", *row[2:7]) != row[8]:
+                    result.update(valid=False, first_bad_id=row[0], reason="block_hash mismatch (entry modified)")
+                    break
+                prev_hash = row[8]
+                result["entries_checked"] += 1
+                result["last_id"] = row[0]
+            if not result["valid"]: break
+            after = page[-1][0]
+
+        if result["valid"] and save_checkpoint and result["entries_checked"]:
+            conn.execute(text("""
+                INSERT INTO audit_checkpoints (last_entry_id, last_hash, entries_verified, verified_at) VALUES (:id, :hash, :n, :at)
+            """), {"id": result["last_id"], "hash": prev_hash, "n": result["entries_checked"], "at": datetime.now()})
+            conn.commit()
+    result["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    if not result["valid"]:
+        logger.error(f"Audit chain verification failed at entry {result['first_bad_id']}: {result['reason']}")
+    return result
+
+
+def ensure_audit_search_index():
+    """Full-text index over audit details (audit_logs_fts), maintained by triggers on audit_logs."""
+    ensure_fts_table("audit_logs_fts", "audit_logs", ["details"], content_rowid="id")
+
+
+def encode_cursor(entry: models.AuditLog) -> str:
+    return f"{entry.timestamp.isoformat()}|{entry.id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    ts, _, entry_id = cursor.rpartition("|")
+    return datetime.fromisoformat(ts), int(entry_id)
+
+
+def search_entries(db: Session, action: Optional[str] = None, user_id: Optional[str] = None, username: Optional[str] = None,
+                   start: Optional[datetime] = None, end: Optional[datetime] = None, q: Optional[str] = None,
+                   limit: int = AUDIT_PAGE_DEFAULT, cursor: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Newest-first page of audit entries matching every given filter.
+
+    Pagination is keyset on (timestamp, id): the cursor is the last row of the previous page,
+    so page N costs the same as page 1. Equality filters pick the matching (column, timestamp, id)
+    index; `q` is matched against details through the FTS5 index.
+    """
+    limit = max(1, min(limit, AUDIT_PAGE_MAX))
+    query = db.query(models.AuditLog)
+    if action: query = query.filter(models.AuditLog.action == action)
+    if user_id: query = query.filter(models.AuditLog.user_id == user_id)
+    if username: query = query.filter(models.AuditLog.username == username)
+    if start: query = query.filter(models.AuditLog.timestamp >= start)
+    if end: query = query.filter(models.AuditLog.timestamp < end)
+    if q:
+        match = to_match_query(q)
+        if not match: return {"items": [], "next_cursor": None}
+        query = query.filter(text("audit_logs.id IN (SELECT rowid FROM audit_logs_fts WHERE audit_logs_fts MATCH :match)")).params(match=match)
+    if cursor:
+        ts, entry_id = decode_cursor(cursor)
+        query = query.filter(tuple_(models.AuditLog.timestamp, models.AuditLog.id) < tuple_(ts, entry_id))
+    rows = query.order_by(models.AuditLog.timestamp.desc(), models.AuditLog.id.desc()).limit(limit + 1).all()
+    items = [{
+        "id": r.id, "timestamp": r.timestamp, "action": r.action, "user_id": r.user_id, "username": r.username,
+        "details": r.details, "ip_address": r.ip_address, "block_hash": r.block_hash
+    } for r in rows[:limit]]
+    return {"items": items, "next_cursor": encode_cursor(rows[limit - 1]) if len(rows) > limit else None}
+
+
+class AuditLogWriter:
+    """
+    Group-commit appender for the audit chain.
+
+    Route handlers (event loop or threadpool) call `record()`, which only queues the entry.
+    A background task collects bursts for a few milliseconds and appends them with a single
+    transaction on a worker thread. Without a running writer (CLI, job workers) `record()`
+    appends synchronously.
+    """
+
+    def __init__(self, flush_interval_ms: int = AUDIT_FLUSH_INTERVAL_MS, max_batch: int = AUDIT_FLUSH_MAX_BATCH):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the writer and appends whatever is still queued."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._loop = None
+        while not self.queue.empty():
+            batch = self._drain([])
+            await asyncio.to_thread(append_entries, batch)
+
+    def record(self, action: str, details: str, user_id: str = None, username: str = None, ip_address: str = None):
+        entry = {"action": action, "details": details, "user_id": user_id, "username": username,
+                 "ip_address": ip_address, "timestamp": datetime.now()}
+        if self._loop is None:
+            append_entries([entry])
+            return
+        self._loop.call_soon_threadsafe(self.queue.put_nowait, entry)
+
+    def _drain(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        while len(batch) < self.max_batch and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    def _requeue(self, batch: List[Dict[str, Any]]):
+        """Puts `batch` back at the head of the queue, so the chain keeps the order entries were recorded in."""
+        rest = []
+        while not self.queue.empty(): rest.append(self.queue.get_nowait())
+        for entry in batch + rest: self.queue.put_nowait(entry)
+
+    async def _run(self):
+        while True:
+            first = await self.queue.get()
+            try:
+                await asyncio.sleep(self.flush_interval)
+            except asyncio.CancelledError:
+                self._requeue([first]) # Already dequeued; stop() appends it with the rest
+                raise
+            batch = self._drain([first])
+            try:
+                await asyncio.to_thread(append_entries, batch)
+            except Exception as e:
+                # Nothing was appended (the chain only advances on commit), so retry the batch
+                logger.error(f"Audit Flush Error ({len(batch)} entries): {e}")
+                self._requeue(batch)
+                await asyncio.sleep(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify the audit_logs hash chain")
+    parser.add_argument("--full", action="store_true", help="Ignore checkpoints and re-verify from the first entry")
+    parser.add_argument("--no-checkpoint", action="store_true", help="Do not record a checkpoint")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    report = verify_chain(full=args.full, save_checkpoint=not args.no_checkpoint)
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["valid"] else 1)
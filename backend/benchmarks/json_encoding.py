@@ -0,0 +1,129 @@
+"""
+Serialization time and bytes on the wire for the heaviest JSON endpoints.
+
+Generates a scratch database with `setup_database.py --generate`, then for each endpoint fetches
+the payload in-process (TestClient) and reports:
+  - stdlib_ms / orjson_ms: median time to render the payload with FastAPI's default path
+    (jsonable_encoder + json.dumps) vs fast_json.dumps. The payload is the decoded response,
+    so datetimes are already strings and the stdlib figure is a lower bound.
+  - identity_bytes / gzip_bytes / br_bytes: response size as sent by CompressionMiddleware.
+  - request_ms: median end-to-end time of the endpoint (identity encoding).
+
+Usage (from backend/):
+    python benchmarks/json_encoding.py --employees 2000 --repeat 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+ADMIN = ("Rohit", "admin01")
+SYNTHETIC_PASSWORD = "synthetic-pass"
+
+
+def median_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(samples), 3)
+
+
+def generate(db_path: str, args):
+    cmd = [sys.executable, "setup_database.py", "--generate", "--db", db_path,
+           "--employees", str(args.employees), "--projects", str(args.projects), "--posts", str(args.posts),
+           "--ledger-per-employee", str(args.ledger_per_employee), "--support-per-employee", str(args.support_per_employee),
+           "--audit-logs", "1000"]
+    subprocess.run(cmd, cwd=BACKEND_DIR, check=True, capture_output=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--employees", type=int, default=2000)
+    parser.add_argument("--projects", type=int, default=2000)
+    parser.add_argument("--posts", type=int, default=2000)
+    parser.add_argument("--ledger-per-employee", type=int, default=200)
+    parser.add_argument("--support-per-employee", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=20, help="Timing repetitions per endpoint")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="medjson-")
+    db_path = os.path.join(workdir, "bench.db")
+    generate(db_path, args)
+    os.environ.update(DATABASE_URL=f"sqlite:///{db_path}", LOG_FILE=os.path.join(workdir, "backend.log"), LOG_LEVEL="WARNING")
+    os.chdir(BACKEND_DIR)
+
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.testclient import TestClient
+    import main as app_module
+    import database
+    import fast_json
+    import compression
+
+    with database.engine.connect() as conn:
+        busy_user = conn.exec_driver_sql("SELECT e.username FROM wallet_transactions w JOIN employees e ON e.id = w.employee_id GROUP BY w.employee_id ORDER BY count(*) DESC LIMIT 1").scalar()
+        big_project = conn.exec_driver_sql("SELECT project_id FROM images GROUP BY project_id ORDER BY count(*) DESC LIMIT 1").scalar()
+
+    report = {"config": {**vars(args), "workdir": workdir, "brotli": compression.brotli is not None, "orjson": fast_json.orjson is not None}, "endpoints": {}}
+    with TestClient(app_module.app) as client:
+        def login(username, password):
+            token = client.post("/auth/login", json={"username": username, "password": password}).json()["access_token"]
+            return {"Authorization": f"Bearer {token}"}
+        admin, user = login(*ADMIN), login(busy_user, SYNTHETIC_PASSWORD)
+
+        endpoints = [
+            ("employees_list", "/api/employees/list", admin),
+            ("admin_support_messages", "/api/admin/support/messages", admin),
+            ("project_submissions", f"/api/admin/project-submissions/{big_project}", admin),
+            ("admin_support_users", "/api/admin/support/users?limit=500", admin),
+            ("withdrawals_pending", "/api/withdrawals/pending", admin),
+            ("finalized_projects", "/api/admin/finalized-projects", admin),
+            ("admin_contacts", "/api/admin/contacts", admin),
+            ("wallet_history", "/api/wallet/history", user),
+            ("community_posts", "/api/community/posts?limit=100", user),
+            ("projects_history", "/api/projects/history", user),
+        ]
+        totals = {"stdlib_ms": 0.0, "orjson_ms": 0.0, "identity_bytes": 0, "compressed_bytes": 0}
+        for name, path, headers in endpoints:
+            identity = client.get(path, headers={**headers, "Accept-Encoding": "identity"})
+            if identity.status_code != 200:
+                report["endpoints"][name] = {"path": path, "status": identity.status_code}
+                continue
+            payload = identity.json()
+            stdlib = lambda: json.dumps(jsonable_encoder(payload), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+            row = {
+                "path": path,
+                "items": len(payload) if isinstance(payload, list) else None,
+                "request_ms": median_ms(lambda: client.get(path, headers={**headers, "Accept-Encoding": "identity"}), args.repeat),
+                "stdlib_ms": median_ms(stdlib, args.repeat),
+                "orjson_ms": median_ms(lambda: fast_json.dumps(payload), args.repeat),
+                "identity_bytes": len(identity.content),
+                "gzip_bytes": int(client.get(path, headers={**headers, "Accept-Encoding": "gzip"}).headers.get("content-length", len(identity.content))),
+            }
+            if compression.brotli is not None:
+                row["br_bytes"] = int(client.get(path, headers={**headers, "Accept-Encoding": "br"}).headers.get("content-length", len(identity.content)))
+            row["serialize_speedup"] = round(row["stdlib_ms"] / row["orjson_ms"], 1) if row["orjson_ms"] else None
+            row["wire_ratio"] = round(min(row["gzip_bytes"], row.get("br_bytes", row["gzip_bytes"])) / row["identity_bytes"], 3) if row["identity_bytes"] else None
+            report["endpoints"][name] = row
+            totals["stdlib_ms"] += row["stdlib_ms"]; totals["orjson_ms"] += row["orjson_ms"]
+            totals["identity_bytes"] += row["identity_bytes"]; totals["compressed_bytes"] += min(row["gzip_bytes"], row.get("br_bytes", row["gzip_bytes"]))
+        totals["stdlib_ms"] = round(totals["stdlib_ms"], 2); totals["orjson_ms"] = round(totals["orjson_ms"], 2)
+        report["totals"] = totals
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Load test: seeds a synthetic DB, starts the real app under uvicorn and drives it with a
+realistic annotator mix (login, allocate/submit, finalize, wallet, leaderboard).
+
+Reports throughput, p50/p95/p99 latency and queries per request for each endpoint as JSON.
+Queries are read from the Server-Timing header written by the query profiler. With
+--baseline the run is compared against a saved report and exits 1 on regressions.
+
+Usage (from backend/):
+    python benchmarks/load_test.py --users 20 --duration 30 --save-baseline benchmarks/baseline.json
+    python benchmarks/load_test.py --users 20 --duration 30 --baseline benchmarks/baseline.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --users 50   # existing server, seeded separately
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Weighted annotator actions per iteration (work = allocate + submit of one image)
+ACTION_MIX = {"work": 70, "available": 10, "wallet": 10, "leaderboard": 10}
+QUERIES_RE = re.compile(r'desc="(\d+) queries"')
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered: return 0.0
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+class Recorder:
+    """Thread-safe sample sink: (latency ms, status, queries) per endpoint template."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples: Dict[str, List[tuple]] = defaultdict(list)
+
+    def add(self, endpoint: str, elapsed_ms: float, status: int, queries: Optional[int]):
+        with self.lock:
+            self.samples[endpoint].append((elapsed_ms, status, queries))
+
+    def report(self, duration: float) -> dict:
+        endpoints, total = {}, 0
+        for endpoint, rows in sorted(self.samples.items()):
+            latencies = sorted(r[0] for r in rows)
+            queries = [r[2] for r in rows if r[2] is not None]
+            total += len(rows)
+            endpoints[endpoint] = {
+                "requests": len(rows),
+                "errors": sum(1 for r in rows if r[1] >= 500 or r[1] == 0),
+                "throughput_rps": round(len(rows) / duration, 2),
+                "p50_ms": round(percentile(latencies, 0.50), 2),
+                "p95_ms": round(percentile(latencies, 0.95), 2),
+                "p99_ms": round(percentile(latencies, 0.99), 2),
+                "queries_per_request": round(sum(queries) / len(queries), 2) if queries else None
+            }
+        return {"duration_s": round(duration, 2), "total_requests": total, "throughput_rps": round(total / duration, 2), "endpoints": endpoints}
+
+
+class Annotator(threading.Thread):
+    """One virtual employee working through their assigned projects."""
+
+    def __init__(self, base_url: str, username: str, password: str, recorder: Recorder, stop: threading.Event, rng: random.Random):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.recorder = recorder
+        self.stop = stop
+        self.rng = rng
+        self.http = requests.Session()
+        self.user_id = None
+        self.projects: List[str] = []
+
+    def call(self, endpoint: str, method: str, path: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            resp = self.http.request(method, self.base_url + path, timeout=30, **kwargs)
+        except requests.RequestException:
+            self.recorder.add(endpoint, (time.perf_counter() - started) * 1000, 0, None)
+            return None
+        match = QUERIES_RE.search(resp.headers.get("server-timing", ""))
+        self.recorder.add(endpoint, (time.perf_counter() - started) * 1000, resp.status_code, int(match.group(1)) if match else None)
+        return resp
+
+    def login(self) -> bool:
+        resp = self.call("POST /auth/login", "POST", "/auth/login", json={"username": self.username, "password": self.password})
+        if resp is None or resp.status_code != 200: return False
+        data = resp.json()
+        self.user_id = data["user_id"]
+        self.http.headers["Authorization"] = f"Bearer {data['access_token']}"
+        return True
+
+    def refresh_projects(self):
+        resp = self.call("GET /api/projects/available/{user_id}", "GET", f"/api/projects/available/{self.user_id}")
+        if resp is not None and resp.status_code == 200:
+            self.projects = [p["id"] for p in resp.json() if p["status"] == "IN PROGRESS"]
+
+    def work(self):
+        if not self.projects: return self.refresh_projects()
+        project_id = self.projects[0]
+        resp = self.call("POST /work/allocate", "POST", "/work/allocate", json={"employee_id": self.user_id, "project_id": project_id})
+        if resp is None or resp.status_code != 200: return
+        images = resp.json().get("images") or []
+        if not images or resp.json().get("is_review"):
+            # Batch fully annotated: submit it for review and move on
+            self.call("POST /api/projects/finalize", "POST", "/api/projects/finalize", json={"employee_id": self.user_id, "project_id": project_id})
+            self.projects.pop(0)
+            return
+        form = {"name": "Load test", "notes": "", "medicines": [{"name": "Paracetamol", "dose": "500mg", "freq": "1-0-1", "days": str(self.rng.randint(3, 14))}]}
+        self.call("POST /work/submit", "POST", "/work/submit", json={"employee_id": self.user_id, "image_id": images[0]["id"], "form_data": form})
+
+    def run(self):
+        if not self.login(): return
+        self.refresh_projects()
+        actions, weights = list(ACTION_MIX), list(ACTION_MIX.values())
+        while not self.stop.is_set():
+            action = self.rng.choices(actions, weights=weights)[0]
+            if action == "work": self.work()
+            elif action == "available": self.refresh_projects()
+            elif action == "wallet": self.call("GET /api/wallet/history", "GET", "/api/wallet/history")
+            elif action == "leaderboard": self.call("GET /api/public/leaderboard", "GET", "/api/public/leaderboard")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workdir: str, db_path: str, port: int) -> subprocess.Popen:
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{db_path}", LOG_FILE=os.path.join(workdir, "backend.log"), LOG_LEVEL="WARNING")
+    console = open(os.path.join(workdir, "server.out"), "w") # Keeps stdout clean for the JSON report
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=console, stderr=subprocess.STDOUT
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None: raise RuntimeError("uvicorn exited during startup")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/api/system/config", timeout=1).status_code == 200: return proc
+        except requests.RequestException:
+            time.sleep(0.25)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not become ready")
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> dict:
+    """Per-endpoint deltas vs the baseline; p95 or queries/request growing past tolerance is a regression."""
+    out, regressions = {}, []
+    for endpoint, cur in report["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(endpoint)
+        if not base: continue
+        delta = {
+            "p95_ms": [base["p95_ms"], cur["p95_ms"]],
+            "throughput_rps": [base["throughput_rps"], cur["throughput_rps"]],
+            "queries_per_request": [base["queries_per_request"], cur["queries_per_request"]]
+        }
+        if base["p95_ms"] and cur["p95_ms"] > base["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms")
+        if base["queries_per_request"] is not None and cur["queries_per_request"] is not None and cur["queries_per_request"] > base["queries_per_request"] + 0.5:
+            regressions.append(f"{endpoint}: queries/request {base['queries_per_request']} -> {cur['queries_per_request']}")
+        out[endpoint] = delta
+    return {"tolerance": tolerance, "endpoints": out, "regressions": regressions}
+
+
+def main():
+    from seed import add_seed_arguments, BENCH_PASSWORD
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target an already running server instead of seeding and starting one")
+    parser.add_argument("--users", type=int, default=20, help="Concurrent virtual annotators")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load after all users logged in")
+    parser.add_argument("--baseline", help="Saved report to compare against")
+    parser.add_argument("--save-baseline", help="Write this run's report here")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="Allowed p95 growth vs baseline")
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="medbench-")
+    server = None
+    rows = None
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            db_path = os.path.join(workdir, "bench.db")
+            os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+            from seed import seed_database
+            rows = seed_database(args.employees, args.projects_per_employee, args.history_per_employee,
+                                 args.images_per_project, args.completion, args.ledger_per_employee, args.seed)
+            port = free_port()
+            server = start_server(workdir, db_path, port)
+            base_url = f"http://127.0.0.1:{port}"
+
+        recorder, stop = Recorder(), threading.Event()
+        users = [Annotator(base_url, f"bench_{i % args.employees:05d}", BENCH_PASSWORD, recorder, stop, random.Random(args.seed + i)) for i in range(args.users)]
+        for u in users: u.start()
+        time.sleep(args.duration)
+        stop.set()
+        for u in users: u.join(timeout=30)
+        # Logins are bcrypt-bound and happen once per user, so they are part of the window but not of steady state
+        report = recorder.report(args.duration)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait(timeout=30)
+
+    report["config"] = {"users": args.users, "duration": args.duration, "url": args.url, "seed_rows": rows, "workdir": workdir}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            report["comparison"] = compare(report, json.load(f), args.tolerance)
+
+    text = json.dumps(report, indent=2)
+    print(text)
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f: f.write(text + "\n")
+    if report.get("comparison", {}).get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
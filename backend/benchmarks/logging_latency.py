@@ -0,0 +1,108 @@
+"""
+Event-loop latency under INFO logging load: synchronous FileHandler vs the queue pipeline.
+
+A probe coroutine sleeps 1ms in a loop and records how late it wakes up while N simulated
+request handlers each write a few INFO lines per request at a fixed total rate. Results are
+printed as JSON.
+
+Usage (from backend/):
+    python benchmarks/logging_latency.py --workers 50 --rate 5000 --seconds 5
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging_setup  # noqa: E402
+
+
+def percentile(values, q):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+async def probe(lags, stop):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.001)
+        lags.append((time.perf_counter() - started - 0.001) * 1000)
+
+
+async def handler(logger, stop, counter, interval):
+    i = 0
+    while not stop.is_set():
+        # One simulated request: a few lines, then await I/O until the next one
+        logger.info("allocate user=%s image=%s", i, i * 7)
+        logger.info("submit user=%s image=%s label=%s", i, i * 7, "benign")
+        logger.info("GET /api/employee/stats", extra={"fields": {"status": 200, "queries": 4, "duration_ms": 3.2}})
+        counter[0] += 3
+        i += 1
+        await asyncio.sleep(interval)
+
+
+async def run_case(workers, rate, seconds):
+    lags, counter, stop = [], [0], asyncio.Event()
+    logger = logging.getLogger("bench")
+    interval = workers * 3 / rate
+    tasks = [asyncio.create_task(probe(lags, stop))] + [asyncio.create_task(handler(logger, stop, counter, interval)) for _ in range(workers)]
+    await asyncio.sleep(seconds)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return {
+        "log_calls": counter[0],
+        "log_calls_per_sec": round(counter[0] / seconds),
+        "loop_lag_ms_p50": round(percentile(lags, 0.50), 3),
+        "loop_lag_ms_p99": round(percentile(lags, 0.99), 3),
+        "loop_lag_ms_max": round(max(lags) if lags else 0.0, 3),
+        "loop_lag_ms_mean": round(statistics.mean(lags) if lags else 0.0, 3),
+    }
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--rate", type=int, default=5000, help="Target log lines per second")
+    parser.add_argument("--seconds", type=float, default=5)
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # Baseline: the previous setup (blocking FileHandler on the root logger)
+        reset_root()
+        file_handler = logging.FileHandler(os.path.join(tmp, "sync.log"))
+        file_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+        logging.getLogger().addHandler(file_handler)
+        logging.getLogger().setLevel(logging.INFO)
+        results["sync_file_handler"] = asyncio.run(run_case(args.workers, args.rate, args.seconds))
+
+        # Queue pipeline (console output silenced so only file writes are compared)
+        reset_root()
+        logging_setup.configure_logging(log_file=os.path.join(tmp, "queued.log"), level="INFO")
+        for h in logging_setup._listener.handlers:
+            if isinstance(h, logging.StreamHandler) and not isinstance(h, logging.FileHandler): h.setLevel(logging.CRITICAL + 1)
+        results["queue_pipeline"] = asyncio.run(run_case(args.workers, args.rate, args.seconds))
+        results["queue_pipeline"]["dropped"] = logging_setup.NonBlockingQueueHandler.dropped
+        logging_setup.shutdown_logging()
+        reset_root()
+
+    results["config"] = {"workers": args.workers, "rate": args.rate, "seconds": args.seconds}
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
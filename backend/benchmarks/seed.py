@@ -0,0 +1,131 @@
+"""
+Synthetic database for benchmarks.
+
+Creates the schema from models.py in the DB pointed to by DATABASE_URL and fills it with
+employees, projects, images, assignments and wallet ledger rows at a configurable scale.
+Every seeded employee is `bench_NNNNN` with password BENCH_PASSWORD.
+
+Usage (from backend/):
+    DATABASE_URL=sqlite:///./bench.db python benchmarks/seed.py --employees 500 --images-per-project 100
+"""
+import os
+import sys
+import json
+import uuid
+import random
+import argparse
+from datetime import datetime, timedelta
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCH_PASSWORD = "bench-pass"
+CHUNK_SIZE = 5000 # Rows per executemany
+
+
+def add_seed_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--employees", type=int, default=200)
+    parser.add_argument("--projects-per-employee", type=int, default=4, help="Open projects per employee (plus history)")
+    parser.add_argument("--history-per-employee", type=int, default=6, help="Finalized/approved projects per employee")
+    parser.add_argument("--images-per-project", type=int, default=50)
+    parser.add_argument("--completion", type=float, default=0.3, help="Fraction of open-project images already annotated")
+    parser.add_argument("--ledger-per-employee", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=42)
+
+
+def bulk_insert(conn, table, rows):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        conn.execute(table.insert(), rows[i:i + CHUNK_SIZE])
+
+
+def seed_database(employees=200, projects_per_employee=4, history_per_employee=6, images_per_project=50,
+                  completion=0.3, ledger_per_employee=40, seed=42) -> dict:
+    """Drops and recreates every table, then inserts the synthetic data set. Returns row counts."""
+    # Imported here so callers can set DATABASE_URL first; the engine is bound at import time
+    import database
+    import models
+    import submission_codec
+
+    rng = random.Random(seed)
+    now = datetime.now()
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8") # One hash shared by all users
+
+    models.Base.metadata.drop_all(bind=database.engine)
+    models.Base.metadata.create_all(bind=database.engine)
+    form = submission_codec.FormSchema(1, submission_codec.DEFAULT_FORM_DEFINITION)
+
+    emp_rows, project_rows, image_rows, assignment_rows, ledger_rows = [], [], [], [], []
+    for n in range(employees):
+        emp_id = str(uuid.uuid4())
+        level = 1 + int(rng.paretovariate(2.0)) % 8
+        emp_rows.append({
+            "id": emp_id, "employee_code": f"BENCH-{n:07d}", "username": f"bench_{n:05d}", "full_name": f"Bench User {n}",
+            "password_hash": password_hash, "gender": rng.choice("MF"), "status": "ACTIVE", "role": "EMPLOYEE",
+            "wallet_balance": 0.0, "total_earned": 0.0, "level": level, "xp": rng.randint(0, level * 1000),
+            "login_streak": rng.randint(0, 30), "last_login": now - timedelta(days=rng.randint(0, 5))
+        })
+
+        for p in range(projects_per_employee + history_per_employee):
+            project_id = f"BENCH-{n:05d}-{p:03d}"
+            salary = rng.choice((2.0, 3.5, 5.0))
+            is_history = p >= projects_per_employee
+            is_approved = is_history and rng.random() < 0.8
+            project_rows.append({
+                "id": project_id, "salary_per_completion": salary, "security_amount": 50.0, "time_limit_hours": 48,
+                "assigned_to_id": emp_id, "is_finalized": is_history, "is_approved": is_approved,
+                "status": ("COMPLETED" if is_approved else "REJECTED") if is_history else "IN_PROGRESS",
+                "deadline": now + timedelta(days=30) if not is_history else now - timedelta(days=p),
+                "completed_at": now - timedelta(days=p) if is_history else None,
+                "payout_amount": salary * images_per_project if is_approved else 0.0
+            })
+            done = images_per_project if is_history else int(images_per_project * completion)
+            for seq in range(1, images_per_project + 1):
+                image_id = str(uuid.uuid4())
+                image_rows.append({"id": image_id, "project_id": project_id, "storage_url": f"/static/uploads/{project_id}/{seq}.jpg", "sequence_index": seq})
+                if seq <= done:
+                    assignment_rows.append({
+                        "id": str(uuid.uuid4()), "user_id": emp_id, "image_id": image_id, "status": "SUBMITTED",
+                        "started_at": now - timedelta(minutes=rng.randint(1, 60 * 24 * 30)),
+                        "schema_id": form.id, "submission_blob": form.encode({
+                            "name": f"Patient {seq}", "notes": rng.choice(("", "Follow up in two weeks", "Allergic to penicillin")),
+                            "medicines": [{"name": rng.choice(("Paracetamol", "Amoxicillin", "Metformin")), "dose": "500mg", "freq": "1-0-1", "days": str(rng.randint(3, 14))}
+                                          for _ in range(rng.randint(1, 4))]
+                        })
+                    })
+
+        balance = 0.0
+        for _ in range(ledger_per_employee):
+            kind = rng.choices(("PROJECT_PAYOUT", "LOGIN_BONUS", "CHALLENGE_REWARD", "WITHDRAWAL"), weights=(5, 10, 1, 2))[0]
+            amount = {"PROJECT_PAYOUT": 250.0, "LOGIN_BONUS": 10.0, "CHALLENGE_REWARD": 100.0, "WITHDRAWAL": -100.0}[kind]
+            balance += amount
+            ledger_rows.append({
+                "id": str(uuid.uuid4()), "employee_id": emp_id, "amount": amount, "transaction_type": kind,
+                "description": f"Synthetic {kind.lower()}", "timestamp": now - timedelta(minutes=rng.randint(1, 60 * 24 * 90))
+            })
+        emp_rows[-1]["wallet_balance"] = max(balance, 0.0)
+        emp_rows[-1]["total_earned"] = sum(r["amount"] for r in ledger_rows[-ledger_per_employee:] if r["amount"] > 0) if ledger_per_employee else 0.0
+
+    with database.engine.begin() as conn:
+        conn.execute(models.FormSchema.__table__.insert(), [{"id": form.id, "project_id": None, "definition": json.dumps(form.definition), "created_at": now}])
+        bulk_insert(conn, models.Employee.__table__, emp_rows)
+        bulk_insert(conn, models.Project.__table__, project_rows)
+        bulk_insert(conn, models.Image.__table__, image_rows)
+        bulk_insert(conn, models.Assignment.__table__, assignment_rows)
+        bulk_insert(conn, models.WalletTransaction.__table__, ledger_rows)
+
+    return {"employees": len(emp_rows), "projects": len(project_rows), "images": len(image_rows),
+            "assignments": len(assignment_rows), "wallet_transactions": len(ledger_rows)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+    counts = seed_database(args.employees, args.projects_per_employee, args.history_per_employee,
+                           args.images_per_project, args.completion, args.ledger_per_employee, args.seed)
+    print(json.dumps({"database": os.getenv("DATABASE_URL", "sqlite:///./medical_platform.db"), "rows": counts}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+import os
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+from sqlalchemy import text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+import database
+import models
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CHAT_FLUSH_INTERVAL_MS = int(os.getenv("CHAT_FLUSH_INTERVAL_MS", 5))
+CHAT_FLUSH_MAX_BATCH = int(os.getenv("CHAT_FLUSH_MAX_BATCH", 500))
+THREAD_PREVIEW_CHARS = 50
+
+
+def update_support_threads(db: Session, rows: List[Dict[str, Any]]):
+    """Folds freshly inserted message rows into the per-user support_threads summary."""
+    summary: Dict[str, Dict[str, Any]] = {}
+    for row in rows:
+        entry = summary.setdefault(row["user_id"], {"user_id": row["user_id"], "unread_count": 0})
+        entry["last_message"] = row["message"][:THREAD_PREVIEW_CHARS]
+        entry["last_timestamp"] = row["timestamp"]
+        if not row["is_from_admin"] and not row["is_read"]:
+            entry["unread_count"] += 1
+    if not summary:
+        return
+    stmt = sqlite_insert(models.SupportThread).values(list(summary.values()))
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.SupportThread.user_id],
+        set_={
+            "last_message": stmt.excluded.last_message,
+            "last_timestamp": stmt.excluded.last_timestamp,
+            "unread_count": models.SupportThread.unread_count + stmt.excluded.unread_count
+        }
+    )
+    db.execute(stmt)
+
+
+_STALE_THREAD_USERS_SQL = """
+    SELECT m.user_id FROM support_messages m LEFT JOIN support_threads t ON t.user_id = m.user_id
+    WHERE m.user_id IS NOT NULL
+    GROUP BY m.user_id HAVING t.user_id IS NULL OR MAX(m.timestamp) > t.last_timestamp"""
+
+
+def rebuild_support_threads(full: bool = False) -> int:
+    """
+    Repairs support_threads from support_messages with one windowed upsert; returns the users rebuilt.
+
+    Only users whose summary is missing or older than their newest message are recomputed (a scan of
+    ix_support_messages_user_ts_id), which covers an empty table, messages written by another process
+    and failed upserts. `full` recomputes every user, e.g. after messages were edited or deleted.
+    """
+    db = database.SessionLocal()
+    try:
+        users = "SELECT DISTINCT user_id FROM support_messages WHERE user_id IS NOT NULL" if full else _STALE_THREAD_USERS_SQL
+        count = db.execute(text(f"SELECT COUNT(*) FROM ({users})")).scalar()
+        if not count:
+            return 0
+        db.execute(text(f"""
+            INSERT INTO support_threads (user_id, last_message, last_timestamp, unread_count)
+            SELECT user_id, substr(message, 1, {THREAD_PREVIEW_CHARS}), timestamp, unread FROM (
+                SELECT user_id, message, timestamp,
+                       ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY timestamp DESC) AS rn,
+                       SUM(CASE WHEN is_read = 0 AND is_from_admin = 0 THEN 1 ELSE 0 END) OVER (PARTITION BY user_id) AS unread
+                FROM support_messages WHERE user_id IN ({users})
+            ) WHERE rn = 1
+            ON CONFLICT(user_id) DO UPDATE SET
+                last_message = excluded.last_message, last_timestamp = excluded.last_timestamp, unread_count = excluded.unread_count
+        """))
+        db.commit()
+        logger.info(f"Rebuilt {count} support thread summaries")
+        return count
+    finally:
+        db.close()
+
+
+class ChatWriteQueue:
+    """
+    Write-behind queue for support chat messages.
+
+    WebSocket loops enqueue rows and return immediately. A single background task
+    drains the queue every few milliseconds and persists the whole batch with one
+    session and one commit on a worker thread, so SQLite I/O never blocks the event loop.
+    """
+
+    def __init__(self, flush_interval_ms: int = CHAT_FLUSH_INTERVAL_MS, max_batch: int = CHAT_FLUSH_MAX_BATCH):
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.max_batch = max_batch
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the writer and flushes whatever is still queued."""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        while not self.queue.empty():
+            batch = self._drain([])
+            await asyncio.to_thread(self._persist, batch)
+
+    def enqueue(self, user_id: str, message: str, is_from_admin: bool = False, is_read: bool = False) -> str:
+        """Queues a message for persistence and returns its id without touching the DB."""
+        msg_id = str(uuid.uuid4())
+        self.queue.put_nowait({
+            "id": msg_id,
+            "user_id": user_id,
+            "message": message,
+            "timestamp": datetime.now(),
+            "is_read": is_read,
+            "is_from_admin": is_from_admin
+        })
+        return msg_id
+
+    def _drain(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        while len(batch) < self.max_batch and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    def _requeue(self, batch: List[Dict[str, Any]]):
+        """Puts `batch` back at the head of the queue, ahead of anything queued since."""
+        rest = []
+        while not self.queue.empty(): rest.append(self.queue.get_nowait())
+        for row in batch + rest: self.queue.put_nowait(row)
+
+    async def _run(self):
+        while True:
+            first = await self.queue.get()
+            # Let a burst accumulate so it lands in a single commit
+            try:
+                await asyncio.sleep(self.flush_interval)
+            except asyncio.CancelledError:
+                self._requeue([first]) # Already dequeued; stop() persists it with the rest
+                raise
+            batch = self._drain([first])
+            try:
+                await asyncio.to_thread(self._persist, batch)
+            except Exception as e:
+                # The senders were already told "sent"; nothing was committed, so retry the batch
+                logger.error(f"Chat Flush Error ({len(batch)} msgs): {e}")
+                self._requeue(batch)
+                await asyncio.sleep(1)
+
+    def _persist(self, batch: List[Dict[str, Any]]):
+        db = database.SessionLocal()
+        try:
+            db.bulk_insert_mappings(models.SupportMessage, batch)
+            update_support_threads(db, batch)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if "--rebuild" in sys.argv:
+        print(f"Rebuilt {rebuild_support_threads(full='--full' in sys.argv)} support threads")
+    else:
+        print("Usage: python chat_queue.py --rebuild [--full]")
@@ -0,0 +1,196 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+from sqlalchemy import tuple_, func
+from sqlalchemy.orm import Session
+
+import models
+
+# Configuration
+FEED_PAGE_DEFAULT = 50
+FEED_PAGE_MAX = 100
+FEED_CACHE_TTL_SECONDS = float(os.getenv("FEED_CACHE_TTL_SECONDS", 5)) # Bounds like-count staleness (and cross-process moderation lag)
+FEED_CACHE_PAGES = 64
+COMMENT_PAGE_DEFAULT = 20
+COMMENT_PAGE_MAX = 100
+COMMENT_CACHE_TTL_SECONDS = float(os.getenv("COMMENT_CACHE_TTL_SECONDS", 300)) # Writes invalidate; the TTL only bounds cross-process staleness
+COMMENT_CACHE_POSTS = 256
+
+
+class PageCache:
+    """
+    Small per-process LRU of rendered pages with a TTL.
+
+    Writers call `discard(key)` or `invalidate()` after committing. A reader that missed takes
+    `generation` before querying and passes it to `put`, so a page read before a concurrent
+    write cannot be stored after that write's invalidation.
+    """
+
+    def __init__(self, ttl: float, max_pages: int):
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self._pages: "OrderedDict[Any, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._pages.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, rows: List[Dict[str, Any]], generation: int):
+        with self._lock:
+            if generation != self.generation: return
+            self._pages[key] = (time.monotonic() + self.ttl, rows)
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self.generation += 1
+            self._pages.pop(key, None)
+
+    def invalidate(self):
+        with self._lock:
+            self.generation += 1
+            self._pages.clear()
+
+
+# Approved-feed pages shared by every user; moderation invalidates it
+feed_cache = PageCache(FEED_CACHE_TTL_SECONDS, FEED_CACHE_PAGES)
+# First comment page per post; every comment write discards its post's entry
+comment_cache = PageCache(COMMENT_CACHE_TTL_SECONDS, COMMENT_CACHE_POSTS)
+
+
+def encode_cursor(created_at: datetime, post_id: str) -> str:
+    return f"{created_at.isoformat()}|{post_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    ts, _, post_id = cursor.rpartition("|")
+    return datetime.fromisoformat(ts), post_id
+
+
+def _public_fields(p: models.CommunityPost) -> Dict[str, Any]:
+    return {
+        "id": p.id, "content": p.content, "author_name": p.author_name, "author_id": p.author_id, "author_pic": p.author_id,
+        "likes_count": p.likes_count or 0, "comments_count": p.comments_count or 0, "status": p.status,
+        "is_approved": p.status == "APPROVED", "admin_feedback": p.admin_feedback,
+        "created_at": p.created_at.isoformat() if p.created_at else None, "_sort": (p.created_at, p.id)
+    }
+
+
+def _page_query(query, cursor: Optional[str], limit: int):
+    if cursor:
+        ts, post_id = decode_cursor(cursor)
+        query = query.filter(tuple_(models.CommunityPost.created_at, models.CommunityPost.id) < tuple_(ts, post_id))
+    return query.order_by(models.CommunityPost.created_at.desc(), models.CommunityPost.id.desc()).limit(limit).all()
+
+
+def load_approved_page(db: Session, cursor: Optional[str], limit: int) -> List[Dict[str, Any]]:
+    """Approved posts after `cursor` (up to limit+1 rows), served from the shared cache when fresh."""
+    key = (cursor, limit)
+    rows = feed_cache.get(key)
+    if rows is None:
+        generation = feed_cache.generation
+        posts = _page_query(db.query(models.CommunityPost).filter(models.CommunityPost.status == "APPROVED"), cursor, limit + 1)
+        rows = [_public_fields(p) for p in posts]
+        feed_cache.put(key, rows, generation)
+    return rows
+
+
+def load_feed(db: Session, user_id: str, cursor: Optional[str] = None, limit: int = FEED_PAGE_DEFAULT) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Approved posts plus the caller's own unapproved ones, newest first, and the next cursor.
+
+    Both sources are range scans on their own (status|author_id, created_at, id) index with the
+    same keyset bound, merged in memory, so nothing is fanned out per user and no OR defeats
+    the indexes. `is_liked` is one IN query over the returned ids.
+    """
+    limit = max(1, min(limit, FEED_PAGE_MAX))
+    approved = load_approved_page(db, cursor, limit)
+    own = _page_query(db.query(models.CommunityPost).filter(
+        models.CommunityPost.author_id == user_id, models.CommunityPost.status != "APPROVED"
+    ), cursor, limit + 1)
+    merged = sorted(approved + [_public_fields(p) for p in own], key=lambda r: r["_sort"], reverse=True)
+    page, has_more = merged[:limit], len(merged) > limit
+
+    ids = [r["id"] for r in page]
+    liked = {post_id for (post_id,) in db.query(models.CommunityLike.post_id).filter(
+        models.CommunityLike.user_id == user_id, models.CommunityLike.post_id.in_(ids)
+    )} if ids else set()
+
+    items = []
+    for r in page:
+        item = {k: v for k, v in r.items() if k != "_sort"}
+        item["is_liked"] = r["id"] in liked
+        item["is_mine"] = r["author_id"] == user_id
+        if not item["is_mine"]: item["admin_feedback"] = None # Only show feedback to author
+        items.append(item)
+    next_cursor = encode_cursor(*page[-1]["_sort"]) if has_more and page[-1]["_sort"][0] else None
+    return items, next_cursor
+
+
+def _comment_fields(c: models.CommunityComment) -> Dict[str, Any]:
+    return {
+        "id": c.id, "post_id": c.post_id, "user_id": c.user_id, "user_name": c.user_name, "content": c.content,
+        "created_at": c.created_at.isoformat() if c.created_at else None, "_sort": (c.created_at, c.id)
+    }
+
+
+def load_comments(db: Session, post_id: str, cursor: Optional[str] = None, limit: int = COMMENT_PAGE_DEFAULT) -> Dict[str, Any]:
+    """
+    One page of a post's comments, oldest first, with the cursor of the next page.
+
+    Pages are range scans on (post_id, created_at, id). The default first page of each thread
+    is what most views ask for, so it is served from `comment_cache` until a write discards it.
+    """
+    limit = max(1, min(limit, COMMENT_PAGE_MAX))
+    cacheable = cursor is None and limit == COMMENT_PAGE_DEFAULT
+    rows = comment_cache.get(post_id) if cacheable else None
+    if rows is None:
+        generation = comment_cache.generation
+        query = db.query(models.CommunityComment).filter(models.CommunityComment.post_id == post_id)
+        if cursor:
+            ts, comment_id = decode_cursor(cursor)
+            query = query.filter(tuple_(models.CommunityComment.created_at, models.CommunityComment.id) > tuple_(ts, comment_id))
+        comments = query.order_by(models.CommunityComment.created_at, models.CommunityComment.id).limit(limit + 1).all()
+        rows = [_comment_fields(c) for c in comments]
+        if cacheable: comment_cache.put(post_id, rows, generation)
+    page = rows[:limit]
+    next_cursor = encode_cursor(*page[-1]["_sort"]) if len(rows) > limit and page[-1]["_sort"][0] else None
+    return {"items": [{k: v for k, v in r.items() if k != "_sort"} for r in page], "next_cursor": next_cursor}
+
+
+def add_comment(db: Session, post_id: str, user_id: str, user_name: str, content: str) -> models.CommunityComment:
+    """Inserts a comment and bumps the post's counter in the same transaction (SQL-side, so concurrent writers can't lose increments)."""
+    comment = models.CommunityComment(id=str(uuid.uuid4()), post_id=post_id, user_id=user_id, user_name=user_name, content=content, created_at=datetime.utcnow())
+    db.add(comment)
+    db.query(models.CommunityPost).filter(models.CommunityPost.id == post_id).update(
+        {models.CommunityPost.comments_count: func.coalesce(models.CommunityPost.comments_count, 0) + 1}, synchronize_session=False)
+    db.commit()
+    comment_cache.discard(post_id)
+    return comment
+
+
+def delete_comment(db: Session, comment: models.CommunityComment):
+    """Removes a comment and decrements its post's counter atomically (never below zero)."""
+    post_id = comment.post_id
+    db.delete(comment)
+    db.query(models.CommunityPost).filter(models.CommunityPost.id == post_id).update(
+        {models.CommunityPost.comments_count: func.max(func.coalesce(models.CommunityPost.comments_count, 0) - 1, 0)}, synchronize_session=False)
+    db.commit()
+    comment_cache.discard(post_id)
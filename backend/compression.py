@@ -0,0 +1,127 @@
+import os
+import zlib
+from typing import Optional
+
+try:
+    import brotli # Optional: br is only negotiated when installed
+except ImportError:
+    brotli = None
+
+# Configuration
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4)) # Dynamic responses: fast settings; static assets are precompressed at max quality
+COMPRESSIBLE_TYPES = ("application/json", "application/jsonl", "application/x-ndjson", "application/javascript",
+                      "application/xml", "image/svg+xml", "text/")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.lower())
+    if brotli is not None and "br" in accepted: return "br"
+    if "gzip" in accepted: return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._gz = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31) # wbits 31 = gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compresses and flushes, so streamed lines reach the client without waiting for more output."""
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.flush()
+        return self._gz.compress(data) + self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self._br.process(data) + self._br.finish()
+        return self._gz.compress(data) + self._gz.flush()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing text/JSON responses with br (if brotli is installed) or gzip.
+
+    Single-body responses below COMPRESSION_MIN_BYTES are sent as-is; streamed responses
+    (NDJSON, file chunks) are compressed chunk by chunk. Responses that already carry a
+    Content-Encoding (precompressed static files), partial content and 304s are untouched.
+    A strong ETag is weakened, since the compressed bytes differ from the identity form.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        def eligible(message) -> bool:
+            if message["status"] != 200: return False
+            headers = {k.lower(): v for k, v in message.get("headers", [])}
+            if b"content-encoding" in headers: return False
+            content_type = headers.get(b"content-type", b"").decode("latin-1")
+            return content_type.startswith(COMPRESSIBLE_TYPES)
+
+        def encoded_headers(message, length: Optional[int]):
+            headers = []
+            vary = None
+            for k, v in message.get("headers", []):
+                name = k.lower()
+                if name == b"content-length": continue
+                if name == b"vary": vary = v; continue
+                if name == b"etag" and not v.startswith(b"W/"): v = b"W/" + v
+                headers.append((k, v))
+            headers.append((b"content-encoding", encoding.encode("latin-1")))
+            headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+            if length is not None: headers.append((b"content-length", str(length).encode("latin-1")))
+            return {**message, "headers": headers}
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                if start is not None:
+                    await send(start); start = None
+                passthrough = True
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if compressor is None:
+                if not eligible(start) or (not more_body and len(body) < COMPRESSION_MIN_BYTES):
+                    passthrough = True
+                    await send(start); start = None
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding)
+                if not more_body:
+                    data = compressor.finish(body)
+                    await send(encoded_headers(start, len(data)))
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                await send(encoded_headers(start, None))
+                start = None
+            data = compressor.chunk(body) if more_body else compressor.finish(body)
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
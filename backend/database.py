@@ -1,9 +1,10 @@
+import os
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-# Connect to the SQLite file
-SQLALCHEMY_DATABASE_URL = "sqlite:///./medical_platform.db"
+# Connect to the SQLite file (DATABASE_URL lets benchmarks point the app at a scratch DB)
+SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./medical_platform.db")
 
 # check_same_thread=False is required for SQLite in FastAPI
 engine = create_engine(
@@ -0,0 +1,186 @@
+import os
+import asyncio
+import heapq
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Tuple, Optional
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+import database
+import models
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SCHEDULER_LEASE_SECONDS = int(os.getenv("SCHEDULER_LEASE_SECONDS", 30))
+SCHEDULER_RESYNC_SECONDS = int(os.getenv("SCHEDULER_RESYNC_SECONDS", 300))
+SCHEDULER_RETRY_SECONDS = 1 # Pause before retrying deadlines whose finalization failed (e.g. database busy)
+
+
+def acquire_lease(name: str, owner: str, ttl_seconds: int) -> bool:
+    """Takes or renews a named lease row. Only one process holds a given lease at a time."""
+    db = database.SessionLocal()
+    try:
+        now = datetime.utcnow()
+        expires = now + timedelta(seconds=ttl_seconds)
+        db.execute(sqlite_insert(models.SchedulerLease).values(name=name, owner=owner, expires_at=expires).on_conflict_do_nothing())
+        claimed = db.query(models.SchedulerLease).filter(
+            models.SchedulerLease.name == name,
+            (models.SchedulerLease.owner == owner) | (models.SchedulerLease.expires_at < now)
+        ).update({"owner": owner, "expires_at": expires}, synchronize_session=False)
+        db.commit()
+        return claimed == 1
+    finally:
+        db.close()
+
+
+def release_lease(name: str, owner: str):
+    db = database.SessionLocal()
+    try:
+        db.query(models.SchedulerLease).filter(models.SchedulerLease.name == name, models.SchedulerLease.owner == owner).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+def load_open_deadlines() -> List[Tuple[datetime, str]]:
+    """Reads (deadline, project_id) for every open project; served by ix_projects_open_deadline."""
+    db = database.SessionLocal()
+    try:
+        rows = db.query(models.Project.deadline, models.Project.id).filter(
+            models.Project.is_finalized == False, models.Project.deadline != None
+        ).all()
+        return [(d, pid) for d, pid in rows]
+    finally:
+        db.close()
+
+
+def finalize_projects(project_ids: List[str], now: datetime) -> int:
+    """Locks every due project in one conditional UPDATE; safe to repeat from any worker."""
+    db = database.SessionLocal()
+    try:
+        count = db.query(models.Project).filter(
+            models.Project.id.in_(project_ids),
+            models.Project.is_finalized == False,
+            models.Project.deadline != None,
+            models.Project.deadline <= now
+        ).update({"is_finalized": True}, synchronize_session=False)
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+class DeadlineScheduler:
+    """
+    Finalizes projects at their exact deadline.
+
+    Upcoming deadlines live in a min-heap and the loop sleeps until the earliest one
+    (or until `schedule()` pushes an earlier one). The process holding the DB lease owns
+    the full heap, rebuilt from the DB when it takes leadership and every resync interval.
+    Other workers only fire the deadlines they assigned themselves. Finalization is an
+    idempotent conditional UPDATE, so a deadline fired twice is harmless.
+    """
+
+    LEASE_NAME = "deadline_scheduler"
+
+    def __init__(self, lease_seconds: int = SCHEDULER_LEASE_SECONDS, resync_seconds: int = SCHEDULER_RESYNC_SECONDS):
+        self.lease_seconds = lease_seconds
+        self.resync_seconds = resync_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+        self.last_lag = 0.0 # Seconds between a deadline and its finalization
+        self._heap: List[Tuple[datetime, str]] = []
+        self._wakeup = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.is_leader:
+            await asyncio.to_thread(release_lease, self.LEASE_NAME, self.owner)
+            self.is_leader = False
+
+    def schedule(self, project_id: str, deadline: datetime):
+        """Registers a deadline. Safe to call from sync route handlers running in the threadpool."""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._push, deadline, project_id)
+
+    def _push(self, deadline: datetime, project_id: str):
+        heapq.heappush(self._heap, (deadline, project_id))
+        if self._heap[0] == (deadline, project_id):
+            self._wakeup.set()
+
+    async def _sync_leadership(self):
+        was_leader = self.is_leader
+        self.is_leader = await asyncio.to_thread(acquire_lease, self.LEASE_NAME, self.owner, self.lease_seconds)
+        if self.is_leader and not was_leader:
+            logger.info(f"Deadline scheduler leadership acquired ({self.owner})")
+        return self.is_leader and not was_leader
+
+    async def _resync(self):
+        entries = await asyncio.to_thread(load_open_deadlines)
+        heapq.heapify(entries)
+        self._heap = entries
+
+    async def _fire_due(self):
+        now = datetime.now()
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due.append(heapq.heappop(self._heap))
+        if not due:
+            return
+        try:
+            count = await asyncio.to_thread(finalize_projects, [pid for _, pid in due], now)
+        except Exception as e:
+            # The UPDATE is one transaction, so nothing was finalized; keep the deadlines for the retry
+            logger.error(f"Deadline Finalize Error ({len(due)} projects): {e}")
+            for entry in due: heapq.heappush(self._heap, entry)
+            await asyncio.sleep(SCHEDULER_RETRY_SECONDS)
+            return
+        self.last_lag = (datetime.now() - due[0][0]).total_seconds()
+        if count:
+            logger.info(f"Deadline scheduler finalized {count} project(s)")
+
+    async def _run(self):
+        renew_every = self.lease_seconds / 3
+        next_renew = next_resync = 0.0
+        while True:
+            try:
+                loop_now = self._loop.time()
+                if loop_now >= next_renew:
+                    if await self._sync_leadership():
+                        next_resync = 0.0
+                    next_renew = loop_now + renew_every
+                if self.is_leader and loop_now >= next_resync:
+                    await self._resync()
+                    next_resync = loop_now + self.resync_seconds
+                await self._fire_due()
+            except Exception as e:
+                logger.error(f"Deadline Scheduler Error: {e}")
+
+            timeout = next_renew - self._loop.time()
+            if self._heap:
+                timeout = min(timeout, (self._heap[0][0] - datetime.now()).total_seconds())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,210 @@
+import os
+import io
+import csv
+import sys
+import json
+import uuid
+import shutil
+import logging
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+import database
+import models
+from fast_json import dumps
+from submission_codec import load_review_rows
+from deadline_scheduler import acquire_lease, release_lease
+
+try:
+    import pyarrow # Optional: parquet exports are only available when installed
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = pq = None
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+EXPORT_DIR = os.getenv("EXPORT_DIR", "exports")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", max(1, (os.cpu_count() or 2) - 1)))
+EXPORT_SHARD_PROJECTS = int(os.getenv("EXPORT_SHARD_PROJECTS", 200)) # Approved projects per output file; one shard runs without the pool
+EXPORT_SETTLE_SECONDS = int(os.getenv("EXPORT_SETTLE_SECONDS", 60)) # Approvals younger than this wait for the next run
+EXPORT_LEASE_SECONDS = 3600
+EXPORT_FORMATS = {"jsonl": ".jsonl", "csv": ".csv", "parquet": ".parquet"}
+EXPORT_COLUMNS = ["project_id", "completed_at", "annotator_id", "image_id", "image_url", "sequence", "data"]
+
+
+class ExportError(ValueError):
+    """An export that cannot be started (unknown format, missing pyarrow, stream already running)."""
+
+
+def check_format(fmt: str):
+    if fmt not in EXPORT_FORMATS: raise ExportError(f"Unknown export format '{fmt}' (use {', '.join(EXPORT_FORMATS)})")
+    if fmt == "parquet" and pyarrow is None: raise ExportError("Parquet export needs pyarrow installed")
+
+
+def last_watermark(db: Session, name: str, fmt: str) -> Optional[Tuple[datetime, str]]:
+    run = db.query(models.DatasetExport).filter(
+        models.DatasetExport.name == name, models.DatasetExport.format == fmt, models.DatasetExport.status == "SUCCEEDED",
+        models.DatasetExport.watermark_project_id.isnot(None)
+    ).order_by(models.DatasetExport.started_at.desc()).first()
+    return (run.watermark_completed_at, run.watermark_project_id) if run else None
+
+
+def pending_projects(db: Session, since: Optional[Tuple[datetime, str]], max_projects: Optional[int] = None) -> List[Tuple[str, Optional[str], datetime]]:
+    """Approved projects completed after `since`, oldest first (ix_projects_approved_completed)."""
+    q = db.query(models.Project.id, models.Project.assigned_to_id, models.Project.completed_at).filter(
+        models.Project.is_approved == True, models.Project.completed_at.isnot(None),
+        # A payout job commits completed_at after setting it; waiting lets a slower commit land before the watermark passes it
+        models.Project.completed_at <= datetime.now() - timedelta(seconds=EXPORT_SETTLE_SECONDS)
+    )
+    if since: q = q.filter(tuple_(models.Project.completed_at, models.Project.id) > since)
+    q = q.order_by(models.Project.completed_at, models.Project.id)
+    if max_projects: q = q.limit(max_projects)
+    return [(r.id, r.assigned_to_id, r.completed_at) for r in q.all()]
+
+
+def _project_rows(db: Session, project_id: str, assignee_id: Optional[str], completed_at: str) -> List[Dict[str, Any]]:
+    return [{"project_id": project_id, "completed_at": completed_at, "annotator_id": assignee_id, "image_id": row["image_id"],
+             "image_url": row["image_url"], "sequence": row["sequence"], "data": row["data"]}
+            for row in load_review_rows(db, project_id, assignee_id) if row["status"] != "PENDING"]
+
+
+def export_shard(run_dir: str, shard_no: int, fmt: str, projects: List[Tuple[str, Optional[str], str]]) -> Dict[str, Any]:
+    """
+    Writes one shard file for a slice of projects and returns {"file", "rows"}.
+
+    Runs in a pool process with its own session. Rows are written project by project, so memory
+    holds one project at a time; the file appears under its final name only once complete.
+    """
+    filename = f"part-{shard_no:05d}{EXPORT_FORMATS[fmt]}"
+    path = os.path.join(run_dir, filename)
+    tmp = path + ".tmp"
+    rows = 0
+    db = database.SessionLocal()
+    try:
+        if fmt == "parquet":
+            schema = pyarrow.schema([(c, pyarrow.int64() if c == "sequence" else pyarrow.string()) for c in EXPORT_COLUMNS])
+            with pq.ParquetWriter(tmp, schema, compression="zstd") as writer:
+                for project in projects:
+                    batch = _project_rows(db, *project)
+                    for row in batch: row["data"] = dumps(row["data"]).decode("utf-8")
+                    if batch: writer.write_table(pyarrow.Table.from_pylist(batch, schema=schema))
+                    rows += len(batch)
+        else:
+            with open(tmp, "wb") as f:
+                if fmt == "jsonl":
+                    for project in projects:
+                        batch = _project_rows(db, *project)
+                        f.write(b"".join(dumps(row) + b"\n" for row in batch))
+                        rows += len(batch)
+                else:
+                    text = io.TextIOWrapper(f, encoding="utf-8", newline="")
+                    writer = csv.writer(text)
+                    writer.writerow(EXPORT_COLUMNS)
+                    for project in projects:
+                        batch = _project_rows(db, *project)
+                        for row in batch: row["data"] = dumps(row["data"]).decode("utf-8") # Schemas differ per project, so the form stays one JSON column
+                        writer.writerows([row[c] for c in EXPORT_COLUMNS] for row in batch)
+                        rows += len(batch)
+                    text.flush(); text.detach()
+    finally:
+        db.close()
+    os.replace(tmp, path)
+    return {"file": filename, "rows": rows}
+
+
+def serialize_export(run: models.DatasetExport) -> Dict[str, Any]:
+    return {
+        "id": run.id, "name": run.name, "format": run.format, "status": run.status, "full": run.full,
+        "watermark": {"completed_at": run.watermark_completed_at, "project_id": run.watermark_project_id} if run.watermark_project_id else None,
+        "projects": run.projects, "rows": run.rows, "files": json.loads(run.files) if run.files else [],
+        "error": run.error, "started_at": run.started_at, "finished_at": run.finished_at
+    }
+
+
+def export_run_dir(run: models.DatasetExport) -> str:
+    return os.path.join(EXPORT_DIR, run.name, run.id)
+
+
+def run_export(fmt: str = "jsonl", name: str = "default", full: bool = False, workers: int = EXPORT_WORKERS,
+               max_projects: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Exports approved annotations completed since the stream's watermark (everything with `full`).
+
+    Shards of EXPORT_SHARD_PROJECTS projects are written in parallel by a process pool. The run row,
+    and with it the new watermark, is only marked SUCCEEDED once every shard is on disk, so a failed
+    run is simply redone by the next one. A lease keeps two runs of the same stream from overlapping.
+    """
+    check_format(fmt)
+    lease, owner = f"export:{name}:{fmt}", str(uuid.uuid4())
+    if not acquire_lease(lease, owner, EXPORT_LEASE_SECONDS): raise ExportError(f"A {fmt} export of '{name}' is already running")
+    db = database.SessionLocal()
+    run = None
+    try:
+        since = None if full else last_watermark(db, name, fmt)
+        projects = pending_projects(db, since, max_projects)
+        run = models.DatasetExport(id=str(uuid.uuid4()), name=name, format=fmt, status="RUNNING", full=full, started_at=datetime.now())
+        db.add(run); db.commit()
+        run_dir = export_run_dir(run)
+        os.makedirs(run_dir, exist_ok=True)
+
+        shards = [[(pid, assignee, completed.isoformat()) for pid, assignee, completed in projects[i:i + EXPORT_SHARD_PROJECTS]]
+                  for i in range(0, len(projects), EXPORT_SHARD_PROJECTS)]
+        # Job workers are daemon processes, which may not start children; they export in-process instead
+        if workers > 1 and len(shards) > 1 and not multiprocessing.current_process().daemon:
+            with ProcessPoolExecutor(max_workers=min(workers, len(shards)), mp_context=multiprocessing.get_context("spawn")) as pool:
+                futures = [pool.submit(export_shard, run_dir, n, fmt, shard) for n, shard in enumerate(shards)]
+                results = []
+                for future in futures:
+                    results.append(future.result())
+                    acquire_lease(lease, owner, EXPORT_LEASE_SECONDS)
+        else:
+            results = []
+            for n, shard in enumerate(shards):
+                results.append(export_shard(run_dir, n, fmt, shard))
+                acquire_lease(lease, owner, EXPORT_LEASE_SECONDS)
+
+        run.status = "SUCCEEDED"
+        run.projects = len(projects)
+        run.rows = sum(r["rows"] for r in results)
+        run.files = json.dumps([r["file"] for r in results])
+        if projects:
+            run.watermark_completed_at, run.watermark_project_id = projects[-1][2], projects[-1][0]
+        elif since:
+            run.watermark_completed_at, run.watermark_project_id = since
+        run.finished_at = datetime.now()
+        with open(os.path.join(run_dir, "manifest.json"), "wb") as f:
+            f.write(dumps(serialize_export(run)))
+        db.commit()
+        logger.info(f"Export {run.id} ({name}/{fmt}): {run.rows} rows from {run.projects} projects in {len(results)} files")
+        return serialize_export(run)
+    except Exception as e:
+        db.rollback()
+        if run is not None:
+            run.status, run.error, run.finished_at = "FAILED", str(e)[:1000], datetime.now()
+            db.commit()
+            shutil.rmtree(export_run_dir(run), ignore_errors=True)
+        raise
+    finally:
+        db.close()
+        release_lease(lease, owner)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export approved annotations (incremental from the last run unless --full)")
+    parser.add_argument("--format", default="jsonl", choices=sorted(EXPORT_FORMATS))
+    parser.add_argument("--name", default="default", help="Dataset stream; each name/format pair keeps its own watermark")
+    parser.add_argument("--full", action="store_true", help="Ignore the watermark and export every approved project")
+    parser.add_argument("--workers", type=int, default=EXPORT_WORKERS)
+    parser.add_argument("--max-projects", type=int, default=None)
+    args = parser.parse_args()
+    sys.path.append(os.getcwd())
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    models.Base.metadata.create_all(bind=database.engine)
+    print(json.dumps(run_export(args.format, args.name, args.full, args.workers, args.max_projects), indent=2, default=str))
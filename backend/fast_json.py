@@ -0,0 +1,39 @@
+import json
+from decimal import Decimal
+from typing import Any
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from starlette.responses import JSONResponse
+
+try:
+    import orjson # Optional: falls back to the stdlib encoder when missing
+except ImportError:
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    """Types orjson does not serialise natively (it already handles datetime, date, UUID, dataclasses)."""
+    if isinstance(obj, Decimal): return float(obj)
+    if isinstance(obj, (set, frozenset)): return list(obj)
+    if isinstance(obj, BaseModel): return obj.model_dump(mode="json")
+    return jsonable_encoder(obj) # ORM objects and anything else FastAPI knows how to encode
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse rendered with orjson (the app's default response class).
+
+    FastAPI still runs `jsonable_encoder` over plain return values before rendering; routes
+    returning large lists build this response themselves to skip that pass, since orjson
+    encodes dicts, lists and datetimes directly.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,80 @@
+import re
+import logging
+from typing import Optional, Sequence
+
+from sqlalchemy import text
+
+import database
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_fts_table(name: str, source: str, columns: Sequence[str], content_rowid: str = "rowid", key: Optional[str] = None):
+    """
+    Creates an FTS5 table over `source` plus the triggers that keep it in sync.
+
+    With `content_rowid` (an INTEGER PRIMARY KEY) the index is external-content: it stores only
+    tokens and reads the text back from `source`. Sources keyed by anything else pass `key`
+    instead: their implicit rowid may be renumbered by VACUUM, so the FTS table keeps its own
+    copy of the text plus `key` as an UNINDEXED column, and hits are joined on that.
+
+    The index is (re)built whenever it is new, its layout changed, or its triggers were missing,
+    which is what happens when `source` is dropped and recreated (e.g. by setup_database.py).
+    Afterwards the triggers maintain it on every insert, delete and update of the indexed columns.
+    """
+    cols = ", ".join(columns)
+    new_vals = ", ".join(f"new.{c}" for c in columns)
+    old_vals = ", ".join(f"old.{c}" for c in columns)
+    if key:
+        using = f"fts5({key} UNINDEXED, {cols}, tokenize='unicode61')"
+        on_insert = f"INSERT INTO {name}({key}, {cols}) VALUES (new.{key}, {new_vals});"
+        on_delete = f"DELETE FROM {name} WHERE {key} = old.{key};"
+        watched = f"{key}, {cols}"
+    else:
+        using = f"fts5({cols}, content='{source}', content_rowid='{content_rowid}', tokenize='unicode61')"
+        on_insert = f"INSERT INTO {name}(rowid, {cols}) VALUES (new.{content_rowid}, {new_vals});"
+        on_delete = f"INSERT INTO {name}({name}, rowid, {cols}) VALUES ('delete', old.{content_rowid}, {old_vals});"
+        watched = cols
+    triggers = {
+        f"{name}_ai": f"AFTER INSERT ON {source} BEGIN {on_insert} END",
+        f"{name}_ad": f"AFTER DELETE ON {source} BEGIN {on_delete} END",
+        f"{name}_au": f"AFTER UPDATE OF {watched} ON {source} BEGIN {on_delete} {on_insert} END",
+    }
+    with database.engine.begin() as conn:
+        master = dict(conn.execute(text("SELECT name, sql FROM sqlite_master WHERE name = :n OR tbl_name = :s AND type = 'trigger'"),
+                                   {"n": name, "s": source}).fetchall())
+        stale = name in master and not master[name].endswith(f"USING {using}")
+        if stale:
+            conn.exec_driver_sql(f"DROP TABLE {name}")
+            for trigger in triggers: conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+        rebuild = stale or name not in master or f"{name}_ai" not in master
+        conn.exec_driver_sql(f"CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING {using}")
+        for trigger, body in triggers.items():
+            conn.exec_driver_sql(f"CREATE TRIGGER IF NOT EXISTS {trigger} {body}")
+        if rebuild:
+            rebuild_fts_table(conn, name, source, columns, key)
+            logger.info(f"Built full-text index {name} over {source}")
+
+
+def rebuild_fts_table(conn, name: str, source: str, columns: Sequence[str], key: Optional[str] = None):
+    """Refills an index from its source table (see ensure_fts_table for the two layouts)."""
+    if key:
+        cols = ", ".join(columns)
+        conn.exec_driver_sql(f"DELETE FROM {name}")
+        conn.exec_driver_sql(f"INSERT INTO {name}({key}, {cols}) SELECT {key}, {cols} FROM {source}")
+    else:
+        conn.exec_driver_sql(f"INSERT INTO {name}({name}) VALUES ('rebuild')")
+
+
+def to_match_query(user_text: str) -> str:
+    """
+    Turns free text into a safe FTS5 MATCH expression: every word must appear, the last one
+    as a prefix (search-as-you-type). Returns "" when there is nothing to search for.
+    """
+    tokens = _TOKEN_RE.findall(user_text or "")
+    if not tokens:
+        return ""
+    terms = [f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*']
+    return " ".join(terms)
@@ -0,0 +1,99 @@
+import uuid
+from datetime import datetime
+from typing import Dict, Any
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+import models
+from job_queue import job_handler
+from analytics import record_daily_stat
+from export_engine import run_export
+from quality_engine import score_project
+
+
+@job_handler("project_payout")
+def run_project_payout(db: Session, payload: Dict[str, Any]):
+    """Approves a project and credits the assignee. Commit is done by the job runner."""
+    project_id = payload["project_id"]
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project: raise ValueError(f"Project {project_id} not found")
+
+    # Idempotency check
+    if project.is_approved: return {"project_id": project_id, "payout": project.payout_amount, "already_approved": True}
+    # The approval no longer stands: rejected after this job was queued, reopened, or approved in an earlier round
+    if project.status == "REJECTED":
+        return {"project_id": project_id, "payout": 0, "skipped": "project was rejected after approval"}
+    if not project.is_finalized:
+        return {"project_id": project_id, "payout": 0, "skipped": "project is not finalized"}
+    if payload.get("review_round", 0) != (project.review_round or 0):
+        return {"project_id": project_id, "payout": 0, "skipped": f"approval was for review round {payload.get('review_round', 0)}, project is on round {project.review_round or 0}"}
+
+    project.is_approved = True
+    project.status = "COMPLETED"
+    project.is_finalized = True
+    project.completed_at = datetime.now()
+
+    # Calculate Payout
+    done = db.query(models.Assignment).join(models.Image).filter(
+        models.Image.project_id == project_id, models.Assignment.user_id == project.assigned_to_id
+    ).count() # Co-annotator labels are paid to the co-annotators below
+    payout = (done * project.salary_per_completion) + project.security_amount
+    project.payout_amount = payout
+
+    # A batch re-approved after a rejection was already paid once; only the difference is credited
+    paid = dict(db.query(models.WalletTransaction.employee_id, func.sum(models.WalletTransaction.amount)).filter(
+        models.WalletTransaction.related_project_id == project_id, models.WalletTransaction.transaction_type == "PROJECT_PAYOUT"
+    ).group_by(models.WalletTransaction.employee_id).all())
+
+    # Credit Employee
+    emp = db.query(models.Employee).filter(models.Employee.id == project.assigned_to_id).first()
+    credit = max(payout - (paid.get(emp.id) or 0), 0) if emp else 0
+    if credit > 0:
+        emp.wallet_balance = (emp.wallet_balance or 0) + credit
+        emp.total_earned = (emp.total_earned or 0) + credit
+        db.add(models.WalletTransaction(
+            id=str(uuid.uuid4()),
+            employee_id=emp.id,
+            amount=credit,
+            transaction_type="PROJECT_PAYOUT",
+            description=f"Project {project_id} approved",
+            related_project_id=project_id
+        ))
+    if emp: record_daily_stat(db, emp.id, earnings=credit, approvals=1)
+
+    # Co-annotators are paid per image they labelled; the security deposit belongs to the assignee
+    co_payouts = {}
+    co_annotators = db.query(models.ProjectAnnotator.user_id).filter(models.ProjectAnnotator.project_id == project_id).all()
+    for (user_id,) in co_annotators:
+        if user_id == project.assigned_to_id: continue
+        labelled = db.query(models.Assignment).join(models.Image).filter(models.Image.project_id == project_id, models.Assignment.user_id == user_id).count()
+        amount = labelled * project.salary_per_completion - (paid.get(user_id) or 0)
+        co_emp = db.query(models.Employee).filter(models.Employee.id == user_id).first()
+        if not co_emp or amount <= 0: continue
+        co_emp.wallet_balance = (co_emp.wallet_balance or 0) + amount
+        co_emp.total_earned = (co_emp.total_earned or 0) + amount
+        db.add(models.WalletTransaction(
+            id=str(uuid.uuid4()),
+            employee_id=user_id,
+            amount=amount,
+            transaction_type="PROJECT_PAYOUT",
+            description=f"Project {project_id} approved (co-annotation)",
+            related_project_id=project_id
+        ))
+        record_daily_stat(db, user_id, earnings=amount, approvals=1)
+        co_payouts[user_id] = amount
+    return {"project_id": project_id, "payout": payout, "employee_id": project.assigned_to_id, "co_annotator_payouts": co_payouts}
+
+
+@job_handler("dataset_export")
+def run_dataset_export(db: Session, payload: Dict[str, Any]):
+    """Incremental dataset export (see export_engine.run_export). The export manages its own sessions."""
+    return run_export(payload.get("format", "jsonl"), payload.get("name", "default"), full=bool(payload.get("full")))
+
+
+@job_handler("project_quality")
+def run_project_quality(db: Session, payload: Dict[str, Any]):
+    """Recomputes agreement and annotator quality for a project (see quality_engine.score_project)."""
+    result = score_project(db, payload["project_id"])
+    return {"project_id": result["project_id"], "annotations": result["annotations"], "annotators": len(result["annotators"])}
@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import multiprocessing
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Any, Optional, List
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+import database
+import models
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 1))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 0.5))
+JOB_LOCK_TIMEOUT_SECONDS = int(os.getenv("JOB_LOCK_TIMEOUT_SECONDS", 600))
+JOB_BACKOFF_BASE_SECONDS = float(os.getenv("JOB_BACKOFF_BASE_SECONDS", 2))
+JOB_BACKOFF_MAX_SECONDS = float(os.getenv("JOB_BACKOFF_MAX_SECONDS", 300))
+
+# Priorities (higher runs first)
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+# kind -> handler(db, payload) -> JSON-serializable result
+JOB_HANDLERS: Dict[str, Callable[[Session, Dict[str, Any]], Any]] = {}
+
+
+def job_handler(kind: str):
+    """Registers a function as the handler for a job kind."""
+    def decorator(func):
+        JOB_HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def enqueue_job(db: Session, kind: str, payload: Dict[str, Any] = None, priority: int = PRIORITY_NORMAL,
+                idempotency_key: Optional[str] = None, max_attempts: int = 3, delay_seconds: float = 0) -> models.BackgroundJob:
+    """Persists a job. An existing job with the same idempotency key is returned instead of a duplicate."""
+    if idempotency_key:
+        existing = db.query(models.BackgroundJob).filter(models.BackgroundJob.idempotency_key == idempotency_key).first()
+        if existing: return existing
+    now = datetime.now()
+    job = models.BackgroundJob(
+        id=str(uuid.uuid4()),
+        kind=kind,
+        payload=json.dumps(payload or {}),
+        status="QUEUED",
+        priority=priority,
+        idempotency_key=idempotency_key,
+        attempts=0,
+        max_attempts=max_attempts,
+        run_after=now + timedelta(seconds=delay_seconds),
+        created_at=now
+    )
+    db.add(job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Lost the race against a concurrent enqueue with the same key
+        db.rollback()
+        return db.query(models.BackgroundJob).filter(models.BackgroundJob.idempotency_key == idempotency_key).first()
+    return job
+
+
+def serialize_job(job: models.BackgroundJob) -> Dict[str, Any]:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "priority": job.priority,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "idempotency_key": job.idempotency_key,
+        "payload": json.loads(job.payload) if job.payload else None,
+        "result": json.loads(job.result) if job.result else None,
+        "last_error": job.last_error,
+        "run_after": job.run_after.isoformat() if job.run_after else None,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None
+    }
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter: base * 2^(attempts-1), capped."""
+    delay = min(JOB_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), JOB_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def requeue_stale_jobs(db: Session) -> int:
+    """Returns jobs whose worker died mid-run to the queue."""
+    cutoff = datetime.now() - timedelta(seconds=JOB_LOCK_TIMEOUT_SECONDS)
+    count = db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.status == "RUNNING", models.BackgroundJob.locked_at < cutoff
+    ).update({"status": "QUEUED", "locked_by": None, "locked_at": None}, synchronize_session=False)
+    db.commit()
+    return count
+
+
+def claim_next_job(db: Session, worker_id: str) -> Optional[models.BackgroundJob]:
+    """Claims the highest-priority due job. The conditional UPDATE makes the claim atomic across processes."""
+    for _ in range(5):
+        now = datetime.now()
+        row = db.query(models.BackgroundJob.id).filter(
+            models.BackgroundJob.status == "QUEUED", models.BackgroundJob.run_after <= now
+        ).order_by(models.BackgroundJob.priority.desc(), models.BackgroundJob.created_at.asc()).first()
+        if not row: return None
+        claimed = db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.id == row.id, models.BackgroundJob.status == "QUEUED"
+        ).update({
+            "status": "RUNNING", "locked_by": worker_id, "locked_at": now,
+            "attempts": models.BackgroundJob.attempts + 1
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return db.query(models.BackgroundJob).filter(models.BackgroundJob.id == row.id).first()
+    return None
+
+
+def execute_job(db: Session, job: models.BackgroundJob):
+    """Runs a claimed job. Handler writes and the SUCCEEDED status land in the same commit."""
+    handler = JOB_HANDLERS.get(job.kind)
+    try:
+        if handler is None: raise ValueError(f"No handler registered for job kind '{job.kind}'")
+        result = handler(db, json.loads(job.payload) if job.payload else {})
+        job.status = "SUCCEEDED"
+        job.result = json.dumps(result, default=str) if result is not None else None
+        job.last_error = None
+        job.finished_at = datetime.now()
+        job.locked_by = None
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job.id).first()
+        job.last_error = str(e)[:1000]
+        job.locked_by = None
+        if job.attempts >= job.max_attempts:
+            job.status = "FAILED"
+            job.finished_at = datetime.now()
+            logger.error(f"Job {job.id} ({job.kind}) failed permanently: {e}")
+        else:
+            job.status = "QUEUED"
+            job.run_after = datetime.now() + timedelta(seconds=backoff_seconds(job.attempts))
+            logger.warning(f"Job {job.id} ({job.kind}) attempt {job.attempts} failed, retrying: {e}")
+        db.commit()
+
+
+def run_worker(worker_id: str, stop_event=None):
+    """Worker process entry point: claim, run, repeat."""
+    import job_handlers  # noqa: F401 (registers handlers)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    logger.info(f"Job worker {worker_id} started")
+    last_sweep = 0.0
+    while stop_event is None or not stop_event.is_set():
+        db = database.SessionLocal()
+        try:
+            if time.monotonic() - last_sweep > 60:
+                requeue_stale_jobs(db)
+                last_sweep = time.monotonic()
+            job = claim_next_job(db, worker_id)
+            if job:
+                execute_job(db, job)
+                continue
+        except Exception as e:
+            logger.error(f"Job worker {worker_id} error: {e}")
+        finally:
+            db.close()
+        time.sleep(JOB_POLL_SECONDS)
+
+
+class JobWorkerPool:
+    """Spawns job worker processes alongside the API so heavy work runs on spare cores."""
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.ctx = multiprocessing.get_context("spawn")
+        self.stop_event = None
+        self.processes: List[multiprocessing.Process] = []
+
+    def start(self):
+        if self.workers <= 0 or self.processes: return
+        self.stop_event = self.ctx.Event()
+        for i in range(self.workers):
+            worker_id = f"{os.getpid()}-w{i}"
+            proc = self.ctx.Process(target=run_worker, args=(worker_id, self.stop_event), name=f"job-worker-{i}", daemon=True)
+            proc.start()
+            self.processes.append(proc)
+
+    def stop(self, timeout: float = 5.0):
+        if self.stop_event: self.stop_event.set()
+        for proc in self.processes:
+            proc.join(timeout)
+            if proc.is_alive(): proc.terminate()
+        self.processes = []
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run background job workers without the API server")
+    parser.add_argument("--workers", type=int, default=max(JOB_WORKERS, 1))
+    args = parser.parse_args()
+    sys.path.append(os.getcwd())
+    models.Base.metadata.create_all(bind=database.engine)
+    if args.workers == 1:
+        run_worker(f"{os.getpid()}-cli")
+    else:
+        pool = JobWorkerPool(args.workers)
+        pool.start()
+        try:
+            for proc in pool.processes: proc.join()
+        except KeyboardInterrupt:
+            pool.stop()
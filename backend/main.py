@@ -5,19 +5,20 @@ import asyncio
 import json
 import uuid
 import shutil
+import time
 import bcrypt
+import anyio
 from datetime import datetime, timedelta
-import random
 from typing import Optional, List, Dict, Any
 
 from fastapi import FastAPI, Depends, HTTPException, Request, UploadFile, File, Form, status, WebSocket, WebSocketDisconnect, APIRouter
-from fastapi.responses import HTMLResponse, JSONResponse, FileResponse, StreamingResponse, RedirectResponse
+from fastapi.responses import Response, HTMLResponse, JSONResponse, FileResponse, StreamingResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
 
-from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, ForeignKey, DateTime, text, func
+from sqlalchemy import create_engine, Column, Integer, String, Float, Boolean, ForeignKey, DateTime, text, func, inspect
 from sqlalchemy.orm import relationship, sessionmaker, Session, declarative_base
 from jose import JWTError, jwt
 from dotenv import load_dotenv
@@ -28,6 +29,26 @@ sys.path.append(os.getcwd())
 import models
 import schemas
 import database
+from chat_queue import ChatWriteQueue, rebuild_support_threads
+from deadline_scheduler import DeadlineScheduler
+from allocator import WorkAllocator, run_allocation_cycle, ranked_annotators, work_unit_position, WORK_UNIT_IMAGES
+from job_queue import JobWorkerPool, enqueue_job, serialize_job, PRIORITY_HIGH, PRIORITY_LOW
+from analytics import record_daily_stat, rebuild_daily_stats, build_series, EARNING_TYPES, SERIES_DAYS
+from speed_tracker import SpeedTracker, start_work_timer, stop_work_timer
+from query_profiler import QueryProfilerMiddleware, install_query_listeners
+import metrics
+from logging_setup import configure_logging, shutdown_logging, RequestIdMiddleware, NonBlockingQueueHandler
+from search_index import ensure_search_indexes, search as run_search, matching_ids_clause, SEARCH_PAGE_DEFAULT
+from fts_index import to_match_query
+from submission_codec import encode_submission, decode_submission, ensure_default_schema, save_project_schema, registry as form_schemas, SubmissionError, load_review_rows, stream_review_rows, encode_review_cursor, decode_review_cursor, REVIEW_PAGE_MAX
+from fast_json import FastJSONResponse
+from compression import CompressionMiddleware
+from static_files import OptimizedStaticFiles, precompress_static
+from quality_engine import annotator_quality_summary
+from export_engine import check_format, serialize_export, export_run_dir, ExportError
+from response_cache import ResponseCacheMiddleware, cache_response, response_cache
+from community_feed import load_feed, feed_cache, FEED_PAGE_DEFAULT, load_comments, add_comment, delete_comment, COMMENT_PAGE_DEFAULT
+from audit_log import AuditLogWriter, seal_legacy_entries, verify_chain, ensure_audit_search_index, search_entries, AUDIT_PAGE_DEFAULT
 
 # --- CONFIGURATION ---
 load_dotenv()
@@ -36,6 +57,9 @@ ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 1440))
 WITHDRAWAL_MIN = float(os.getenv("WITHDRAWAL_MIN_AMOUNT", 100))
 WITHDRAWAL_MAX = float(os.getenv("WITHDRAWAL_MAX_AMOUNT", 50000))
+SUPPORT_PAGE_DEFAULT = int(os.getenv("SUPPORT_PAGE_DEFAULT", 200))
+SUPPORT_PAGE_MAX = int(os.getenv("SUPPORT_PAGE_MAX", 500))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN") # Bearer token for scrapers; without it /metrics is admin-only
 BASE_UPLOAD_DIR = "static/uploads"
 PROFILE_PIC_DIR = "static/profile_pics"
 
@@ -43,19 +67,49 @@ PROFILE_PIC_DIR = "static/profile_pics"
 for folder in [BASE_UPLOAD_DIR, PROFILE_PIC_DIR]:
     os.makedirs(folder, exist_ok=True)
 
-# Logger
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.FileHandler("backend.log"),
-        logging.StreamHandler()
-    ]
-)
+# Logger (queue-backed: JSON lines to rotated backend.log + console, written by a background thread)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # --- DATABASE ---
 models.Base.metadata.create_all(bind=database.engine)
+# create_all skips existing tables: columns added to them since, with the DDL (and default for existing rows) each needs
+ADDED_COLUMNS = [
+    ("assignments", "schema_id", "INTEGER"),                # Versioned msgpack submissions
+    ("assignments", "submission_blob", "BLOB"),
+    ("images", "gold_schema_id", "INTEGER"),                # Gold answers for quality scoring
+    ("images", "gold_blob", "BLOB"),
+    ("projects", "review_round", "INTEGER DEFAULT 0"),      # Payout jobs are keyed per review round
+    ("projects", "auto_assign", "BOOLEAN DEFAULT 0"),       # Work allocator
+    ("projects", "assigned_at", "TIMESTAMP"),
+    ("projects", "split_from_id", "TEXT"),
+]
+# ...and indexes added to them (by name, as declared on the models)
+ADDED_INDEXES = [
+    "ix_projects_open_deadline",                            # Deadline scheduler
+    "ix_support_messages_user_ts_id",                       # Support history cursors
+    "ix_audit_logs_ts_id", "ix_audit_logs_action_ts", "ix_audit_logs_user_ts", "ix_audit_logs_username_ts", # Audit search
+    "ix_community_posts_status_created", "ix_community_posts_author_created", # Community feed
+    "ix_community_comments_post_created",                   # Community comments
+    "ix_images_project_seq", "ix_assignments_image_user",   # Submission review
+    "ix_projects_approved_completed",                       # Dataset exports
+]
+
+def migrate_schema(engine):
+    """Adds ADDED_COLUMNS and ADDED_INDEXES missing from tables that create_all left as they were."""
+    with engine.begin() as conn:
+        columns_by_table = {}
+        for table_name, column_name, ddl in ADDED_COLUMNS:
+            if table_name not in columns_by_table:
+                columns_by_table[table_name] = {c["name"] for c in inspect(conn).get_columns(table_name)}
+            if column_name not in columns_by_table[table_name]:
+                conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {ddl}")
+        indexes = {index.name: index for table in models.Base.metadata.sorted_tables for index in table.indexes}
+        for name in ADDED_INDEXES: indexes[name].create(bind=conn, checkfirst=True)
+        # Superseded by ix_support_messages_user_ts_id (the id breaks timestamp ties in support history cursors)
+        conn.exec_driver_sql("DROP INDEX IF EXISTS ix_support_messages_user_ts")
+
+migrate_schema(database.engine)
 
 def get_db():
     db = database.SessionLocal()
@@ -110,6 +164,19 @@ def require_admin(current_user: models.Employee = Depends(get_current_user), tok
         raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Could not validate credentials")
     return current_user
 
+def user_id_from_token(token: str) -> Optional[str]:
+    """Subject of a valid (signed, unexpired) access token, without touching the DB."""
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+
+def token_is_admin(token: str) -> bool:
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("role") == "ADMIN"
+    except JWTError:
+        return False
+
 # --- UTILS & SERVICES ---
 
 class ConnectionManager:
@@ -134,16 +201,81 @@ class ConnectionManager:
         if websocket in self.admin_connections: self.admin_connections.remove(websocket)
 
     async def send_personal_message(self, message: dict, websocket: WebSocket):
-        await websocket.send_json(message)
+        metrics.ws_sends_in_flight.inc()
+        try:
+            await websocket.send_json(message)
+            metrics.ws_messages_sent.inc(audience="personal")
+        except Exception:
+            metrics.ws_send_failures.inc(audience="personal")
+            raise
+        finally:
+            metrics.ws_sends_in_flight.dec()
 
     async def broadcast_to_admins(self, message: dict):
         for connection in self.admin_connections:
+            metrics.ws_sends_in_flight.inc()
             try:
                 await connection.send_json(message)
+                metrics.ws_messages_sent.inc(audience="admin")
             except:
-                pass
+                metrics.ws_send_failures.inc(audience="admin")
+            finally:
+                metrics.ws_sends_in_flight.dec()
 
 manager = ConnectionManager()
+chat_queue = ChatWriteQueue()
+deadline_scheduler = DeadlineScheduler()
+job_pool = JobWorkerPool()
+
+def on_unit_assigned(assignment: Dict[str, Any]):
+    deadline_scheduler.schedule(assignment["project_id"], assignment["deadline"])
+    log_audit("PROJECT_AUTO_ASSIGNED", f"Assigned {assignment['project_id']} ({assignment['images']} images) to {assignment['username']}", None, "allocator")
+
+work_allocator = WorkAllocator(on_assigned=on_unit_assigned)
+speed_tracker = SpeedTracker()
+audit_writer = AuditLogWriter()
+
+def hash_password(password: str) -> str:
+    metrics.bcrypt_inflight.inc(); started = time.perf_counter()
+    try:
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    finally:
+        metrics.bcrypt_inflight.dec(); metrics.bcrypt_duration.observe(time.perf_counter() - started, op="hash")
+
+def verify_password(password: str, password_hash: str) -> bool:
+    metrics.bcrypt_inflight.inc(); started = time.perf_counter()
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    finally:
+        metrics.bcrypt_inflight.dec(); metrics.bcrypt_duration.observe(time.perf_counter() - started, op="verify")
+
+def save_upload(file: UploadFile, path: str, kind: str) -> int:
+    """Writes an uploaded file to disk and records upload throughput. Returns bytes written."""
+    started = time.perf_counter()
+    with open(path, "wb") as buffer: shutil.copyfileobj(file.file, buffer)
+    size = os.path.getsize(path)
+    metrics.upload_bytes.inc(size, kind=kind); metrics.upload_files.inc(kind=kind)
+    metrics.upload_duration.observe(time.perf_counter() - started, kind=kind)
+    return size
+
+# Gauges read from live objects at scrape time
+metrics.Gauge("ws_employee_connections", "Connected employee sockets", func=lambda: len(manager.employee_connections))
+metrics.Gauge("ws_admin_connections", "Connected admin sockets", func=lambda: len(manager.admin_connections))
+metrics.Gauge("chat_write_queue_depth", "Chat messages waiting for group commit", func=lambda: chat_queue.queue.qsize())
+metrics.Gauge("deadline_scheduler_lag_seconds", "Delay between the last deadline and its finalization", func=lambda: deadline_scheduler.last_lag)
+metrics.Gauge("deadline_scheduler_pending", "Deadlines held in the scheduler heap", func=lambda: deadline_scheduler.pending)
+metrics.Gauge("deadline_scheduler_is_leader", "1 if this process holds the scheduler lease", func=lambda: int(deadline_scheduler.is_leader))
+metrics.Gauge("audit_write_queue_depth", "Audit entries waiting for group commit", func=lambda: audit_writer.queue.qsize())
+metrics.Gauge("log_records_dropped_total", "Log records dropped because the log queue was full", func=lambda: NonBlockingQueueHandler.dropped)
+metrics.install_pool_metrics(database.engine)
+
+def lookup_username(user_id: str) -> Optional[str]:
+    db = database.SessionLocal()
+    try:
+        user = db.query(models.Employee.username).filter(models.Employee.id == user_id).first()
+        return user.username if user else None
+    finally:
+        db.close()
 
 def log_wallet_transaction(db: Session, employee_id: str, amount: float, transaction_type: str, description: str = None, project_id: str = None, withdrawal_id: str = None):
     try:
@@ -157,12 +289,17 @@ def log_wallet_transaction(db: Session, employee_id: str, amount: float, transac
             related_withdrawal_id=withdrawal_id
         )
         db.add(transaction)
+        if amount > 0 and transaction_type in EARNING_TYPES:
+            record_daily_stat(db, employee_id, earnings=amount)
         db.commit()
     except Exception as e:
         logger.error(f"Failed to log wallet transaction: {e}")
 
 # --- APP SETUP ---
-app = FastAPI(title="MedData Platform - Enterprise V5.0 (Stable)")
+app = FastAPI(title="MedData Platform - Enterprise V5.0 (Stable)", default_response_class=FastJSONResponse)
+
+# Innermost (inside CORS, so hits get the same CORS headers); hits and 304s are still profiled and counted, with zero queries
+app.add_middleware(ResponseCacheMiddleware, identify=user_id_from_token)
 
 app.add_middleware(
     CORSMiddleware,
@@ -171,8 +308,17 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outside the cache (entries stay uncompressed) and inside the profiler (compression time counts as app time)
+app.add_middleware(CompressionMiddleware)
+
+# Per-request query count / DB time (Server-Timing header + structured log line)
+install_query_listeners(database.engine)
+app.add_middleware(QueryProfilerMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+# Outermost, so every log line of the request (profiler included) carries its correlation id
+app.add_middleware(RequestIdMiddleware)
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", OptimizedStaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 # --- ROUTES ---
@@ -194,6 +340,7 @@ def page_employee_home(request: Request):
     return templates.TemplateResponse("employee_landing.html", {"request": request})
 
 @app.get("/api/public/announcement")
+@cache_response(ttl=3600, tags=("announcement",))
 def get_announcement():
     return {
         "id": "ANN-001",
@@ -209,6 +356,7 @@ def get_default_avatar():
     return RedirectResponse("https://ui-avatars.com/api/?name=User&background=0D8ABC&color=fff&size=128")
 
 @app.get("/api/system/config")
+@cache_response(ttl=3600, tags=("system_config",))
 def get_system_config(db: Session = Depends(get_db)):
     admin = db.query(models.Employee).filter(models.Employee.role == "ADMIN").order_by(models.Employee.id.asc()).first()
     brand_name = admin.full_name if admin and admin.full_name else "MedData Enterprise"
@@ -216,6 +364,26 @@ def get_system_config(db: Session = Depends(get_db)):
     mobile = admin.mobile if admin and admin.mobile else "919000000000"
     return {"brand_name": brand_name, "address": address, "support_contact": mobile}
 
+def require_metrics_access(request: Request, db: Session = Depends(get_db)):
+    """METRICS_TOKEN when one is configured, otherwise an admin's access token."""
+    authorization = request.headers.get("authorization", "")
+    if METRICS_TOKEN:
+        if authorization != f"Bearer {METRICS_TOKEN}": raise HTTPException(401, "Invalid metrics token")
+        return
+    if not authorization.startswith("Bearer "):
+        raise HTTPException(status.HTTP_401_UNAUTHORIZED, "Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    token = authorization[len("Bearer "):]
+    require_admin(get_current_user(token, db), token)
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+async def get_metrics():
+    """Prometheus scrape endpoint (per process). Scrapers use METRICS_TOKEN; without it only admins can read it."""
+    # Worker threadpool that runs sync routes (bcrypt, file writes, DB)
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    metrics.threadpool_busy.set(limiter.borrowed_tokens)
+    metrics.threadpool_size.set(limiter.total_tokens)
+    return Response(metrics.render_metrics(), media_type="text/plain; version=0.0.4")
+
 @app.get("/.well-known/appspecific/com.chrome.devtools.json")
 def chrome_devtools_fallback():
     return {}
@@ -226,7 +394,7 @@ def handle_login(data: schemas.LoginRequest, db: Session = Depends(get_db)):
     user = db.query(models.Employee).filter(models.Employee.username == data.username).first()
     if not user: raise HTTPException(401, "Invalid Credentials")
     if user.status == 'BANNED': raise HTTPException(403, "Account Suspended")
-    if not bcrypt.checkpw(data.password.encode('utf-8'), user.password_hash.encode('utf-8')):
+    if not verify_password(data.password, user.password_hash):
         raise HTTPException(401, "Invalid Credentials")
     
     # Gamification
@@ -251,6 +419,7 @@ def handle_login(data: schemas.LoginRequest, db: Session = Depends(get_db)):
     
     user.last_login = datetime.now()
     db.commit()
+    response_cache.invalidate(f"user:{user.id}") # Streak changed
     
     role = user.role or "EMPLOYEE"
     if user.username == "Rohit": role = "ADMIN"
@@ -292,7 +461,7 @@ def upload_profile_picture(user_id: str, file: UploadFile = File(...), db: Sessi
     ext = os.path.splitext(file.filename)[1]
     filename = f"{user_id}{ext}"
     save_path = os.path.join(PROFILE_PIC_DIR, filename)
-    with open(save_path, "wb") as buffer: shutil.copyfileobj(file.file, buffer)
+    save_upload(file, save_path, "profile_pic")
     user.profile_pic = f"/static/profile_pics/{filename}"
     db.commit()
     return {"url": user.profile_pic}
@@ -306,26 +475,33 @@ async def upload_kyc_docs(aadhar: UploadFile = File(None), pan: UploadFile = Fil
         ext = aadhar.filename.split('.')[-1]
         fname = f"{user.id}_aadhar.{ext}"
         fpath = os.path.join(upload_dir, fname)
-        with open(fpath, "wb") as buffer: shutil.copyfileobj(aadhar.file, buffer)
+        save_upload(aadhar, fpath, "kyc")
         user.aadhar_card_url = f"/static/uploads/kyc/{fname}"
     if pan:
         ext = pan.filename.split('.')[-1]
         fname = f"{user.id}_pan.{ext}"
         fpath = os.path.join(upload_dir, fname)
-        with open(fpath, "wb") as buffer: shutil.copyfileobj(pan.file, buffer)
+        save_upload(pan, fpath, "kyc")
         user.pan_card_url = f"/static/uploads/kyc/{fname}"
     user.kyc_status = "PENDING"; user.kyc_rejection_reason = None
     db.commit()
     return {"message": "KYC Documents Uploaded", "status": "PENDING"}
 
 @app.get("/api/employees/list")
-def list_staff(db: Session = Depends(get_db)):
-    users = db.query(models.Employee).filter(models.Employee.role != 'ADMIN', models.Employee.username != 'Rohit').all()
-    return [{
+def list_staff(q: Optional[str] = None, limit: Optional[int] = None, offset: int = 0, db: Session = Depends(get_db)):
+    query = db.query(models.Employee).filter(models.Employee.role != 'ADMIN', models.Employee.username != 'Rohit')
+    # Optional server-side narrowing; without parameters the full list is returned as before
+    if q:
+        match = to_match_query(q)
+        if not match: return []
+        query = query.filter(text(matching_ids_clause("employee"))).params(match=match)
+    if limit: query = query.order_by(models.Employee.employee_code).offset(offset).limit(limit)
+    users = query.all()
+    return FastJSONResponse([{
         "id": u.id, "username": u.username, "code": u.employee_code, "status": u.status or "ACTIVE",
         "wallet": u.wallet_balance, "profile_pic": u.profile_pic or "/static/default-avatar.png",
         "level": u.level or 1, "kyc_status": u.kyc_status, "full_name": u.full_name
-    } for u in users]
+    } for u in users])
 
 # --- ADMIN ROUTES ---
 @app.post("/employees/create", response_model=schemas.EmployeeResponse)
@@ -349,12 +525,13 @@ def create_staff(emp: schemas.EmployeeCreate, db: Session = Depends(get_db), cur
     except Exception as e:
         db.rollback(); raise HTTPException(500, f"Code Generation Failed: {str(e)}")
     
-    hashed_pw = bcrypt.hashpw(emp.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    hashed_pw = hash_password(emp.password)
     new_staff = models.Employee(id=str(uuid.uuid4()), employee_code=formatted_code, username=emp.username, full_name=emp.full_name, gender=emp.gender, password_hash=hashed_pw, wallet_balance=0.0)
     if emp.referral_code:
         referrer = db.query(models.Employee).filter(models.Employee.id.startswith(emp.referral_code.replace("REF-", "").lower())).first()
         if referrer: new_staff.referred_by_id = referrer.id
     db.add(new_staff); db.commit(); db.refresh(new_staff)
+    log_audit("EMPLOYEE_CREATED", f"Created {new_staff.username} ({formatted_code})", current_admin.id, current_admin.username)
     return new_staff
 
 @app.post("/api/admin/kyc/verify")
@@ -366,6 +543,7 @@ def verify_kyc_status(data: dict, db: Session = Depends(get_db), admin: models.E
     elif action == "REJECT": user.kyc_status = "REJECTED"; user.kyc_rejection_reason = data.get("reason", "")
     else: raise HTTPException(400, "Invalid action")
     db.commit()
+    log_audit(f"KYC_{user.kyc_status}", f"KYC {user.kyc_status.lower()} for {user.username} ({user.id})" + (f": {user.kyc_rejection_reason}" if action == "REJECT" else ""), admin.id, admin.username)
     return {"message": f"User KYC {action}D"}
 
 @app.post("/api/admin/update-profile")
@@ -374,6 +552,7 @@ def update_system_profile(profile: schemas.ProfileUpdateRequest, db: Session = D
     current_admin.mobile = profile.mobile
     current_admin.address = profile.address
     db.commit()
+    response_cache.invalidate("system_config")
     return {"message": "Profile updated", "brand_name": current_admin.full_name}
 
 @app.get("/api/admin/stats")
@@ -407,9 +586,16 @@ def get_pending_withdrawals(db: Session = Depends(get_db), current_admin: models
     return res
 
 @app.get("/api/admin/contacts")
-def get_admin_contacts(db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
-    contacts = db.query(models.Contact).order_by(models.Contact.submitted_at.desc()).all()
-    return [{
+def get_admin_contacts(q: Optional[str] = None, limit: Optional[int] = None, offset: int = 0, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    query = db.query(models.Contact)
+    if q:
+        match = to_match_query(q)
+        if not match: return []
+        query = query.filter(text(matching_ids_clause("contact"))).params(match=match)
+    query = query.order_by(models.Contact.submitted_at.desc())
+    if limit: query = query.offset(offset).limit(limit)
+    contacts = query.all()
+    return FastJSONResponse([{
         "id": c.id, 
         "name": c.name, 
         "email": c.email, 
@@ -417,7 +603,7 @@ def get_admin_contacts(db: Session = Depends(get_db), current_admin: models.Empl
         "message": c.message, 
         "status": c.status, 
         "submitted_at": c.submitted_at # Renamed from date to submitted_at for frontend compatibility
-    } for c in contacts]
+    } for c in contacts])
 
 @app.post("/api/public/contact")
 def submit_contact_form(data: schemas.ContactCreate, db: Session = Depends(get_db)):
@@ -465,23 +651,59 @@ def get_audit_logs(db: Session = Depends(get_db), current_admin: models.Employee
         "action": l.action, "details": l.details, "username": l.username, "timestamp": l.timestamp
     } for l in logs]
 
+@app.get("/api/admin/search")
+def admin_search(q: str, types: Optional[str] = None, limit: int = SEARCH_PAGE_DEFAULT, offset: int = 0,
+                 db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Ranked full-text search over employees, contacts, community posts and support messages (types=employee,contact,post,support)."""
+    return run_search(db, q, types=types.split(",") if types else None, limit=limit, offset=offset)
+
+@app.get("/api/admin/audit/search")
+def search_audit_logs(action: Optional[str] = None, user_id: Optional[str] = None, username: Optional[str] = None,
+                      start: Optional[datetime] = None, end: Optional[datetime] = None, q: Optional[str] = None,
+                      limit: int = AUDIT_PAGE_DEFAULT, cursor: Optional[str] = None,
+                      db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Filtered, newest-first audit entries. Pass `next_cursor` back as `cursor` for the next page."""
+    try:
+        return search_entries(db, action=action, user_id=user_id, username=username, start=start, end=end, q=q, limit=limit, cursor=cursor)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+@app.get("/api/admin/audit/verify")
+def verify_audit_chain(full: bool = False, current_admin: models.Employee = Depends(require_admin)):
+    """Re-hashes the audit chain from the last checkpoint (or from the start with full=true)."""
+    return verify_chain(full=full)
+
 # --- PROJECT ROUTES ---
 @app.post("/api/projects/upload")
-def upload_batch_sequentially(files: list[UploadFile] = File(...), db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+def upload_batch_sequentially(files: list[UploadFile] = File(...), auto_assign: bool = Form(False), salary: float = Form(0.0),
+                              security_amount: float = Form(0.0), time_limit_hours: int = Form(48), unit_size: Optional[int] = Form(None),
+                              db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """
+    Stores an image batch as a project. With `auto_assign` the batch is split into work units of `unit_size`
+    (default WORK_UNIT_IMAGES) images, each its own project that the work allocator assigns and rebalances.
+    """
     batch_id = f"BATCH-{str(uuid.uuid4())[:8].upper()}"
     batch_path = os.path.join(BASE_UPLOAD_DIR, batch_id)
     os.makedirs(batch_path, exist_ok=True)
-    db.add(models.Project(id=batch_id, salary_per_completion=0.0))
+    files = [f for f in files if f.filename]
+    size = (unit_size or WORK_UNIT_IMAGES) if auto_assign else 0
+    project_ids = []
     for idx, file in enumerate(files):
-        if not file.filename: continue
+        project_id, sequence = work_unit_position(batch_id, idx, len(files), size)
+        if not project_ids or project_ids[-1] != project_id:
+            db.add(models.Project(id=project_id, salary_per_completion=salary, security_amount=security_amount,
+                                  time_limit_hours=time_limit_hours, auto_assign=auto_assign))
+            project_ids.append(project_id)
         ext = os.path.splitext(file.filename)[1]
         filename = f"img_{idx + 1}{ext}"
         save_path = os.path.join(batch_path, filename)
-        with open(save_path, "wb") as buffer: shutil.copyfileobj(file.file, buffer)
+        save_upload(file, save_path, "batch_image")
         db_path = f"/static/uploads/{batch_id}/{filename}"
-        db.add(models.Image(id=str(uuid.uuid4()), project_id=batch_id, storage_url=db_path, sequence_index=idx + 1))
+        db.add(models.Image(id=str(uuid.uuid4()), project_id=project_id, storage_url=db_path, sequence_index=sequence))
+    if not project_ids: db.add(models.Project(id=batch_id, salary_per_completion=salary)); project_ids.append(batch_id)
     db.commit()
-    return {"message": "Success", "project_id": batch_id}
+    if auto_assign: work_allocator.wake()
+    return {"message": "Success", "project_id": project_ids[0], "project_ids": project_ids}
 
 @app.post("/api/projects/assign")
 def assign_work(req: schemas.ProjectAssignRequest, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
@@ -489,12 +711,14 @@ def assign_work(req: schemas.ProjectAssignRequest, db: Session = Depends(get_db)
     if not project: raise HTTPException(404, "Project not found")
     if project.assigned_to_id: raise HTTPException(400, "Project already assigned")
     project.assigned_to_id = req.employee_id
+    project.assigned_at = datetime.now()
     project.salary_per_completion = req.salary
     project.security_amount = req.security_amount
     mins = req.duration_minutes if req.duration_minutes else (req.time_limit_hours or 48) * 60
     project.deadline = datetime.now() + timedelta(minutes=mins)
     project.is_finalized = False
     db.commit()
+    deadline_scheduler.schedule(project.id, project.deadline)
     return {"message": "Assignment Active"}
 
 @app.get("/api/projects/list")
@@ -513,28 +737,40 @@ def list_all_batches(db: Session = Depends(get_db)):
 
 @app.get("/api/projects/available/{user_id}")
 def fetch_employee_work_logic(user_id: str, db: Session = Depends(get_db)):
-    projects = db.query(models.Project).filter(models.Project.assigned_to_id == user_id).all()
+    co_annotated = db.query(models.ProjectAnnotator.project_id).filter(models.ProjectAnnotator.user_id == user_id)
+    projects = db.query(models.Project).filter((models.Project.assigned_to_id == user_id) | models.Project.id.in_(co_annotated)).all()
     res = []
     for p in projects:
         total = db.query(models.Image).filter(models.Image.project_id == p.id).count()
         done = db.query(models.Assignment).join(models.Image).filter(models.Image.project_id == p.id, models.Assignment.user_id == user_id).count()
+        is_primary = p.assigned_to_id == user_id
         if p.is_approved: status = "COMPLETED"
+        elif not is_primary: status = "UNDER REVIEW" if (total > 0 and done >= total) else "IN PROGRESS" # Co-annotators have nothing to submit
         elif p.status == "REJECTED": status = "REJECTED"
         elif p.is_finalized: status = "UNDER REVIEW"
         else: status = "READY TO SUBMIT" if (total > 0 and done >= total) else "IN PROGRESS"
         res.append({
             "id": p.id, "salary": p.salary_per_completion, "total_images": total, "completed_by_user": done,
-            "is_finalized": p.is_finalized, "is_approved": p.is_approved, "status": status,
-            "deadline": p.deadline.isoformat() if p.deadline else None, "admin_feedback": p.admin_feedback,
-            "reward": (done * p.salary_per_completion) + p.security_amount if p.is_approved else (done * p.salary_per_completion)
+            "is_finalized": p.is_finalized if is_primary else status != "IN PROGRESS", "is_approved": p.is_approved, "status": status,
+            "deadline": p.deadline.isoformat() if p.deadline else None, "admin_feedback": p.admin_feedback if is_primary else None,
+            "reward": (done * p.salary_per_completion) + (p.security_amount if is_primary else 0) if p.is_approved else (done * p.salary_per_completion),
+            "role": "ASSIGNEE" if is_primary else "CO_ANNOTATOR"
         })
     return res
 
+def project_locked_for(db: Session, project: models.Project, user_id: str) -> bool:
+    """The assignee is locked out once they finalize; co-annotators keep labelling until the project is approved."""
+    if project.assigned_to_id != user_id and db.query(models.ProjectAnnotator).filter(
+            models.ProjectAnnotator.project_id == project.id, models.ProjectAnnotator.user_id == user_id).first():
+        return bool(project.is_approved)
+    return bool(project.is_finalized)
+
 @app.post("/work/allocate")
 def allocate_next_image(req: schemas.WorkRequest, db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
     if req.employee_id != current_user.id: raise HTTPException(403, "Identity mismatch")
     proj = db.query(models.Project).filter(models.Project.id == req.project_id).first()
-    if proj and proj.is_finalized and not req.sequence_index: raise HTTPException(403, "Batch Locked/Submitted")
+    locked = bool(proj) and project_locked_for(db, proj, req.employee_id)
+    if locked and not req.sequence_index: raise HTTPException(403, "Batch Locked/Submitted")
     
     img = None
     if req.sequence_index:
@@ -547,37 +783,76 @@ def allocate_next_image(req: schemas.WorkRequest, db: Session = Depends(get_db),
     is_review = False
     if not img:
          has_assignments = db.query(models.Assignment).join(models.Image).filter(models.Image.project_id == req.project_id, models.Assignment.user_id == req.employee_id).count()
-         if has_assignments > 0 and (not proj.is_finalized):
+         if has_assignments > 0 and not locked:
              img = db.query(models.Image).filter(models.Image.project_id == req.project_id).order_by(models.Image.sequence_index.asc()).first()
              is_review = True
          else:
              return {"images": [], "status": "COMPLETED"}
+    
+    # Only time images still to be labelled: review navigation and reloads of submitted images stay read-only
+    if not is_review and not db.query(models.Assignment.id).filter(models.Assignment.user_id == req.employee_id, models.Assignment.image_id == img.id).first():
+        start_work_timer(db, req.employee_id, img.id)
+        db.commit()
              
     return {"images": [{"id": img.id, "url": img.storage_url, "sequence": img.sequence_index}], "deadline": proj.deadline.isoformat() if proj.deadline else None, "is_review": is_review}
 
 @app.get("/work/get_submission/{employee_id}/{image_id}")
 def fetch_existing_entry(employee_id: str, image_id: str, db: Session = Depends(get_db)):
     sub = db.query(models.Assignment).filter(models.Assignment.user_id == employee_id, models.Assignment.image_id == image_id).first()
-    return {"data": json.loads(sub.submission_data) if sub else None}
+    return {"data": decode_submission(db, sub.schema_id, sub.submission_blob, sub.submission_data) if sub else None}
+
+@app.get("/api/projects/{project_id}/form-schema")
+def get_project_form_schema(project_id: str, db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
+    """The form submissions to this project are validated against (its own schema, else the default)."""
+    schema = form_schemas.for_project(db, project_id)
+    return {"schema_id": schema.id, "fields": schema.fields}
+
+@app.put("/api/admin/projects/{project_id}/form-schema")
+def set_project_form_schema(project_id: str, definition: Dict[str, Any], db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Adds a new schema version for the project; existing submissions keep decoding with the version they were written with."""
+    if not db.query(models.Project.id).filter(models.Project.id == project_id).first(): raise HTTPException(404, "Project not found")
+    try:
+        schema = save_project_schema(db, project_id, definition)
+    except SubmissionError as e:
+        raise HTTPException(400, str(e))
+    log_audit("FORM_SCHEMA_UPDATED", f"Form schema v{schema.id} set for project {project_id}", current_admin.id, current_admin.username)
+    return {"schema_id": schema.id, "fields": schema.fields}
 
 @app.post("/work/submit")
 def process_entry_submission(req: schemas.SubmissionRequest, db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
     img = db.query(models.Image).filter(models.Image.id == req.image_id).first()
     proj = db.query(models.Project).filter(models.Project.id == img.project_id).first()
-    if proj.is_finalized: raise HTTPException(403, "Cannot edit finalized batch")
+    if project_locked_for(db, proj, req.employee_id): raise HTTPException(403, "Cannot edit finalized batch")
+    if proj.split_from_id and proj.assigned_to_id != req.employee_id and not db.query(models.ProjectAnnotator).filter(
+            models.ProjectAnnotator.project_id == proj.id, models.ProjectAnnotator.user_id == req.employee_id).first():
+        raise HTTPException(409, "Image was moved to another work unit") # Rebalanced while the form was open
+    # Validated once here; readers only decode
+    try:
+        schema_id, blob = encode_submission(db, img.project_id, req.form_data)
+    except SubmissionError as e:
+        raise HTTPException(400, str(e))
     existing = db.query(models.Assignment).filter(models.Assignment.user_id == req.employee_id, models.Assignment.image_id == req.image_id).first()
+    elapsed = stop_work_timer(db, req.employee_id, req.image_id)
     if existing:
-        existing.submission_data = json.dumps(req.form_data); existing.status = "SUBMITTED"
+        existing.schema_id = schema_id; existing.submission_blob = blob; existing.submission_data = None; existing.status = "SUBMITTED"
     else:
-        db.add(models.Assignment(id=str(uuid.uuid4()), user_id=req.employee_id, image_id=req.image_id, submission_data=json.dumps(req.form_data)))
+        db.add(models.Assignment(id=str(uuid.uuid4()), user_id=req.employee_id, image_id=req.image_id, schema_id=schema_id, submission_blob=blob))
+        stats = {"images_completed": 1}
+        if elapsed is not None: stats.update(time_spent_seconds=elapsed, timed_images=1)
+        record_daily_stat(db, req.employee_id, **stats)
     db.commit()
+    # Only first-pass timings feed the speed distribution; review edits would skew it
+    if elapsed is not None and not existing: speed_tracker.record(current_user.level, elapsed)
     return {"status": "success"}
 
 @app.post("/api/projects/finalize")
 def finalize_batch_for_review(req: schemas.FinalizeRequest, db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
     project = db.query(models.Project).filter(models.Project.id == req.project_id).first()
     if not project or project.assigned_to_id != req.employee_id: raise HTTPException(403, "Unauthorized")
-    project.is_finalized = True; db.commit()
+    project.is_finalized = True
+    if project.status == "REJECTED": project.status = "SUBMITTED" # Reworked batch goes back to review
+    db.commit()
+    enqueue_job(db, "project_quality", {"project_id": project.id}, priority=PRIORITY_LOW)
     return {"message": "Success"}
 
 @app.get("/api/projects/history")
@@ -622,6 +897,7 @@ def update_my_profile(data: dict, db: Session = Depends(get_db), current_user: m
     if "bank_name" in data: current_user.bank_name = data["bank_name"]
     
     db.commit()
+    response_cache.invalidate("system_config") # Branding is read from the admin's own profile
     return {"message": "Profile Updated Successfully"}
 
 @app.post("/api/profile/upload-pic")
@@ -636,8 +912,7 @@ def upload_profile_pic(file: UploadFile = File(...), db: Session = Depends(get_d
     filename = f"avatar_{current_user.id}_{int(datetime.now().timestamp())}{ext}"
     file_path = os.path.join(BASE_UPLOAD_DIR, filename)
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    save_upload(file, file_path, "profile_pic")
         
     url = f"/static/uploads/{filename}"
     current_user.profile_pic = url
@@ -652,27 +927,17 @@ def admin_approve_project(data: dict, db: Session = Depends(get_db), current_adm
     if not project: raise HTTPException(404, "Project not found")
     
     # Idempotency check
-    if project.is_approved: return {"message": "Already approved"}
-
-    project.is_approved = True
-    project.status = "COMPLETED"
-    project.is_finalized = True
-    project.completed_at = datetime.now()
-    
-    # Calculate Payout
-    done = db.query(models.Assignment).join(models.Image).filter(models.Image.project_id == project_id).count()
-    payout = (done * project.salary_per_completion) + project.security_amount
-    project.payout_amount = payout
-    
-    # Credit Employee
-    emp = db.query(models.Employee).filter(models.Employee.id == project.assigned_to_id).first()
-    if emp:
-        emp.wallet_balance = (emp.wallet_balance or 0) + payout
-        emp.total_earned = (emp.total_earned or 0) + payout
-        log_wallet_transaction(db, emp.id, payout, "PROJECT_PAYOUT", f"Project {project_id} approved", project_id=project_id)
-    
-    db.commit()
-    return {"message": "Project Approved", "payout": payout}
+    if project.is_approved: return {"message": "Already approved", "payout": project.payout_amount}
+    if project.status == "REJECTED" or not project.is_finalized: raise HTTPException(409, "Project is not awaiting review")
+
+    # Payout runs on a job worker; the key guarantees a single credit per review round (rejections start a new one)
+    review_round = project.review_round or 0
+    job = enqueue_job(db, "project_payout", {"project_id": project_id, "approved_by": current_admin.username, "review_round": review_round},
+                      priority=PRIORITY_HIGH, idempotency_key=f"payout:{project_id}:{review_round}")
+    log_audit("PROJECT_APPROVED", f"Approved project {project_id} (payout job {job.id})", current_admin.id, current_admin.username)
+    # payout stays null until the job has run (an idempotent re-approval may return an already finished job)
+    payout = (serialize_job(job)["result"] or {}).get("payout") if job.status == "SUCCEEDED" else None
+    return {"message": "Project Approval Queued", "job_id": job.id, "job_status": job.status, "payout": payout}
 
 @app.post("/api/admin/reject-project")
 def admin_reject_project(data: dict, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
@@ -686,41 +951,37 @@ def admin_reject_project(data: dict, db: Session = Depends(get_db), current_admi
     project.admin_feedback = reason
     project.is_finalized = False  # Allow re-work
     project.is_approved = False
+    project.review_round = (project.review_round or 0) + 1 # A payout still queued for the previous round is skipped
+    record_daily_stat(db, project.assigned_to_id, rejections=1)
     db.commit()
+    log_audit("PROJECT_REJECTED", f"Rejected project {project_id}: {reason}", current_admin.id, current_admin.username)
     return {"message": "Project Rejected"}
 
 @app.get("/api/admin/project-submissions/{project_id}")
-def get_project_submissions(project_id: str, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
-    """Get all submitted images for a project"""
-    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+def get_project_submissions(request: Request, project_id: str, cursor: Optional[str] = None, limit: Optional[int] = None,
+                            db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """
+    Images of a project with the assignee's submission, in sequence order.
+
+    Without `limit` the whole batch is returned as one array; with it, a page whose next cursor is in
+    X-Next-Cursor. `Accept: application/x-ndjson` streams the whole batch one row per line instead.
+    """
+    project = db.query(models.Project.id, models.Project.assigned_to_id).filter(models.Project.id == project_id).first()
     if not project: raise HTTPException(404, "Project not found")
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(stream_review_rows(project_id, project.assigned_to_id), media_type="application/x-ndjson")
 
-    # Get all images for this project
-    images = db.query(models.Image).filter(models.Image.project_id == project_id).order_by(models.Image.sequence_index).all()
-    
-    res = []
-    for img in images:
-        # Get assignment/submission for this image by the project assignee
-        assign = db.query(models.Assignment).filter(
-            models.Assignment.image_id == img.id,
-            models.Assignment.user_id == project.assigned_to_id
-        ).first()
-        
-        submission_data = {}
-        if assign and assign.submission_data:
-            try:
-                submission_data = json.loads(assign.submission_data)
-            except:
-                pass
-        
-        res.append({
-            "image_id": img.id,
-            "image_url": img.storage_url,
-            "sequence": img.sequence_index,
-            "data": submission_data,
-            "status": assign.status if assign else "PENDING"
-        })
-    return res
+    try:
+        after = decode_review_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if limit is not None: limit = max(1, min(limit, REVIEW_PAGE_MAX))
+    res = load_review_rows(db, project_id, project.assigned_to_id, after=after, limit=limit + 1 if limit else None)
+    headers = {}
+    if limit and len(res) > limit:
+        res = res[:limit]
+        headers["X-Next-Cursor"] = encode_review_cursor(res[-1]["sequence"], res[-1]["image_id"])
+    return FastJSONResponse(res, headers=headers)
 
 @app.post("/api/admin/user-action")
 def admin_user_action(data: dict, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
@@ -737,25 +998,19 @@ def admin_user_action(data: dict, db: Session = Depends(get_db), current_admin:
         user.status = "ACTIVE"
     elif action == "RESET_PASSWORD":
         new_pw = data.get("new_password", "Password123")
-        user.password_hash = bcrypt.hashpw(new_pw.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        user.password_hash = hash_password(new_pw)
     else:
         raise HTTPException(400, "Invalid action")
     
     db.commit()
+    response_cache.invalidate(f"user:{user.id}") # Cached per-user responses skip the BANNED check
+    log_audit(f"USER_{action}", f"{action} on {user.username} ({user.id})", current_admin.id, current_admin.username)
     return {"message": f"Action {action} completed"}
 
-# Helper for audit logging
-def log_audit(db: Session, action: str, details: str, user_id: str = None, username: str = None):
+# Helper for audit logging (hash-chained, group-committed by audit_writer; call after the action commits)
+def log_audit(action: str, details: str, user_id: str = None, username: str = None):
     try:
-        log = models.AuditLog(
-            user_id=user_id,
-            username=username,
-            action=action,
-            details=details,
-            timestamp=datetime.now()
-        )
-        db.add(log)
-        db.commit()
+        audit_writer.record(action, details, user_id=user_id, username=username)
     except Exception as e:
         logger.error(f"Audit log error: {e}")
 
@@ -831,6 +1086,7 @@ def admin_approve_withdrawal(data: dict, db: Session = Depends(get_db), current_
         log_wallet_transaction(db, user.id, w.amount, "WITHDRAWAL_REFUND", f"Refund - Payout Rejected", withdrawal_id=wid)
         
     db.commit()
+    log_audit(f"WITHDRAWAL_{w.status}", f"Withdrawal {wid} of {w.amount} for {user.username} {w.status.lower()}", current_admin.id, current_admin.username)
     return {"message": "Success"}
 
 @app.get("/api/withdrawals/history")
@@ -841,7 +1097,7 @@ def get_my_withdrawals(db: Session = Depends(get_db), current_user: models.Emplo
 @app.get("/api/wallet/history")
 def get_wallet_history(db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
     transactions = db.query(models.WalletTransaction).filter(models.WalletTransaction.employee_id == current_user.id).order_by(models.WalletTransaction.timestamp.desc()).limit(100).all()
-    return [{"id": t.id, "amount": t.amount, "transaction_type": t.transaction_type, "description": t.description, "timestamp": t.timestamp} for t in transactions]
+    return FastJSONResponse([{"id": t.id, "amount": t.amount, "transaction_type": t.transaction_type, "description": t.description, "timestamp": t.timestamp} for t in transactions])
 
 @app.get("/api/employees/tax-report")
 def get_tax_report(db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
@@ -849,6 +1105,7 @@ def get_tax_report(db: Session = Depends(get_db), current_user: models.Employee
     return {"total_earnings_withdrawn": sum(w.amount for w in withdrawals), "total_tds_deducted": sum(w.tds_amount for w in withdrawals), "transaction_count": len(withdrawals)}
 
 @app.get("/api/gamification/status")
+@cache_response(ttl=300, tags=("gamification",), per_user=True)
 def get_gamification_status(db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
     level = current_user.level or 1
     xp = current_user.xp or 0
@@ -869,6 +1126,7 @@ def get_gamification_status(db: Session = Depends(get_db), current_user: models.
     }
 
 @app.get("/api/challenges/active")
+@cache_response(ttl=60, tags=("challenges",)) # TTL keeps expires_in roughly current
 def get_active_challenges(db: Session = Depends(get_db)):
     # Mock return for now since logic isn't fully defined but table exists
     challenges = db.query(models.Challenge).filter(models.Challenge.end_date > datetime.now()).all()
@@ -887,85 +1145,58 @@ def get_leaderboard(db: Session = Depends(get_db)):
     return [{"username": l.username, "balance": l.total_earned, "level": l.level or 1} for l in leaders]
 
 @app.get("/api/analytics/personal")
-def get_personal_analytics(db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
-    """Get real personal analytics based on wallet history and project performance"""
+def get_personal_analytics(days: int = 7, db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
+    """Get personal analytics from the employee_daily_stats rollup (days: 7, 30 or 90 for the chart series)"""
+    if days not in SERIES_DAYS: raise HTTPException(400, f"days must be one of {list(SERIES_DAYS)}")
     
-    # 1. Calculate 30 Day Earnings (Real)
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=30)
+    # One indexed range read covers both the 30 day totals and the chart window
+    series = build_series(db, current_user.id, max(days, 30))
+    last_30 = series[-30:]
+    window = series[-days:]
     
-    # Fetch credit transactions (Earnings) in last 30 days
-    earnings_tx = db.query(models.WalletTransaction).filter(
-        models.WalletTransaction.employee_id == current_user.id,
-        models.WalletTransaction.amount > 0,
-        models.WalletTransaction.transaction_type.in_(["PROJECT_PAYOUT", "LOGIN_BONUS", "CHALLENGE_REWARD"]),
-        models.WalletTransaction.timestamp >= start_date
-    ).all()
+    total_30d = round(sum(d["earnings"] for d in last_30), 2)
+    approved = sum(d["approvals"] for d in last_30)
+    decided = approved + sum(d["rejections"] for d in last_30)
     
-    total_30d = sum(t.amount for t in earnings_tx)
+    timed = sum(d["timed_images"] for d in last_30)
     
-    # 2. Daily Earnings for Chart (Last 7 Days)
-    daily_earnings = []
-    # Initialize map for last 7 days
-    days_map = {}
-    for i in range(7):
-        d = (end_date - timedelta(days=6-i)).date()
-        days_map[d] = 0.0
-        
-    for t in earnings_tx:
-        t_date = t.timestamp.date()
-        if t_date in days_map:
-            days_map[t_date] += t.amount
-            
-    daily_earnings = [{"date": d.strftime("%Y-%m-%d"), "amount": amt} for d, amt in days_map.items()]
-
-    # 3. Quality Score (Based on Project Approval/Rejection Rate)
-    # Get all finalized projects assigned to user
-    completed_projects = db.query(models.Project).filter(
-        models.Project.assigned_to_id == current_user.id,
-        models.Project.is_finalized == True
-    ).all()
+    # Speed Percentile = Share of the cohort's images that took longer than this user's 30 day average
+    speed_percentile = 0
+    if timed:
+        avg_seconds = sum(d["time_spent_seconds"] for d in last_30) / timed
+        speed_percentile = speed_tracker.speed_percentile(current_user.level, avg_seconds)
     
-    if not completed_projects:
+    # Quality Score = Accuracy on gold images, else agreement with co-annotators, else approval rate over the last 30 days
+    scored = annotator_quality_summary(db, current_user.id)
+    if decided == 0 and scored["gold_accuracy"] is None and scored["agreement"] is None:
         avg_quality = 0.0
-        speed_percentile = 0
         top_text = "New Joiner"
     else:
-        # Calculate Approval Rate
-        approved = sum(1 for p in completed_projects if p.is_approved)
-        total = len(completed_projects)
-        avg_quality = min(round((approved / total) * 100, 1), 100.0) if total > 0 else 0
-        
-        # Add basic "experience" boost to quality for visual flair if they have many approvals
-        if approved > 10: avg_quality = min(avg_quality + 2, 100.0)
-
-        # Speed Percentile (Mock based on level/experience for now as we lack peer data)
-        # 1-100 scale based on level logic (max level ~50?)
-        speed_percentile = min(50 + (current_user.level * 5), 99)
+        if scored["gold_accuracy"] is not None: avg_quality = round(scored["gold_accuracy"] * 100, 1)
+        elif scored["agreement"] is not None: avg_quality = round(scored["agreement"] * 100, 1)
+        else: avg_quality = round((approved / decided) * 100, 1)
         
         if speed_percentile > 90: top_text = "Top 10% Performer"
         elif speed_percentile > 75: top_text = "Top 25% Performer"
         else: top_text = "Efficient Worker"
 
-    # 4. Quality Trend (Last 7 Projects or Days)
-    # Since we don't have per-day quality, we'll just show the cumulative average for past days or 
-    # keep it flat/slightly variable based on current average for visual consistency
+    # Quality Trend = Cumulative approval rate through each day of the window
     quality_trend = []
-    current_q = avg_quality
-    for i in range(7):
-        d = (end_date - timedelta(days=6-i)).strftime("%Y-%m-%d")
-        # Add slight random variance for chart aesthetics, anchored to real score
-        variance = 0 if current_q == 0 else random.uniform(-2, 2)
-        q_val = min(max(current_q + variance, 0), 100)
-        quality_trend.append({"date": d, "score": round(q_val, 1)})
+    cum_approved = sum(d["approvals"] for d in series[:-days])
+    cum_decided = cum_approved + sum(d["rejections"] for d in series[:-days])
+    for d in window:
+        cum_approved += d["approvals"]; cum_decided += d["approvals"] + d["rejections"]
+        quality_trend.append({"date": d["date"], "score": round((cum_approved / cum_decided) * 100, 1) if cum_decided else 0.0})
 
     return {
         "total_earnings_30d": total_30d,
         "avg_quality_30d": avg_quality,
+        "annotation_quality": scored,
         "speed_percentile": speed_percentile,
         "top_performer_text": top_text,
-        "daily_earnings": daily_earnings,
-        "quality_trend": quality_trend
+        "daily_earnings": [{"date": d["date"], "amount": d["earnings"]} for d in window],
+        "quality_trend": quality_trend,
+        "daily_activity": window
     }
 
 
@@ -973,40 +1204,20 @@ def get_personal_analytics(db: Session = Depends(get_db), current_user: models.E
 @app.get("/api/admin/support/messages")
 def get_support_messages(db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
     msgs = db.query(models.SupportMessage).order_by(models.SupportMessage.timestamp.desc()).all()
-    return msgs
+    columns = [c.key for c in models.SupportMessage.__table__.columns]
+    return FastJSONResponse([{k: getattr(m, k) for k in columns} for m in msgs])
 
 # --- COMMUNITY POSTS (Employee) ---
 @app.get("/api/community/posts")
-def get_community_posts(db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
-    """Get all approved community posts + user's own pending/rejected posts"""
-    from sqlalchemy import or_
-    
-    # Get approved posts OR user's own posts (any status)
-    posts = db.query(models.CommunityPost).filter(
-        or_(
-            models.CommunityPost.status == "APPROVED",
-            models.CommunityPost.author_id == current_user.id
-        )
-    ).order_by(models.CommunityPost.created_at.desc()).limit(50).all()
-    
-    # Get all likes by this user
-    user_likes = {l.post_id for l in db.query(models.CommunityLike).filter(models.CommunityLike.user_id == current_user.id).all()}
-    
-    return [{
-        "id": p.id,
-        "content": p.content,
-        "author_name": p.author_name,
-        "author_id": p.author_id,
-        "author_pic": p.author_id,
-        "likes_count": p.likes_count or 0,
-        "is_liked": p.id in user_likes,
-        "comments_count": p.comments_count or 0,
-        "is_mine": p.author_id == current_user.id,
-        "status": p.status,  # Include status for frontend badge logic
-        "is_approved": p.status == "APPROVED",
-        "admin_feedback": p.admin_feedback if p.author_id == current_user.id else None,  # Only show feedback to author
-        "created_at": p.created_at.isoformat() if p.created_at else None
-    } for p in posts]
+def get_community_posts(response: Response, cursor: Optional[str] = None, limit: int = FEED_PAGE_DEFAULT,
+                        db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
+    """Approved community posts + user's own pending/rejected posts, newest first. The next page's cursor is in X-Next-Cursor."""
+    try:
+        posts, next_cursor = load_feed(db, current_user.id, cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    if next_cursor: response.headers["X-Next-Cursor"] = next_cursor
+    return posts
 
 @app.post("/api/community/posts/{post_id}/like")
 def like_community_post(post_id: str, db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
@@ -1030,6 +1241,46 @@ def like_community_post(post_id: str, db: Session = Depends(get_db), current_use
     db.commit()
     return {"message": "Success", "action": action, "likes_count": post.likes_count}
 
+def get_visible_post(db: Session, post_id: str, user: models.Employee, is_admin: bool) -> models.CommunityPost:
+    """A post the user may read: approved, their own, or any post for admins."""
+    post = db.query(models.CommunityPost).filter(models.CommunityPost.id == post_id).first()
+    if not post or (post.status != "APPROVED" and post.author_id != user.id and not is_admin):
+        raise HTTPException(404, "Post not found")
+    return post
+
+@app.get("/api/community/posts/{post_id}/comments")
+def list_community_comments(post_id: str, cursor: Optional[str] = None, limit: int = COMMENT_PAGE_DEFAULT,
+                            db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user), token: str = Depends(oauth2_scheme)):
+    """Oldest-first comments. Pass `next_cursor` back as `cursor` for the next page."""
+    get_visible_post(db, post_id, current_user, token_is_admin(token))
+    try:
+        return load_comments(db, post_id, cursor=cursor, limit=limit)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+@app.post("/api/community/posts/{post_id}/comments")
+def create_community_comment(post_id: str, data: schemas.CreateComment, db: Session = Depends(get_db),
+                             current_user: models.Employee = Depends(get_current_user), token: str = Depends(oauth2_scheme)):
+    post = get_visible_post(db, post_id, current_user, token_is_admin(token))
+    if post.status != "APPROVED":
+        raise HTTPException(400, "Comments are only open on approved posts")
+    content = (data.content or "").strip()
+    if not content:
+        raise HTTPException(400, "Comment cannot be empty")
+    comment = add_comment(db, post_id, current_user.id, current_user.full_name or current_user.username, content)
+    return {"message": "Comment added", "id": comment.id, "created_at": comment.created_at.isoformat()}
+
+@app.delete("/api/community/comments/{comment_id}")
+def delete_community_comment(comment_id: str, db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user), token: str = Depends(oauth2_scheme)):
+    """Authors can delete their own comments; admins can delete any."""
+    comment = db.query(models.CommunityComment).filter(models.CommunityComment.id == comment_id).first()
+    if not comment:
+        raise HTTPException(404, "Comment not found")
+    if comment.user_id != current_user.id and not token_is_admin(token):
+        raise HTTPException(403, "Not allowed")
+    delete_comment(db, comment)
+    return {"message": "Comment deleted"}
+
 from pydantic import BaseModel as PydanticBaseModel
 class CommunityPostCreate(PydanticBaseModel):
     content: str
@@ -1054,6 +1305,8 @@ def create_community_post_v2(data: CommunityPostCreate, db: Session = Depends(ge
 @app.websocket("/ws/employee/{user_id}")
 async def websocket_employee_endpoint(websocket: WebSocket, user_id: str):
     await manager.connect_employee(websocket, user_id)
+    # Resolve sender once for the socket's lifetime
+    sender_name = await asyncio.to_thread(lookup_username, user_id) or "Unknown"
     try:
         while True:
             data_json = await websocket.receive_json()
@@ -1062,26 +1315,11 @@ async def websocket_employee_endpoint(websocket: WebSocket, user_id: str):
             if data_json.get('type') == 'message':
                 content = data_json.get('content')
                 if content:
-                    # Save to DB
-                    db = database.SessionLocal()
                     try:
-                        msg_id = str(uuid.uuid4())
-                        new_msg = models.SupportMessage(
-                            id=msg_id,
-                            user_id=user_id,
-                            message=content,
-                            timestamp=datetime.now(),
-                            is_read=False,
-                            is_from_admin=False
-                        )
-                        db.add(new_msg)
-                        db.commit()
+                        # Persisted by the write-behind queue
+                        msg_id = chat_queue.enqueue(user_id, content)
                         
                         # Notify Admins
-                        sender_name = "Unknown"
-                        user = db.query(models.Employee).filter(models.Employee.id == user_id).first()
-                        if user: sender_name = user.username
-                        
                         await manager.broadcast_to_admins({
                             "type": "new_support_msg",
                             "user_id": user_id,
@@ -1095,8 +1333,6 @@ async def websocket_employee_endpoint(websocket: WebSocket, user_id: str):
                         
                     except Exception as e:
                         logger.error(f"Chat Error: {e}")
-                    finally:
-                        db.close()
             
     except WebSocketDisconnect:
         manager.disconnect_employee(user_id)
@@ -1129,20 +1365,9 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
     try:
         while True:
             data = await websocket.receive_text()
-            # Save User Message to DB
-            db = database.SessionLocal()
             try:
-                # Assuming data is just text content
-                msg = models.SupportMessage(
-                    id=str(uuid.uuid4()),
-                    user_id=client_id,
-                    message=data,
-                    timestamp=datetime.now(),
-                    is_read=False,
-                    is_from_admin=False
-                )
-                db.add(msg)
-                db.commit()
+                # Assuming data is just text content; persisted by the write-behind queue
+                chat_queue.enqueue(client_id, data)
                 
                 # Broadcast to Admins
                 await manager.broadcast_to_admins({
@@ -1154,8 +1379,6 @@ async def websocket_endpoint(websocket: WebSocket, client_id: str):
                 })
             except Exception as e:
                 logger.error(f"WS Save Error: {e}")
-            finally:
-                db.close()
                 
     except WebSocketDisconnect:
         manager.disconnect_employee(client_id)
@@ -1174,75 +1397,106 @@ async def websocket_admin_endpoint(websocket: WebSocket):
 
 # --- ADMIN SUPPORT CHAT ENDPOINTS ---
 @app.get("/api/admin/support/users")
-def get_support_users(db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
-    """Get list of users who have sent support messages"""
-    # Get distinct user_ids from support_messages
-    from sqlalchemy import distinct
-    user_ids = db.query(distinct(models.SupportMessage.user_id)).all()
-    users = []
-    for (uid,) in user_ids:
-        employee = db.query(models.Employee).filter(models.Employee.id == uid).first()
-        last_msg = db.query(models.SupportMessage).filter(models.SupportMessage.user_id == uid).order_by(models.SupportMessage.timestamp.desc()).first()
-        unread = db.query(models.SupportMessage).filter(models.SupportMessage.user_id == uid, models.SupportMessage.is_read == False, models.SupportMessage.is_from_admin == False).count()
-        if employee:
-            users.append({
-                "user_id": uid,
-                "username": employee.username,
-                "full_name": employee.full_name,
-                "last_message": last_msg.message[:50] if last_msg else "",
-                "last_timestamp": last_msg.timestamp.isoformat() if last_msg else None,
-                "unread_count": unread,
-                "is_online": uid in manager.employee_connections
-            })
-    return sorted(users, key=lambda x: x.get("last_timestamp") or "", reverse=True)
+def get_support_users(limit: int = 100, offset: int = 0, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Get users who have sent support messages, most recent thread first (paginated)"""
+    limit = max(1, min(limit, 500))
+    rows = db.query(models.SupportThread, models.Employee.username, models.Employee.full_name).join(
+        models.Employee, models.Employee.id == models.SupportThread.user_id
+    ).order_by(models.SupportThread.last_timestamp.desc()).offset(max(offset, 0)).limit(limit).all()
+    return [{
+        "user_id": t.user_id,
+        "username": username,
+        "full_name": full_name,
+        "last_message": t.last_message or "",
+        "last_timestamp": t.last_timestamp.isoformat() if t.last_timestamp else None,
+        "unread_count": t.unread_count or 0,
+        "is_online": t.user_id in manager.employee_connections
+    } for t, username, full_name in rows]
+
+def encode_support_cursor(m: models.SupportMessage) -> str:
+    return f"{m.timestamp.isoformat()}|{m.id}"
+
+def decode_support_cursor(cursor: str):
+    """(timestamp, id) of a `timestamp|id` cursor; a bare timestamp (older clients) gives id None."""
+    ts, sep, message_id = cursor.rpartition("|")
+    try:
+        return (datetime.fromisoformat(ts), message_id) if sep else (datetime.fromisoformat(cursor), None)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+
+def _support_cursor_filter(db: Session, cursor: str, op: str):
+    """Rows after (op '>') or before (op '<') a cursor, on (timestamp, id).
+    The bound is read back from the cursor's own row, so it compares in the stored text format
+    (CURRENT_TIMESTAMP and ORM writes differ); a deleted row falls back to its timestamp."""
+    ts, message_id = decode_support_cursor(cursor)
+    m = models.SupportMessage
+    if message_id is None or not db.query(m.id).filter(m.id == message_id).first():
+        return m.timestamp > ts if op == ">" else m.timestamp < ts
+    return text(f"(support_messages.timestamp, support_messages.id) {op} (SELECT timestamp, id FROM support_messages WHERE id = :cursor_id)").bindparams(cursor_id=message_id)
+
+def fetch_support_page(db: Session, user_id: str, since: Optional[str], before: Optional[str], limit: int) -> List[models.SupportMessage]:
+    """Returns one page of a support thread in ascending (timestamp, id) order.
+    since -> messages after the cursor, before -> older history, neither -> the latest page.
+    Cursors carry the id as a tie-breaker, since messages of one group commit can share a timestamp."""
+    limit = max(1, min(limit, SUPPORT_PAGE_MAX))
+    m = models.SupportMessage
+    q = db.query(m).filter(m.user_id == user_id)
+    if since:
+        return q.filter(_support_cursor_filter(db, since, ">")).order_by(m.timestamp.asc(), m.id.asc()).limit(limit).all()
+    if before:
+        q = q.filter(_support_cursor_filter(db, before, "<"))
+    return list(reversed(q.order_by(m.timestamp.desc(), m.id.desc()).limit(limit).all()))
+
+def mark_support_read(db: Session, messages: List[models.SupportMessage]) -> int:
+    """Flags only the unread rows of the page being returned; no UPDATE when nothing is new."""
+    unread_ids = [m.id for m in messages if not m.is_read]
+    if unread_ids:
+        db.query(models.SupportMessage).filter(models.SupportMessage.id.in_(unread_ids)).update({"is_read": True}, synchronize_session=False)
+    return len(unread_ids)
 
 @app.get("/api/admin/support/messages/{user_id}")
-def get_support_messages(user_id: str, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
-    """Get all support messages for a specific user"""
-    messages = db.query(models.SupportMessage).filter(models.SupportMessage.user_id == user_id).order_by(models.SupportMessage.timestamp.asc()).all()
+def get_support_messages(user_id: str, since: Optional[str] = None, before: Optional[str] = None, limit: int = SUPPORT_PAGE_DEFAULT, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Get support messages for a specific user (cursor paginated: pass a message's `cursor` as since/before)"""
+    messages = fetch_support_page(db, user_id, since, before, limit)
     # Mark as read
-    db.query(models.SupportMessage).filter(models.SupportMessage.user_id == user_id, models.SupportMessage.is_read == False).update({"is_read": True})
-    db.commit()
+    marked = mark_support_read(db, [m for m in messages if not m.is_from_admin])
+    if marked:
+        db.query(models.SupportThread).filter(models.SupportThread.user_id == user_id).update(
+            {"unread_count": func.max(models.SupportThread.unread_count - marked, 0)}, synchronize_session=False)
+        db.commit()
     return [{
         "id": m.id,
         "content": m.message,
         "sender": "Admin" if m.is_from_admin else "User",
-        "timestamp": m.timestamp.isoformat() if m.timestamp else None
+        "timestamp": m.timestamp.isoformat() if m.timestamp else None,
+        "cursor": encode_support_cursor(m) if m.timestamp else None
     } for m in messages]
 
 @app.get("/api/support/my-history")
-def get_my_support_history(db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
-    """Get chat history for the logged-in employee"""
-    messages = db.query(models.SupportMessage).filter(models.SupportMessage.user_id == current_user.id).order_by(models.SupportMessage.timestamp.asc()).all()
+def get_my_support_history(since: Optional[str] = None, before: Optional[str] = None, limit: int = SUPPORT_PAGE_DEFAULT, db: Session = Depends(get_db), current_user: models.Employee = Depends(get_current_user)):
+    """Get chat history for the logged-in employee (cursor paginated: pass a message's `cursor` as since/before)"""
+    messages = fetch_support_page(db, current_user.id, since, before, limit)
     # Mark admin messages as read (optional, but good hygiene)
-    db.query(models.SupportMessage).filter(models.SupportMessage.user_id == current_user.id, models.SupportMessage.is_from_admin == True, models.SupportMessage.is_read == False).update({"is_read": True})
-    db.commit()
+    if mark_support_read(db, [m for m in messages if m.is_from_admin]):
+        db.commit()
     
     return [{
         "id": m.id,
         "content": m.message,
         "sender": "Admin" if m.is_from_admin else "Me",
-        "timestamp": m.timestamp.isoformat() if m.timestamp else None
+        "timestamp": m.timestamp.isoformat() if m.timestamp else None,
+        "cursor": encode_support_cursor(m) if m.timestamp else None
     } for m in messages]
 
 @app.post("/api/admin/support/send")
-async def admin_send_support_message(data: dict, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+async def admin_send_support_message(data: dict, current_admin: models.Employee = Depends(require_admin)):
     """Admin sends a message to an employee"""
     user_id = data.get("user_id")
     content = data.get("content")
     if not user_id or not content:
         raise HTTPException(400, "Missing user_id or content")
     
-    msg = models.SupportMessage(
-        id=str(uuid.uuid4()),
-        user_id=user_id,
-        message=content,
-        timestamp=datetime.now(),
-        is_read=True,
-        is_from_admin=True
-    )
-    db.add(msg)
-    db.commit()
+    msg_id = chat_queue.enqueue(user_id, content, is_from_admin=True, is_read=True)
     
     # Send to employee via WebSocket if online
     if user_id in manager.employee_connections:
@@ -1256,7 +1510,148 @@ async def admin_send_support_message(data: dict, db: Session = Depends(get_db),
         except:
             pass
     
-    return {"message": "Sent", "id": msg.id}
+    return {"message": "Sent", "id": msg_id}
+
+# --- BACKGROUND JOBS ---
+@app.get("/api/admin/jobs")
+def list_jobs(status: Optional[str] = None, kind: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    q = db.query(models.BackgroundJob)
+    if status: q = q.filter(models.BackgroundJob.status == status.upper())
+    if kind: q = q.filter(models.BackgroundJob.kind == kind)
+    jobs = q.order_by(models.BackgroundJob.created_at.desc()).limit(max(1, min(limit, 500))).all()
+    counts = dict(db.query(models.BackgroundJob.status, func.count(models.BackgroundJob.id)).group_by(models.BackgroundJob.status).all())
+    return {"counts": counts, "jobs": [serialize_job(j) for j in jobs]}
+
+@app.get("/api/admin/jobs/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+    if not job: raise HTTPException(404, "Job not found")
+    return serialize_job(job)
+
+@app.post("/api/admin/jobs/{job_id}/retry")
+def retry_job(job_id: str, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+    if not job: raise HTTPException(404, "Job not found")
+    if job.status != "FAILED": raise HTTPException(400, f"Job is {job.status}")
+    job.status = "QUEUED"; job.attempts = 0; job.run_after = datetime.now(); job.finished_at = None
+    db.commit()
+    log_audit("JOB_RETRIED", f"Retried {job.kind} job {job.id}", current_admin.id, current_admin.username)
+    return serialize_job(job)
+
+# --- WORK ALLOCATOR ---
+@app.get("/api/admin/allocator/queue")
+def get_allocator_queue(db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Active annotators in the order the allocator would hand out work, with the inputs of their score."""
+    unassigned = db.query(func.count(models.Project.id)).filter(models.Project.auto_assign == True, models.Project.assigned_to_id == None).scalar()
+    last = work_allocator.last_cycle
+    return {"annotators": ranked_annotators(db), "unassigned_units": unassigned,
+            "last_cycle": {"at": last["at"], "assigned": len(last["assigned"]), "split": len(last["split"])} if last else None}
+
+@app.post("/api/admin/allocator/run")
+def run_allocator_now(current_admin: models.Employee = Depends(require_admin)):
+    """Runs a rebalance + assignment cycle immediately instead of waiting for the next interval."""
+    result = run_allocation_cycle()
+    if result is None: raise HTTPException(409, "An allocation cycle is already running")
+    for assignment in result["assigned"]: on_unit_assigned(assignment)
+    log_audit("ALLOCATOR_RUN", f"Manual allocation: {len(result['assigned'])} assigned, {len(result['split'])} rebalanced", current_admin.id, current_admin.username)
+    return result
+
+# --- ANNOTATION QUALITY ---
+@app.get("/api/admin/projects/{project_id}/annotators")
+def list_project_annotators(project_id: str, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """The assignee and co-annotators of a project with the number of images each has labelled."""
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project: raise HTTPException(404, "Project not found")
+    co = [r[0] for r in db.query(models.ProjectAnnotator.user_id).filter(models.ProjectAnnotator.project_id == project_id).all()]
+    user_ids = ([project.assigned_to_id] if project.assigned_to_id else []) + [u for u in co if u != project.assigned_to_id]
+    names = dict(db.query(models.Employee.id, models.Employee.username).filter(models.Employee.id.in_(user_ids)).all())
+    done = dict(db.query(models.Assignment.user_id, func.count(models.Assignment.id)).join(models.Image).filter(
+        models.Image.project_id == project_id, models.Assignment.user_id.in_(user_ids)).group_by(models.Assignment.user_id).all())
+    return [{"employee_id": u, "username": names.get(u), "role": "ASSIGNEE" if u == project.assigned_to_id else "CO_ANNOTATOR",
+             "completed": done.get(u, 0)} for u in user_ids]
+
+@app.post("/api/admin/projects/{project_id}/annotators")
+def add_project_annotator(project_id: str, data: dict, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Adds a co-annotator who labels the same images as the assignee (paid per image on approval)."""
+    employee_id = data.get("employee_id")
+    project = db.query(models.Project).filter(models.Project.id == project_id).first()
+    if not project: raise HTTPException(404, "Project not found")
+    if project.is_approved: raise HTTPException(400, "Project already approved")
+    if not db.query(models.Employee.id).filter(models.Employee.id == employee_id).first(): raise HTTPException(404, "Employee not found")
+    if employee_id == project.assigned_to_id: raise HTTPException(400, "Employee is the project assignee")
+    if db.query(models.ProjectAnnotator).filter(models.ProjectAnnotator.project_id == project_id, models.ProjectAnnotator.user_id == employee_id).first():
+        raise HTTPException(400, "Employee already annotates this project")
+    db.add(models.ProjectAnnotator(project_id=project_id, user_id=employee_id))
+    db.commit()
+    log_audit("CO_ANNOTATOR_ADDED", f"Added co-annotator {employee_id} to project {project_id}", current_admin.id, current_admin.username)
+    return {"message": "Co-annotator added"}
+
+@app.delete("/api/admin/projects/{project_id}/annotators/{employee_id}")
+def remove_project_annotator(project_id: str, employee_id: str, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Removes a co-annotator; labels they already submitted stay and still count towards agreement."""
+    removed = db.query(models.ProjectAnnotator).filter(models.ProjectAnnotator.project_id == project_id, models.ProjectAnnotator.user_id == employee_id).delete()
+    if not removed: raise HTTPException(404, "Co-annotator not found")
+    db.commit()
+    log_audit("CO_ANNOTATOR_REMOVED", f"Removed co-annotator {employee_id} from project {project_id}", current_admin.id, current_admin.username)
+    return {"message": "Co-annotator removed"}
+
+@app.put("/api/admin/images/{image_id}/gold")
+def set_gold_answer(image_id: str, data: dict, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Stores the reference answer annotators are scored against (validated like a submission); `form_data: null` clears it."""
+    img = db.query(models.Image).filter(models.Image.id == image_id).first()
+    if not img: raise HTTPException(404, "Image not found")
+    if data.get("form_data") is None:
+        img.gold_schema_id = img.gold_blob = None
+    else:
+        try:
+            img.gold_schema_id, img.gold_blob = encode_submission(db, img.project_id, data["form_data"])
+        except SubmissionError as e:
+            raise HTTPException(400, str(e))
+    db.commit()
+    return {"message": "Gold answer saved" if img.gold_blob else "Gold answer cleared"}
+
+@app.get("/api/admin/projects/{project_id}/quality")
+def get_project_quality(project_id: str, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Per-field agreement and per-annotator scores from the last quality run of the project."""
+    fields = db.query(models.FieldAgreement).filter(models.FieldAgreement.project_id == project_id).all()
+    annotators = db.query(models.AnnotatorQuality, models.Employee.username).outerjoin(
+        models.Employee, models.Employee.id == models.AnnotatorQuality.user_id).filter(models.AnnotatorQuality.project_id == project_id).all()
+    field_columns = [c.key for c in models.FieldAgreement.__table__.columns if c.key != "project_id"]
+    return {
+        "fields": [{k: getattr(f, k) for k in field_columns} for f in fields],
+        "annotators": [{"employee_id": q.user_id, "username": username, "items": q.items, "agreement": q.agreement,
+                        "gold_items": q.gold_items, "gold_accuracy": q.gold_accuracy, "computed_at": q.computed_at} for q, username in annotators]
+    }
+
+@app.post("/api/admin/projects/{project_id}/quality")
+def recompute_project_quality(project_id: str, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    if not db.query(models.Project.id).filter(models.Project.id == project_id).first(): raise HTTPException(404, "Project not found")
+    return serialize_job(enqueue_job(db, "project_quality", {"project_id": project_id}))
+
+# --- DATASET EXPORTS ---
+@app.post("/api/admin/exports")
+def queue_dataset_export(data: dict, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    """Queues an export of approved annotations completed since the last run of the same name/format (all of them with `full`)."""
+    fmt, name, full = data.get("format", "jsonl"), data.get("name", "default"), bool(data.get("full"))
+    try:
+        check_format(fmt)
+    except ExportError as e:
+        raise HTTPException(400, str(e))
+    job = enqueue_job(db, "dataset_export", {"format": fmt, "name": name, "full": full})
+    log_audit("DATASET_EXPORT_QUEUED", f"Queued {'full' if full else 'incremental'} {fmt} export '{name}' (job {job.id})", current_admin.id, current_admin.username)
+    return serialize_job(job)
+
+@app.get("/api/admin/exports")
+def list_dataset_exports(limit: int = 50, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    runs = db.query(models.DatasetExport).order_by(models.DatasetExport.started_at.desc()).limit(max(1, min(limit, 500))).all()
+    return [serialize_export(r) for r in runs]
+
+@app.get("/api/admin/exports/{export_id}/files/{filename}")
+def download_dataset_export(export_id: str, filename: str, db: Session = Depends(get_db), current_admin: models.Employee = Depends(require_admin)):
+    run = db.query(models.DatasetExport).filter(models.DatasetExport.id == export_id).first()
+    if not run or run.status != "SUCCEEDED": raise HTTPException(404, "Export not found")
+    if filename not in (json.loads(run.files or "[]") + ["manifest.json"]): raise HTTPException(404, "File not found")
+    return FileResponse(os.path.join(export_run_dir(run), filename), filename=f"{run.name}-{run.id[:8]}-{filename}")
 
 # --- COMMUNITY MODERATION ---
 @app.get("/api/admin/community/pending")
@@ -1279,6 +1674,8 @@ def approve_community_post(post_id: str, db: Session = Depends(get_db), current_
         raise HTTPException(404, "Post not found")
     post.status = "APPROVED"
     db.commit()
+    feed_cache.invalidate()
+    log_audit("POST_APPROVED", f"Approved community post {post_id} by {post.author_name}", current_admin.id, current_admin.username)
     return {"message": "Post approved"}
 
 @app.post("/api/admin/community/{post_id}/reject")
@@ -1291,22 +1688,34 @@ def reject_community_post(post_id: str, data: dict = None, db: Session = Depends
     if data and data.get("reason"):
         post.admin_feedback = data.get("reason")
     db.commit()
+    feed_cache.invalidate()
+    log_audit("POST_REJECTED", f"Rejected community post {post_id} by {post.author_name}", current_admin.id, current_admin.username)
     return {"message": "Post rejected"}
 
 # --- BACKGROUND TASKS ---
-async def monitor_deadlines():
-    while True:
-        try:
-            db = database.SessionLocal()
-            expired = db.query(models.Project).filter(models.Project.is_finalized == False, models.Project.deadline != None, models.Project.deadline < datetime.now()).all()
-            if expired:
-                for proj in expired: proj.is_finalized = True
-                db.commit()
-            db.close()
-        except Exception as e: logger.error(f"Monitor Error: {e}")
-        await asyncio.sleep(60)
-
 @app.on_event("startup")
 async def startup_event():
-    asyncio.create_task(monitor_deadlines())
-    logger.info("Startup Complete")
\ No newline at end of file
+    await asyncio.to_thread(ensure_default_schema)
+    await asyncio.to_thread(seal_legacy_entries)
+    await asyncio.to_thread(ensure_audit_search_index)
+    await asyncio.to_thread(ensure_search_indexes)
+    await asyncio.to_thread(rebuild_support_threads)
+    await asyncio.to_thread(rebuild_daily_stats)
+    await asyncio.to_thread(precompress_static)
+    await chat_queue.start()
+    await deadline_scheduler.start()
+    await work_allocator.start()
+    job_pool.start()
+    await speed_tracker.start()
+    await audit_writer.start()
+    logger.info("Startup Complete")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await deadline_scheduler.stop()
+    await work_allocator.stop()
+    await chat_queue.stop()
+    await speed_tracker.stop()
+    await audit_writer.stop()
+    await asyncio.to_thread(job_pool.stop)
+    shutdown_logging()
\ No newline at end of file
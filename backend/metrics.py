@@ -0,0 +1,269 @@
+import time
+import bisect
+import threading
+from typing import Callable, Dict, Tuple, List, Optional, Sequence
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Metric:
+    """
+    Base metric. Updates are lock-free: each thread adds into its own shard (a `threading.local` dict),
+    which only that thread writes, so no increment is lost. A scrape sums the shards under the metric's
+    lock and folds the shards of exited threads into `_retired`, so recycled threadpool workers do not
+    grow the shard list.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock() # Shard registration and scrapes only, never an update
+        self._shards: List[Tuple[threading.Thread, dict]] = []
+        self._retired: dict = {}
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(l, "")) for l in self.labelnames)
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "values", None)
+        if shard is None:
+            shard = self._local.values = {}
+            with self._lock: self._shards.append((threading.current_thread(), shard))
+        return shard
+
+    def _merge(self, totals: dict, shard: dict):
+        for key, value in shard.items():
+            totals[key] = totals.get(key, 0) + value
+
+    def _collect(self) -> dict:
+        with self._lock:
+            live = []
+            for thread, shard in self._shards:
+                if thread.is_alive(): live.append((thread, shard))
+                else: self._merge(self._retired, shard) # Its thread is gone, so the shard can no longer change
+            self._shards = live
+            totals = {}
+            self._merge(totals, self._retired)
+            for _, shard in live: self._merge(totals, dict(shard))
+        return totals
+
+    def _fmt_labels(self, key: Tuple[str, ...], extra: str = "") -> str:
+        parts = [f'{l}="{v}"' for l, v in zip(self.labelnames, key)]
+        if extra: parts.append(extra)
+        return "{" + ",".join(parts) + "}" if parts else ""
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self.samples()
+
+    def samples(self) -> List[str]:
+        return []
+
+
+class Counter(_Metric):
+    """Monotonic counter, summed across the per-thread shards at scrape time."""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    @property
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        return self._collect()
+
+    def samples(self):
+        return [f"{self.name}{self._fmt_labels(k)} {v}" for k, v in self._collect().items()]
+
+
+class Gauge(_Metric):
+    """
+    Point-in-time value: set directly, moved with inc()/dec() (sharded like a counter), or read from a
+    callback at scrape time. A gauge is either set or moved, not both.
+    """
+    kind = "gauge"
+
+    def __init__(self, name, help_text, labelnames=(), func: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labelnames)
+        self._set: Dict[Tuple[str, ...], float] = {}
+        self.func = func
+
+    def set(self, value: float, **labels):
+        self._set[self._key(labels)] = value # A single store, nothing to lose
+
+    def inc(self, amount: float = 1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    @property
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        totals = self._collect()
+        self._merge(totals, dict(self._set))
+        return totals
+
+    def samples(self):
+        if self.func is not None:
+            try:
+                return [f"{self.name} {float(self.func())}"]
+            except Exception:
+                return []
+        return [f"{self.name}{self._fmt_labels(k)} {v}" for k, v in self.values.items()]
+
+
+class Histogram(_Metric):
+    """
+    Cumulative-bucket histogram; an observation is one bisect and two adds into the thread's own row.
+    A scrape may see a row between those two adds, so a bucket count can briefly lead its sum.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labelnames=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        row = shard.get(key)
+        if row is None:
+            row = shard[key] = [0] * (len(self.buckets) + 2) # [bucket counts..., +Inf count, sum]
+        row[bisect.bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def _merge(self, totals: dict, shard: dict):
+        for key, row in shard.items():
+            total = totals.get(key)
+            if total is None: totals[key] = list(row)
+            else: totals[key] = [a + b for a, b in zip(total, row)]
+
+    @property
+    def series(self) -> Dict[Tuple[str, ...], List[float]]:
+        return self._collect()
+
+    def samples(self):
+        out = []
+        for key, row in self._collect().items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row[:-1]):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = 'le="' + le + '"'
+                out.append(f"{self.name}_bucket{self._fmt_labels(key, le_label)} {cumulative}")
+            out.append(f"{self.name}_sum{self._fmt_labels(key)} {row[-1]}")
+            out.append(f"{self.name}_count{self._fmt_labels(key)} {cumulative}")
+        return out
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    """Prometheus text exposition format (version 0.0.4) for this process."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- API ---
+http_requests = Counter("http_requests_total", "HTTP requests by route, method and status", ("method", "route", "status"))
+http_latency = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route"))
+http_inflight = Gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+# --- DB POOL ---
+db_pool_checkouts = Counter("db_pool_checkouts_total", "Connections checked out of the SQLAlchemy pool")
+db_pool_overflow_checkouts = Counter("db_pool_overflow_checkouts_total", "Checkouts that found the pool exhausted and used overflow (contention)")
+db_pool_wait = Histogram("db_pool_checkout_wait_seconds", "Time from asking the pool for a connection to its checkout",
+                         buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0))
+db_pool_connects = Counter("db_pool_connects_total", "New DBAPI connections opened by the pool")
+
+# --- BCRYPT ---
+bcrypt_inflight = Gauge("bcrypt_operations_in_flight", "bcrypt hash/verify calls currently running")
+threadpool_busy = Gauge("threadpool_busy_threads", "Threadpool workers running sync routes (bcrypt runs here)")
+threadpool_size = Gauge("threadpool_size_threads", "Threadpool capacity for sync routes")
+bcrypt_duration = Histogram("bcrypt_duration_seconds", "bcrypt hash/verify duration", ("op",), buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0))
+
+# --- UPLOADS ---
+upload_bytes = Counter("upload_bytes_total", "Bytes written for uploaded files", ("kind",))
+upload_files = Counter("upload_files_total", "Uploaded files stored", ("kind",))
+upload_duration = Histogram("upload_write_seconds", "Time to persist one uploaded file", ("kind",))
+
+# --- WEBSOCKETS ---
+ws_messages_sent = Counter("ws_messages_sent_total", "WebSocket messages sent", ("audience",))
+ws_send_failures = Counter("ws_send_failures_total", "WebSocket sends that raised", ("audience",))
+ws_sends_in_flight = Gauge("ws_sends_in_flight", "WebSocket sends awaiting the socket (send-queue depth)")
+
+
+def install_pool_metrics(engine: Engine):
+    def timed(connect):
+        """Wraps pool.connect (what Engine.connect() calls) so the wait for a free connection is observed."""
+        def connect_and_time():
+            started = time.perf_counter()
+            conn = connect()
+            db_pool_wait.observe(time.perf_counter() - started)
+            return conn
+        return connect_and_time
+
+    def on_checkout(dbapi_conn, conn_record, conn_proxy):
+        db_pool_checkouts.inc()
+        size = getattr(engine.pool, "size", None)
+        checked_out = getattr(engine.pool, "checkedout", None)
+        if callable(size) and callable(checked_out) and checked_out() > size():
+            db_pool_overflow_checkouts.inc()
+
+    def on_connect(dbapi_conn, conn_record):
+        db_pool_connects.inc()
+
+    def on_disposed(engine):
+        engine.pool.connect = timed(engine.pool.connect) # dispose() swapped in a fresh pool
+
+    engine.pool.connect = timed(engine.pool.connect)
+    event.listen(engine, "checkout", on_checkout)
+    event.listen(engine, "connect", on_connect)
+    event.listen(engine, "engine_disposed", on_disposed)
+    for attr in ("size", "checkedout", "overflow", "checkedin"):
+        if callable(getattr(engine.pool, attr, None)):
+            Gauge(f"db_pool_{attr}", f"SQLAlchemy pool {attr}()", func=lambda attr=attr: getattr(engine.pool, attr)())
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency. Uses the route template, not the raw path."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_inflight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_inflight.dec()
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_latency.observe(time.perf_counter() - started, method=method, route=route_path)
+            http_requests.inc(method=method, route=route_path, status=status_code)
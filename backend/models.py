@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, DateTime, Date, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -134,10 +134,19 @@ class Project(Base):
     admin_feedback = Column(String, nullable=True) # For Rejection Comments
     completed_at = Column(DateTime, nullable=True)
     payout_amount = Column(Float, default=0.0) # Actual amount paid out
+    auto_assign = Column(Boolean, default=False) # Assigned (and rebalanced) by the work allocator
+    assigned_at = Column(DateTime, nullable=True)
+    split_from_id = Column(String, nullable=True) # Unit this one was rebalanced out of
+    review_round = Column(Integer, default=0) # Bumped on every rejection; keys the payout job of each approval
     
     images = relationship("Image", back_populates="project")
     assigned_to = relationship("Employee", back_populates="assigned_projects")
 
+    __table_args__ = (
+        Index("ix_projects_open_deadline", "is_finalized", "deadline"),
+        Index("ix_projects_approved_completed", "is_approved", "completed_at", "id"),
+    )
+
 # 5. Images Table
 class Image(Base):
     __tablename__ = "images"
@@ -146,10 +155,14 @@ class Image(Base):
     project_id = Column(String, ForeignKey("projects.id"))
     storage_url = Column(String)
     sequence_index = Column(Integer)
+    gold_schema_id = Column(Integer, nullable=True) # Reference answer for quality scoring, encoded like submission_blob
+    gold_blob = Column(LargeBinary, nullable=True)
 
     project = relationship("Project", back_populates="images")
     assignments = relationship("Assignment", back_populates="image")
 
+    __table_args__ = (Index("ix_images_project_seq", "project_id", "sequence_index", "id"),)
+
 # 6. Assignments Table
 class Assignment(Base):
     __tablename__ = "assignments"
@@ -159,11 +172,15 @@ class Assignment(Base):
     image_id = Column(String, ForeignKey("images.id"))
     status = Column(String, default="SUBMITTED") 
     started_at = Column(DateTime(timezone=True), server_default=func.now())
-    submission_data = Column(String, nullable=True)
+    submission_data = Column(String, nullable=True) # Legacy free-text JSON (rows written before form schemas)
+    schema_id = Column(Integer, nullable=True) # form_schemas.id the blob was encoded with
+    submission_blob = Column(LargeBinary, nullable=True) # msgpack values in schema field order (see submission_codec)
 
     employee = relationship("Employee", back_populates="assignments")
     image = relationship("Image", back_populates="assignments")
 
+    __table_args__ = (Index("ix_assignments_image_user", "image_id", "user_id"),)
+
 # 7. Support Messages (NEW)
 class SupportMessage(Base):
     __tablename__ = "support_messages"
@@ -177,6 +194,19 @@ class SupportMessage(Base):
     
     sender = relationship("Employee")
 
+    __table_args__ = (Index("ix_support_messages_user_ts_id", "user_id", "timestamp", "id"),)
+
+# 7b. Support Thread Summary (one row per employee, maintained on every message insert)
+class SupportThread(Base):
+    __tablename__ = "support_threads"
+
+    user_id = Column(String, ForeignKey("employees.id"), primary_key=True)
+    last_message = Column(String, nullable=True) # Preview only
+    last_timestamp = Column(DateTime(timezone=True), nullable=True, index=True)
+    unread_count = Column(Integer, default=0) # Unread messages from the employee
+
+    employee = relationship("Employee")
+
 # 8. Contact Us Submissions
 class ContactSubmission(Base):
     __tablename__ = "contact_submissions"
@@ -230,6 +260,10 @@ class CommunityPost(Base):
     status = Column(String, default="PENDING") # PENDING, APPROVED, REJECTED
     admin_feedback = Column(String, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (
+        Index("ix_community_posts_status_created", "status", "created_at", "id"),
+        Index("ix_community_posts_author_created", "author_id", "created_at", "id"),
+    )
 
 class CommunityLike(Base):
     __tablename__ = "community_likes"
@@ -244,6 +278,7 @@ class CommunityComment(Base):
     user_name = Column(String)
     content = Column(String)
     created_at = Column(DateTime, default=datetime.utcnow)
+    __table_args__ = (Index("ix_community_comments_post_created", "post_id", "created_at", "id"),)
 
 class AuditLog(Base):
     __tablename__ = "audit_logs"
@@ -258,4 +293,151 @@ class AuditLog(Base):
     
     # Blockchain / Tamper Proof
     prev_hash = Column(String, nullable=True)
-    block_hash = Column(String, nullable=True)
\ No newline at end of file
+    block_hash = Column(String, nullable=True)
+
+    # Audit search: newest-first keyset pages, optionally narrowed by action or actor
+    __table_args__ = (
+        Index("ix_audit_logs_ts_id", "timestamp", "id"),
+        Index("ix_audit_logs_action_ts", "action", "timestamp", "id"),
+        Index("ix_audit_logs_user_ts", "user_id", "timestamp", "id"),
+        Index("ix_audit_logs_username_ts", "username", "timestamp", "id"),
+    )
+
+# 11. Background Scheduler Leases (one holder per lease across worker processes)
+class SchedulerLease(Base):
+    __tablename__ = "scheduler_leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+# 12. Background Jobs (durable queue drained by job_queue worker processes)
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    kind = Column(String, nullable=False, index=True)
+    payload = Column(String, nullable=True) # JSON
+    status = Column(String, default="QUEUED") # QUEUED, RUNNING, SUCCEEDED, FAILED
+    priority = Column(Integer, default=0) # Higher runs first
+    idempotency_key = Column(String, unique=True, nullable=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime, default=datetime.now)
+    locked_by = Column(String, nullable=True)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(String, nullable=True)
+    result = Column(String, nullable=True) # JSON
+    created_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_background_jobs_claim", "status", "priority", "run_after"),)
+
+# 13. Employee Daily Rollup (maintained incrementally by analytics.record_daily_stat)
+class EmployeeDailyStat(Base):
+    __tablename__ = "employee_daily_stats"
+
+    employee_id = Column(String, ForeignKey("employees.id"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    earnings = Column(Float, default=0.0)
+    images_completed = Column(Integer, default=0)
+    approvals = Column(Integer, default=0)
+    rejections = Column(Integer, default=0)
+    time_spent_seconds = Column(Float, default=0.0) # Sum over timed images
+    timed_images = Column(Integer, default=0)
+
+# 14. Work Timers (time spent per image, started on /work/allocate, stopped on /work/submit)
+class WorkTimer(Base):
+    __tablename__ = "work_timers"
+
+    user_id = Column(String, ForeignKey("employees.id"), primary_key=True)
+    image_id = Column(String, ForeignKey("images.id"), primary_key=True)
+    served_at = Column(DateTime, nullable=True) # Null when not currently open
+    time_spent_seconds = Column(Float, default=0.0)
+
+# 15. Quantile Sketches (checkpointed speed_tracker histograms per cohort)
+class QuantileSketch(Base):
+    __tablename__ = "quantile_sketches"
+
+    cohort = Column(String, primary_key=True) # "global", "level:N"
+    data = Column(String, nullable=True) # JSON bucket -> count
+    sample_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, nullable=True)
+# 16. Audit Checkpoints (last verified point of the audit_logs hash chain)
+class AuditCheckpoint(Base):
+    __tablename__ = "audit_checkpoints"
+
+    id = Column(Integer, primary_key=True, index=True)
+    last_entry_id = Column(Integer, nullable=False) # Highest audit_logs.id covered by the verification
+    last_hash = Column(String, nullable=False) # Its block_hash at verification time
+    entries_verified = Column(Integer, default=0) # Rows scanned by the run that wrote this checkpoint
+    verified_at = Column(DateTime, default=datetime.now)
+
+# 17. Form Schemas (versioned submission forms; project_id NULL = default for projects without their own)
+class FormSchema(Base):
+    __tablename__ = "form_schemas"
+
+    id = Column(Integer, primary_key=True) # Also the schema version stored on each assignment
+    project_id = Column(String, nullable=True)
+    definition = Column(String, nullable=False) # JSON: {"fields": [{"name", "type", ...}]}
+    created_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (Index("ix_form_schemas_project", "project_id", "id"),)
+
+# 18. Dataset Exports (one row per export run; the last SUCCEEDED run of a stream is its watermark)
+class DatasetExport(Base):
+    __tablename__ = "dataset_exports"
+
+    id = Column(String, primary_key=True, index=True)
+    name = Column(String, nullable=False) # Dataset stream, e.g. "default"
+    format = Column(String, nullable=False) # jsonl, csv, parquet
+    status = Column(String, default="RUNNING") # RUNNING, SUCCEEDED, FAILED
+    full = Column(Boolean, default=False) # Ignored the previous watermark
+    watermark_completed_at = Column(DateTime, nullable=True) # (completed_at, id) of the last approved project included
+    watermark_project_id = Column(String, nullable=True)
+    projects = Column(Integer, default=0)
+    rows = Column(Integer, default=0)
+    files = Column(String, nullable=True) # JSON list of shard files, relative to the run directory
+    error = Column(String, nullable=True)
+    started_at = Column(DateTime, default=datetime.now)
+    finished_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (Index("ix_dataset_exports_stream", "name", "format", "status", "started_at"),)
+
+# 19. Project Co-Annotators (extra annotators labelling the same images as the assignee, for agreement scoring)
+class ProjectAnnotator(Base):
+    __tablename__ = "project_annotators"
+
+    project_id = Column(String, ForeignKey("projects.id"), primary_key=True)
+    user_id = Column(String, ForeignKey("employees.id"), primary_key=True)
+    added_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (Index("ix_project_annotators_user", "user_id"),)
+
+# 20. Field Agreement (per project and form field, written by quality_engine)
+class FieldAgreement(Base):
+    __tablename__ = "field_agreements"
+
+    project_id = Column(String, ForeignKey("projects.id"), primary_key=True)
+    field = Column(String, primary_key=True)
+    items = Column(Integer, default=0) # Images with 2+ annotations
+    agreement = Column(Float, nullable=True) # Observed pairwise agreement
+    kappa = Column(Float, nullable=True) # Fleiss' kappa (chance corrected)
+    unanimous = Column(Float, nullable=True) # Share of items where every annotator agreed
+    gold_items = Column(Integer, default=0) # Annotations of images with a gold answer
+    gold_accuracy = Column(Float, nullable=True)
+    computed_at = Column(DateTime, default=datetime.now)
+
+# 21. Annotator Quality (per project and annotator, written by quality_engine)
+class AnnotatorQuality(Base):
+    __tablename__ = "annotator_quality"
+
+    project_id = Column(String, ForeignKey("projects.id"), primary_key=True)
+    user_id = Column(String, ForeignKey("employees.id"), primary_key=True)
+    items = Column(Integer, default=0) # Field values compared against other annotators
+    agreement = Column(Float, nullable=True) # Mean share of other annotators agreeing with this one
+    gold_items = Column(Integer, default=0) # Field values compared against gold answers
+    gold_accuracy = Column(Float, nullable=True)
+    computed_at = Column(DateTime, default=datetime.now)
+
+    __table_args__ = (Index("ix_annotator_quality_user", "user_id"),)
@@ -0,0 +1,158 @@
+import logging
+import argparse
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import text, func
+from sqlalchemy.orm import Session
+
+import models
+from submission_codec import decode_submission
+
+logger = logging.getLogger(__name__)
+
+_PROJECT_ANNOTATIONS_SQL = """
+    SELECT a.user_id, a.image_id, a.schema_id, a.submission_blob, a.submission_data, i.gold_schema_id, i.gold_blob
+    FROM images i JOIN assignments a ON a.image_id = i.id
+    WHERE i.project_id = :pid"""
+
+
+def canonical(value: Any) -> Any:
+    """Hashable, formatting-insensitive form of a field value: strings case/space folded, record lists order-free."""
+    if isinstance(value, str): return " ".join(value.casefold().split())
+    if isinstance(value, dict): return tuple((k, canonical(v)) for k, v in sorted(value.items()))
+    if isinstance(value, list): return tuple(sorted((canonical(v) for v in value), key=repr))
+    return value
+
+
+class _Codes:
+    """Integer category codes per field value, so comparisons run on int arrays."""
+
+    def __init__(self):
+        self._codes: Dict[Any, int] = {}
+
+    def __call__(self, value: Any) -> int:
+        return self._codes.setdefault(canonical(value), len(self._codes))
+
+    def __len__(self):
+        return len(self._codes)
+
+
+def _ratio(num, den) -> Optional[float]:
+    return round(float(num) / float(den), 4) if den else None
+
+
+def score_project(db: Session, project_id: str) -> Dict[str, Any]:
+    """
+    Recomputes field agreement and annotator quality for one project; the caller commits.
+
+    Every form field becomes a (annotators x images) matrix of category codes (-1 = not annotated).
+    Per field: observed agreement and Fleiss' kappa over images with 2+ annotations, and accuracy of
+    all annotations on images with a gold answer. Per annotator: the mean share of co-annotators
+    agreeing with each of their values, and their accuracy against gold.
+    """
+    annotations, gold = {}, {}
+    for user_id, image_id, schema_id, blob, legacy, gold_schema_id, gold_blob in db.execute(text(_PROJECT_ANNOTATIONS_SQL), {"pid": project_id}):
+        data = decode_submission(db, schema_id, blob, legacy)
+        if isinstance(data, dict): annotations[(user_id, image_id)] = data
+        if gold_blob is not None and image_id not in gold: gold[image_id] = decode_submission(db, gold_schema_id, gold_blob)
+
+    users = sorted({u for u, _ in annotations})
+    images = sorted({i for _, i in annotations})
+    u_index, i_index = {u: n for n, u in enumerate(users)}, {i: n for n, i in enumerate(images)}
+    fields: List[str] = []
+    for data in annotations.values():
+        fields.extend(f for f in data if f not in fields)
+
+    n_users, n_images = len(users), len(images)
+    user_agree, user_compared = np.zeros(n_users), np.zeros(n_users)
+    user_correct, user_gold = np.zeros(n_users), np.zeros(n_users)
+    field_rows = []
+    for field in fields:
+        codes = _Codes()
+        matrix = np.full((n_users, n_images), -1, dtype=np.int64)
+        for (user_id, image_id), data in annotations.items():
+            matrix[u_index[user_id], i_index[image_id]] = codes(data.get(field))
+        gold_codes = np.full(n_images, -1, dtype=np.int64)
+        for image_id, data in gold.items():
+            if image_id in i_index and isinstance(data, dict): gold_codes[i_index[image_id]] = codes(data.get(field))
+
+        present = matrix >= 0
+        us, its = np.nonzero(present)
+        counts = np.zeros((n_images, len(codes)), dtype=np.int64) # counts[i, k] = annotators giving category k on image i
+        np.add.at(counts, (its, matrix[us, its]), 1)
+        per_image = present.sum(axis=0)
+        multi = per_image >= 2
+
+        agreement = kappa = unanimous = None
+        if multi.any():
+            n = per_image[multi]
+            c = counts[multi]
+            p_i = (c * (c - 1)).sum(axis=1) / (n * (n - 1))
+            agreement = float(p_i.mean())
+            p_k = c.sum(axis=0) / c.sum()
+            p_e = float((p_k ** 2).sum())
+            kappa = (agreement - p_e) / (1 - p_e) if p_e < 1 else 1.0
+            unanimous = float((c.max(axis=1) == n).mean())
+
+            # Each annotation on a shared image: share of the other annotators choosing the same category
+            shared = multi[its]
+            su, si = us[shared], its[shared]
+            np.add.at(user_agree, su, (counts[si, matrix[su, si]] - 1) / (per_image[si] - 1))
+            np.add.at(user_compared, su, 1)
+
+        on_gold = gold_codes[its] >= 0
+        gu, gi = us[on_gold], its[on_gold]
+        correct = matrix[gu, gi] == gold_codes[gi]
+        np.add.at(user_correct, gu, correct)
+        np.add.at(user_gold, gu, 1)
+
+        field_rows.append({
+            "field": field, "items": int(multi.sum()),
+            "agreement": None if agreement is None else round(agreement, 4),
+            "kappa": None if kappa is None else round(kappa, 4),
+            "unanimous": None if unanimous is None else round(unanimous, 4),
+            "gold_items": int(len(gi)), "gold_accuracy": _ratio(correct.sum(), len(gi))
+        })
+
+    annotator_rows = [{
+        "user_id": user_id, "items": int(user_compared[n]), "agreement": _ratio(user_agree[n], user_compared[n]),
+        "gold_items": int(user_gold[n]), "gold_accuracy": _ratio(user_correct[n], user_gold[n])
+    } for n, user_id in enumerate(users)]
+
+    now = datetime.now()
+    db.query(models.FieldAgreement).filter(models.FieldAgreement.project_id == project_id).delete(synchronize_session=False)
+    db.query(models.AnnotatorQuality).filter(models.AnnotatorQuality.project_id == project_id).delete(synchronize_session=False)
+    if field_rows: db.execute(models.FieldAgreement.__table__.insert(), [{**r, "project_id": project_id, "computed_at": now} for r in field_rows])
+    if annotator_rows: db.execute(models.AnnotatorQuality.__table__.insert(), [{**r, "project_id": project_id, "computed_at": now} for r in annotator_rows])
+    return {"project_id": project_id, "annotations": len(annotations), "gold_images": len(gold), "fields": field_rows, "annotators": annotator_rows}
+
+
+def annotator_quality_summary(db: Session, user_id: str) -> Dict[str, Any]:
+    """Item-weighted agreement and gold accuracy across every scored project of one annotator (ix_annotator_quality_user)."""
+    q = models.AnnotatorQuality
+    compared, agree, gold_items, correct = db.query(
+        func.sum(q.items), func.sum(q.agreement * q.items), func.sum(q.gold_items), func.sum(q.gold_accuracy * q.gold_items)
+    ).filter(q.user_id == user_id).one()
+    return {"compared_items": int(compared or 0), "agreement": _ratio(agree or 0, compared),
+            "gold_items": int(gold_items or 0), "gold_accuracy": _ratio(correct or 0, gold_items)}
+
+
+if __name__ == "__main__":
+    import database
+    parser = argparse.ArgumentParser(description="Recompute annotation agreement and quality scores")
+    parser.add_argument("--project", action="append", help="Project id (repeatable); default: every project with annotations")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    models.Base.metadata.create_all(bind=database.engine)
+    db = database.SessionLocal()
+    try:
+        project_ids = args.project or [r[0] for r in db.execute(text("SELECT DISTINCT i.project_id FROM images i JOIN assignments a ON a.image_id = i.id"))]
+        for project_id in project_ids:
+            result = score_project(db, project_id)
+            db.commit()
+            logger.info(f"{project_id}: {result['annotations']} annotations by {len(result['annotators'])} annotators")
+        print(f"Scored {len(project_ids)} projects")
+    finally:
+        db.close()
@@ -0,0 +1,123 @@
+import os
+import time
+import logging
+from contextvars import ContextVar
+from typing import Optional, List, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("query_profiler")
+
+# Configuration
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "1") == "1"
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", 25)) # Queries per request
+LATENCY_BUDGET_MS = float(os.getenv("LATENCY_BUDGET_MS", 500))
+PROFILER_SLOWEST_N = int(os.getenv("PROFILER_SLOWEST_N", 3))
+PROFILER_MAX_STATEMENTS = 200 # Per request, bounds memory on runaway N+1 loops
+
+
+class QueryStats:
+    """SQL activity of one request."""
+
+    __slots__ = ("count", "db_time", "statements")
+
+    def __init__(self):
+        self.count = 0
+        self.db_time = 0.0
+        self.statements: List[Tuple[float, str]] = []
+
+    def add(self, duration: float, statement: str):
+        self.count += 1
+        self.db_time += duration
+        if len(self.statements) < PROFILER_MAX_STATEMENTS:
+            self.statements.append((duration, statement))
+
+    def slowest(self, n: int = PROFILER_SLOWEST_N) -> List[Tuple[float, str]]:
+        return sorted(self.statements, key=lambda s: s[0], reverse=True)[:n]
+
+
+# Set by the middleware; sync routes see it too because the threadpool copies the context
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+# The start time lives on the statement's execution context, not a per-connection stack: a statement
+# that raises never reaches after_cursor_execute, and its context is simply dropped with it
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_start_time", None)
+    stats = _current_stats.get()
+    if stats is not None and started is not None:
+        stats.add(time.perf_counter() - started, statement)
+
+
+def install_query_listeners(engine: Engine):
+    """Registers the cursor listeners once; they only record while a request is being profiled."""
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryProfilerMiddleware:
+    """
+    ASGI middleware that counts queries and DB time per HTTP request.
+
+    Adds a Server-Timing header (db / app durations), writes one structured log line per request
+    and logs the full statement list when the request exceeds QUERY_BUDGET or LATENCY_BUDGET_MS.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not PROFILER_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                timing = f'db;dur={stats.db_time * 1000:.1f};desc="{stats.count} queries", app;dur={elapsed_ms:.1f}'
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
+            self._report(scope, status_code, stats, (time.perf_counter() - started) * 1000)
+
+    def _report(self, scope, status_code: int, stats: QueryStats, elapsed_ms: float):
+        record = {
+            "event": "request",
+            "method": scope.get("method"),
+            "path": scope.get("path"),
+            "status": status_code,
+            "duration_ms": round(elapsed_ms, 2),
+            "queries": stats.count,
+            "db_ms": round(stats.db_time * 1000, 2),
+            "slowest": [{"ms": round(d * 1000, 2), "sql": sql[:300]} for d, sql in stats.slowest()]
+        }
+        if stats.count > QUERY_BUDGET or elapsed_ms > LATENCY_BUDGET_MS:
+            record["event"] = "request_over_budget"
+            record["statements"] = [{"ms": round(d * 1000, 2), "sql": sql} for d, sql in stats.statements]
+            logger.warning(f"{record['method']} {record['path']} over budget", extra={"fields": record})
+        else:
+            logger.info(f"{record['method']} {record['path']}", extra={"fields": record})
@@ -0,0 +1,207 @@
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, Sequence
+
+# Configuration
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "1") != "0"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 2048))
+
+# Headers produced by the route that are replayed on a hit (everything else is per request or set here)
+_REPLAYED_HEADERS = {b"content-type", b"content-length", b"content-language"}
+
+
+@dataclass
+class CachePolicy:
+    ttl: float
+    tags: Tuple[str, ...]
+    per_user: bool
+
+
+@dataclass
+class CachedResponse:
+    expires: float
+    etag: str
+    headers: list
+    body: bytes
+    tags: Tuple[str, ...]
+
+
+def cache_response(ttl: float, tags: Sequence[str] = (), per_user: bool = False):
+    """
+    Marks a GET route (no path parameters) as cacheable by ResponseCacheMiddleware.
+
+    `tags` name the data the response is built from; write routes call
+    `response_cache.invalidate(tag)` after committing. Per-user responses are keyed by the
+    bearer token's subject and also tagged "user:<id>".
+    """
+    def decorator(func):
+        func.__cache_policy__ = CachePolicy(ttl, tuple(tags), per_user)
+        return func
+    return decorator
+
+
+class ResponseCache:
+    """
+    Per-process LRU of rendered 200 responses with per-entry TTL and tag invalidation.
+
+    Invalidation bumps `generation`; a miss that started before the bump is not stored, so a
+    response rendered from pre-write data cannot outlive the write that invalidated it.
+    """
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, CachedResponse]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires < time.monotonic():
+                if entry is not None: self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry: CachedResponse, generation: int):
+        with self._lock:
+            if generation != self.generation: return
+            if key in self._entries: self._remove(key)
+            self._entries[key] = entry
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, *tags: str):
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None: return
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys: del self._tags[tag]
+
+
+response_cache = ResponseCache()
+
+
+def weak_etag(body: bytes) -> str:
+    return f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison (RFC 9110 8.8.3.2) against an If-None-Match header value."""
+    if if_none_match.strip() == "*": return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+class ResponseCacheMiddleware:
+    """
+    ASGI middleware serving routes marked with @cache_response from `response_cache`.
+
+    Every cacheable response gets a weak ETag and `Cache-Control: no-cache`, so browsers
+    revalidate on each load and get an empty 304 while the data is unchanged. Hits, 304s
+    included, never reach the route (no DB work). `identify` maps a bearer token to a user id
+    for per-user routes (None = not cacheable; the route then handles auth as usual).
+    """
+
+    def __init__(self, app, identify: Callable[[str], Optional[str]]):
+        self.app = app
+        self.identify = identify
+        self._policies: Optional[Dict[str, CachePolicy]] = None
+
+    def _policy(self, scope) -> Optional[CachePolicy]:
+        if self._policies is None:
+            # Built on first use, once every route has been registered
+            self._policies = {}
+            for route in scope["app"].routes:
+                policy = getattr(getattr(route, "endpoint", None), "__cache_policy__", None)
+                if policy and "GET" in (getattr(route, "methods", None) or ()) and "{" not in route.path:
+                    self._policies[route.path] = policy
+        return self._policies.get(scope["path"])
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET" or not RESPONSE_CACHE_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        policy = self._policy(scope)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        user_id = ""
+        if policy.per_user:
+            auth = headers.get(b"authorization", b"").decode("latin-1")
+            user_id = self.identify(auth[7:]) if auth[:7].lower() == "bearer " else None
+            if not user_id:
+                await self.app(scope, receive, send)
+                return
+        key = (scope["path"], scope.get("query_string", b""), user_id)
+        if_none_match = headers.get(b"if-none-match", b"").decode("latin-1")
+        cache_control = "private, no-cache" if policy.per_user else "no-cache"
+
+        entry = response_cache.get(key)
+        if entry is not None:
+            await self._send_entry(send, entry, if_none_match, cache_control, b"HIT")
+            return
+
+        generation = response_cache.generation
+        start, chunks = None, []
+
+        async def capture(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message
+                if start["status"] != 200: await send(message)
+                return
+            if start["status"] != 200:
+                await send(message)
+                return
+            chunks.append(message.get("body", b""))
+            if message.get("more_body", False): return
+            body = b"".join(chunks)
+            tags = policy.tags + ((f"user:{user_id}",) if policy.per_user else ())
+            entry = CachedResponse(time.monotonic() + policy.ttl, weak_etag(body),
+                                   [(k, v) for k, v in start.get("headers", []) if k.lower() in _REPLAYED_HEADERS], body, tags)
+            response_cache.put(key, entry, generation)
+            await self._send_entry(send, entry, if_none_match, cache_control, b"MISS")
+
+        await self.app(scope, receive, capture)
+
+    async def _send_entry(self, send, entry: CachedResponse, if_none_match: str, cache_control: str, state: bytes):
+        common = [(b"etag", entry.etag.encode("latin-1")), (b"cache-control", cache_control.encode("latin-1")), (b"x-cache", state)]
+        if if_none_match and etag_matches(if_none_match, entry.etag):
+            await send({"type": "http.response.start", "status": 304, "headers": common})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        await send({"type": "http.response.start", "status": 200, "headers": entry.headers + common})
+        await send({"type": "http.response.body", "body": entry.body})
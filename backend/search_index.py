@@ -0,0 +1,98 @@
+import sys
+import logging
+from typing import Dict, Any, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import database
+from fts_index import ensure_fts_table, rebuild_fts_table, to_match_query
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SEARCH_PAGE_DEFAULT = 20
+SEARCH_PAGE_MAX = 100
+SNIPPET_TOKENS = 10
+
+# type -> FTS table, source table, indexed columns (with bm25 weights), and how hits are presented.
+# These sources have TEXT primary keys, so hits are joined on `id` (stored UNINDEXED in the FTS
+# table) rather than on the implicit rowid, which VACUUM may renumber.
+SEARCH_KEY = "id"
+SEARCH_SOURCES = {
+    "employee": {
+        "fts": "employees_fts", "source": "employees",
+        "columns": {"full_name": 4.0, "username": 4.0, "employee_code": 2.0, "mobile": 1.0},
+        "title": "src.username", "subtitle": "src.full_name", "extra": "src.employee_code", "ts": "src.created_at",
+    },
+    "contact": {
+        "fts": "contacts_fts", "source": "contacts",
+        "columns": {"name": 4.0, "email": 2.0, "mobile": 1.0, "message": 1.0},
+        "title": "src.name", "subtitle": "src.email", "extra": "src.status", "ts": "src.submitted_at",
+    },
+    "post": {
+        "fts": "community_posts_fts", "source": "community_posts",
+        "columns": {"content": 1.0, "author_name": 2.0},
+        "title": "src.author_name", "subtitle": "src.status", "extra": "src.author_id", "ts": "src.created_at",
+    },
+    "support": {
+        "fts": "support_messages_fts", "source": "support_messages",
+        "columns": {"message": 1.0},
+        "title": "src.user_id", "subtitle": "CASE WHEN src.is_from_admin THEN 'admin' ELSE 'employee' END", "extra": "NULL", "ts": "src.timestamp",
+    },
+}
+
+
+def ensure_search_indexes(rebuild: bool = False):
+    """Creates (first run: builds) every FTS table and its sync triggers."""
+    for spec in SEARCH_SOURCES.values():
+        ensure_fts_table(spec["fts"], spec["source"], list(spec["columns"]), key=SEARCH_KEY)
+        if rebuild:
+            with database.engine.begin() as conn:
+                rebuild_fts_table(conn, spec["fts"], spec["source"], list(spec["columns"]), key=SEARCH_KEY)
+
+
+def _source_query(kind: str) -> str:
+    spec = SEARCH_SOURCES[kind]
+    weights = ", ".join(["0.0"] + [str(w) for w in spec["columns"].values()]) # The key column carries no text
+    return f"""
+        SELECT '{kind}' AS type, src.id AS id, {spec['title']} AS title, {spec['subtitle']} AS subtitle, {spec['extra']} AS extra,
+               {spec['ts']} AS ts, snippet({spec['fts']}, -1, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet, bm25({spec['fts']}, {weights}) AS rank
+        FROM {spec['fts']} JOIN {spec['source']} AS src ON src.{SEARCH_KEY} = {spec['fts']}.{SEARCH_KEY}
+        WHERE {spec['fts']} MATCH :match"""
+
+
+def search(db: Session, q: str, types: Optional[Sequence[str]] = None, limit: int = SEARCH_PAGE_DEFAULT, offset: int = 0) -> Dict[str, Any]:
+    """
+    One ranked page of hits across the requested types (all by default).
+
+    A single UNION ALL over the FTS tables ordered by bm25, so only `limit` rows are
+    materialised however many documents match.
+    """
+    limit = max(1, min(limit, SEARCH_PAGE_MAX))
+    kinds = [k for k in (types or SEARCH_SOURCES) if k in SEARCH_SOURCES]
+    match = to_match_query(q)
+    if not match or not kinds:
+        return {"q": q, "items": [], "offset": offset, "next_offset": None}
+    sql = " UNION ALL ".join(_source_query(k) for k in kinds) + " ORDER BY rank LIMIT :limit OFFSET :offset"
+    rows = db.execute(text(sql), {"match": match, "limit": limit + 1, "offset": max(offset, 0)}).fetchall()
+    items = [{
+        "type": r.type, "id": r.id, "title": r.title, "subtitle": r.subtitle, "extra": r.extra,
+        "timestamp": r.ts, "snippet": r.snippet, "score": round(-r.rank, 6)
+    } for r in rows[:limit]]
+    return {"q": q, "items": items, "offset": offset, "next_offset": offset + limit if len(rows) > limit else None}
+
+
+def matching_ids_clause(kind: str) -> str:
+    """SQL predicate restricting the source table to rows matching :match (for list endpoints)."""
+    spec = SEARCH_SOURCES[kind]
+    return f"{spec['source']}.{SEARCH_KEY} IN (SELECT {SEARCH_KEY} FROM {spec['fts']} WHERE {spec['fts']} MATCH :match)"
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if "--rebuild" in sys.argv:
+        ensure_search_indexes(rebuild=True)
+        print("Search indexes rebuilt")
+    else:
+        print("Usage: python search_index.py --rebuild")
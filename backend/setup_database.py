@@ -2,9 +2,36 @@ import sqlite3
 import os
 import bcrypt
 import uuid
+import json
+import time
+import random
+import argparse
+from datetime import datetime, timedelta
 
 # Configuration
 DB_FILE = "medical_platform.db"
+BULK_CHUNK_SIZE = 20000 # Rows per executemany call
+TIMESTAMP_POOL_SIZE = 1 << 18 # Distinct pre-formatted timestamps the generator samples from
+
+# Synthetic data defaults (--generate); every value can be overridden on the command line
+GENERATOR_DEFAULTS = {
+    "employees": 5000,
+    "projects": 20000,
+    "images_per_batch": "50:200",     # Uniform min:max images per project
+    "active_skew": 1.1,               # Zipf exponent of per-user activity (0 = uniform)
+    "unassigned_fraction": 0.1,       # Projects never assigned
+    "finalized_fraction": 0.6,        # Assigned projects already submitted
+    "approved_fraction": 0.8,         # Finalized projects approved (rest rejected or pending)
+    "ledger_per_employee": 60,        # Mean wallet rows per employee (distributed by activity)
+    "withdrawals_per_employee": 2,
+    "posts": 5000,
+    "likes_per_post": 8,
+    "comments_per_post": 3,
+    "support_per_employee": 4,
+    "audit_logs": 50000,
+    "days": 180,                      # History window for timestamps
+    "seed": 42,
+}
 
 def create_tables(cursor):
     """Initializes the database schema with Withdrawal, KYC, Banking, and Project fields."""
@@ -101,6 +128,10 @@ def create_tables(cursor):
         admin_feedback TEXT,
         completed_at TIMESTAMP,
         payout_amount REAL DEFAULT 0.0,
+        auto_assign BOOLEAN DEFAULT 0,
+        assigned_at TIMESTAMP,
+        split_from_id TEXT,
+        review_round INTEGER DEFAULT 0,
         
         FOREIGN KEY (assigned_to_id) REFERENCES employees (id)
     )''')
@@ -112,6 +143,8 @@ def create_tables(cursor):
         project_id TEXT NOT NULL,
         storage_url TEXT NOT NULL,
         sequence_index INTEGER NOT NULL,
+        gold_schema_id INTEGER,
+        gold_blob BLOB,
         FOREIGN KEY (project_id) REFERENCES projects (id)
     )''')
 
@@ -124,6 +157,8 @@ def create_tables(cursor):
         status TEXT DEFAULT 'SUBMITTED',
         started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         submission_data TEXT,
+        schema_id INTEGER,
+        submission_blob BLOB,
         FOREIGN KEY (user_id) REFERENCES employees (id),
         FOREIGN KEY (image_id) REFERENCES images (id),
         UNIQUE(user_id, image_id)
@@ -230,21 +265,246 @@ def insert_seed_user(cursor, username, password, gender, emp_code, is_admin=Fals
     
     print(f"✅ Created User: {username} (Code: {emp_code})")
 
+class BulkWriter:
+    """Buffers rows for one INSERT statement and flushes them with executemany."""
+
+    def __init__(self, cursor, sql):
+        self.cursor = cursor
+        self.sql = sql
+        self.rows = []
+        self.count = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= BULK_CHUNK_SIZE: self.flush()
+
+    def extend(self, rows):
+        self.rows.extend(rows)
+        if len(self.rows) >= BULK_CHUNK_SIZE: self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.cursor.executemany(self.sql, self.rows)
+            self.count += len(self.rows)
+            self.rows = []
+
+def apply_bulk_pragmas(cursor):
+    """Trades durability for speed while loading; the file is rebuilt from scratch anyway."""
+    cursor.execute("PRAGMA foreign_keys = OFF;")
+    cursor.execute("PRAGMA synchronous = OFF;")
+    cursor.execute("PRAGMA journal_mode = MEMORY;")
+    cursor.execute("PRAGMA temp_store = MEMORY;")
+    cursor.execute("PRAGMA cache_size = -262144;") # 256 MB
+
+def create_orm_tables(db_file):
+    """Creates the tables only defined in models.py (support, jobs, rollups...) so they can be filled too."""
+    from sqlalchemy import create_engine
+    import models
+    engine = create_engine(f"sqlite:///{db_file}")
+    models.Base.metadata.create_all(bind=engine)
+    engine.dispose()
+
+def parse_range(value):
+    low, _, high = str(value).partition(":")
+    return int(low), int(high or low)
+
+def generate_synthetic_data(cursor, **overrides):
+    """
+    Fills every table with realistic volumes in a single transaction using executemany.
+
+    Activity follows a Zipf distribution: a few employees own most projects, ledger rows,
+    support threads and posts. Returns the row count per table.
+    """
+    cfg = {**GENERATOR_DEFAULTS, **{k: v for k, v in overrides.items() if v is not None}}
+    rng = random.Random(cfg["seed"])
+    now = datetime.now()
+    span = cfg["days"] * 86400
+    img_min, img_max = parse_range(cfg["images_per_batch"])
+
+    # Formatting datetimes and uuid4() per row dominate generation time, so sample from pools.
+    # Ids are uuid-shaped but time-ordered (like UUIDv7): inserts append to the primary-key
+    # B-trees instead of splitting random pages, and the same --seed gives the same database.
+    timestamps = [(now - timedelta(seconds=span * i / TIMESTAMP_POOL_SIZE)).isoformat(" ") for i in range(TIMESTAMP_POOL_SIZE)]
+    recent = [(now - timedelta(seconds=rng.random() * 86400 * 7)).isoformat(" ") for _ in range(1024)]
+    # Submissions are stored encoded with the default form schema (stored as form_schemas id 1)
+    from submission_codec import FormSchema, DEFAULT_FORM_DEFINITION
+    cursor.execute("INSERT INTO form_schemas (id, project_id, definition, created_at) VALUES (1, NULL, ?, ?)", (json.dumps(DEFAULT_FORM_DEFINITION), now.isoformat(" ")))
+    form = FormSchema(1, DEFAULT_FORM_DEFINITION)
+    drugs = ["Paracetamol", "Amoxicillin", "Metformin", "Atorvastatin", "Omeprazole", "Cetirizine", "Azithromycin", "Pantoprazole"]
+    submissions = [form.encode({
+        "name": f"Patient {i}", "notes": rng.choice(["Fever and body ache", "Type 2 diabetes follow-up", "Upper respiratory infection", "Hypertension review"]),
+        "medicines": [{"name": rng.choice(drugs), "dose": f"{rng.choice((250, 500, 650))}mg", "freq": rng.choice(("1-0-1", "1-1-1", "0-0-1")), "days": str(rng.randint(3, 14))}
+                      for _ in range(rng.randint(0, 3))]
+    }) for i in range(64)]
+
+    def past():
+        return timestamps[rng.getrandbits(18) % TIMESTAMP_POOL_SIZE]
+
+    sequence = iter(range(1 << 48))
+
+    def new_id():
+        h = "%012x%020x" % (next(sequence), rng.getrandbits(80))
+        return f"{h[:8]}-{h[8:12]}-7{h[13:16]}-{h[16:20]}-{h[20:]}"
+
+    # Employees (one shared bcrypt hash; hashing per row would dominate the run)
+    password_hash = bcrypt.hashpw(b"synthetic-pass", bcrypt.gensalt()).decode("utf-8")
+    emp_ids = [new_id() for _ in range(cfg["employees"])]
+    weights = [1 / (rank + 1) ** cfg["active_skew"] for rank in range(len(emp_ids))]
+    cum_weights, total = [], 0.0
+    for w in weights:
+        total += w; cum_weights.append(total)
+
+    def pick_active(k):
+        return rng.choices(emp_ids, cum_weights=cum_weights, k=k)
+
+    cursor.execute("SELECT current_count FROM id_counter WHERE id = 1")
+    code_base = cursor.fetchone()[0]
+    employees = BulkWriter(cursor, """INSERT INTO employees (id, employee_code, username, password_hash, gender, wallet_balance, status, role,
+        created_at, last_login, login_streak, level, xp, total_earned, full_name, city, kyc_status) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)""")
+    for i, emp_id in enumerate(emp_ids):
+        gender = rng.choice("MF")
+        level = 1 + min(int(weights[i] * 8 / weights[0] + rng.random() * 2), 7)
+        employees.add((emp_id, f"PPX-C{gender}-{str(code_base + i + 1).zfill(7)}", f"user{i:06d}", password_hash, gender, 0.0,
+                       "BANNED" if rng.random() < 0.01 else "ACTIVE", "EMPLOYEE", past(), rng.choice(recent), rng.randint(0, 30), level,
+                       rng.randint(0, level * 1000), 0.0, f"Synthetic User {i}", rng.choice(("Delhi", "Mumbai", "Pune", "Jaipur", "Chennai")),
+                       rng.choice(("NOT_UPLOADED", "PENDING", "APPROVED", "APPROVED"))))
+    employees.flush()
+    cursor.execute("UPDATE id_counter SET current_count = ? WHERE id = 1", (code_base + len(emp_ids),))
+
+    # Projects, images and assignments in one pass so assignments can reference fresh image ids
+    projects = BulkWriter(cursor, """INSERT INTO projects (id, salary_per_completion, security_amount, time_limit_hours, assigned_to_id, deadline,
+        is_finalized, is_approved, status, admin_feedback, completed_at, payout_amount) VALUES (?,?,?,?,?,?,?,?,?,?,?,?)""")
+    images = BulkWriter(cursor, "INSERT INTO images (id, project_id, storage_url, sequence_index) VALUES (?,?,?,?)")
+    assignments = BulkWriter(cursor, "INSERT INTO assignments (id, user_id, image_id, status, started_at, schema_id, submission_blob) VALUES (?,?,?,?,?,1,?)")
+    owners = pick_active(cfg["projects"])
+    payouts = {}
+    for n, owner in enumerate(owners):
+        project_id = f"SYN-{n:07d}"
+        if rng.random() < cfg["unassigned_fraction"]: owner = None
+        salary = rng.choice((2.0, 3.5, 5.0, 7.5))
+        finalized = owner is not None and rng.random() < cfg["finalized_fraction"]
+        approved = finalized and rng.random() < cfg["approved_fraction"]
+        rejected = finalized and not approved and rng.random() < 0.5
+        image_count = rng.randint(img_min, img_max)
+        done = image_count if finalized else (int(image_count * rng.random()) if owner else 0)
+        completed_at = past() if finalized else None
+        payout = salary * image_count if approved else 0.0
+        if approved: payouts[owner] = payouts.get(owner, 0.0) + payout
+        projects.add((project_id, salary, 50.0, 48, owner,
+                      (now + timedelta(hours=rng.randint(1, 96))).isoformat(" ") if owner and not finalized else completed_at,
+                      finalized and not rejected, approved, "COMPLETED" if approved else ("REJECTED" if rejected else "IN_PROGRESS"),
+                      "Low quality labels" if rejected else None, completed_at, payout))
+        image_ids = [new_id() for _ in range(image_count)]
+        images.extend([(image_id, project_id, f"/static/uploads/{project_id}/{seq}.jpg", seq) for seq, image_id in enumerate(image_ids, 1)])
+        if done:
+            assignments.extend([(new_id(), owner, image_id, "SUBMITTED", past(), rng.choice(submissions)) for image_id in image_ids[:done]])
+    for writer in (projects, images, assignments): writer.flush()
+
+    # Wallet ledger: payouts for approved projects plus bonuses, rewards and withdrawals by activity
+    ledger = BulkWriter(cursor, "INSERT INTO wallet_transactions (id, employee_id, amount, transaction_type, description, timestamp) VALUES (?,?,?,?,?,?)")
+    balances = {emp_id: [0.0, 0.0] for emp_id in emp_ids} # [wallet_balance, total_earned]
+    for owner, amount in payouts.items():
+        ledger.add((new_id(), owner, amount, "PROJECT_PAYOUT", "Synthetic project payout", past()))
+        balances[owner][0] += amount; balances[owner][1] += amount
+    kinds, kind_weights = ("LOGIN_BONUS", "CHALLENGE_REWARD", "WITHDRAWAL"), (20, 2, 3)
+    for emp_id in pick_active(cfg["ledger_per_employee"] * len(emp_ids)):
+        kind = rng.choices(kinds, weights=kind_weights)[0]
+        amount = {"LOGIN_BONUS": 10.0, "CHALLENGE_REWARD": 100.0, "WITHDRAWAL": -rng.choice((100.0, 250.0, 500.0))}[kind]
+        if balances[emp_id][0] + amount < 0: kind, amount = "LOGIN_BONUS", 10.0
+        ledger.add((new_id(), emp_id, amount, kind, f"Synthetic {kind.lower()}", past()))
+        balances[emp_id][0] += amount
+        if amount > 0: balances[emp_id][1] += amount
+    ledger.flush()
+    cursor.executemany("UPDATE employees SET wallet_balance = ?, total_earned = ? WHERE id = ?", [(b, t, e) for e, (b, t) in balances.items()])
+
+    withdrawals = BulkWriter(cursor, """INSERT INTO withdrawal_requests (id, employee_id, amount, tds_amount, net_amount, bank_account, status,
+        is_instant, requested_at) VALUES (?,?,?,?,?,?,?,?,?)""")
+    for emp_id in pick_active(cfg["withdrawals_per_employee"] * len(emp_ids)):
+        amount = rng.choice((500.0, 1000.0, 2500.0))
+        withdrawals.add((new_id(), emp_id, amount, amount * 0.1, amount * 0.9, f"XXXX{rng.randint(1000, 9999)}",
+                         rng.choice(("PENDING", "APPROVED", "APPROVED", "REJECTED")), rng.random() < 0.2, past()))
+    withdrawals.flush()
+
+    # Community
+    posts = BulkWriter(cursor, """INSERT INTO community_posts (id, author_id, author_name, content, likes_count, comments_count, is_approved,
+        status, created_at) VALUES (?,?,?,?,?,?,?,?,?)""")
+    likes = BulkWriter(cursor, "INSERT OR IGNORE INTO community_likes (post_id, user_id) VALUES (?,?)")
+    comments = BulkWriter(cursor, "INSERT INTO community_comments (id, post_id, user_id, user_name, content, created_at) VALUES (?,?,?,?,?,?)")
+    index_of = {emp_id: i for i, emp_id in enumerate(emp_ids)}
+    for author in pick_active(cfg["posts"]):
+        post_id = new_id()
+        status = rng.choices(("APPROVED", "PENDING", "REJECTED"), weights=(8, 1, 1))[0]
+        like_users = set(pick_active(rng.randint(0, cfg["likes_per_post"] * 2))) if status == "APPROVED" else set()
+        comment_count = rng.randint(0, cfg["comments_per_post"] * 2) if status == "APPROVED" else 0
+        created = past()
+        posts.add((post_id, author, f"user{index_of[author]:06d}", f"Synthetic post about annotation tips #{rng.randint(1, 10**6)}",
+                   len(like_users), comment_count, status == "APPROVED", status, created))
+        for user in like_users: likes.add((post_id, user))
+        for user in pick_active(comment_count):
+            comments.add((new_id(), post_id, user, f"user{index_of[user]:06d}", "Synthetic comment", created))
+    for writer in (posts, likes, comments): writer.flush()
+
+    # Support chat
+    support = BulkWriter(cursor, "INSERT INTO support_messages (id, user_id, message, timestamp, is_read, is_from_admin) VALUES (?,?,?,?,?,?)")
+    for emp_id in pick_active(cfg["support_per_employee"] * len(emp_ids)):
+        from_admin = rng.random() < 0.4
+        support.add((new_id(), emp_id, "Synthetic reply from support" if from_admin else "Synthetic question about my batch",
+                     past(), from_admin or rng.random() < 0.7, from_admin))
+    support.flush()
+
+    # Audit trail and announcements
+    audit = BulkWriter(cursor, "INSERT INTO audit_logs (user_id, username, action, details, ip_address, timestamp) VALUES (?,?,?,?,?,?)")
+    actions = ("LOGIN", "PROJECT_APPROVED", "PROJECT_REJECTED", "WITHDRAWAL_APPROVED", "KYC_VERIFIED", "USER_BANNED")
+    for emp_id in pick_active(cfg["audit_logs"]):
+        audit.add((emp_id, f"user{index_of[emp_id]:06d}", rng.choice(actions), "Synthetic audit event", f"10.0.{rng.randint(0, 255)}.{rng.randint(1, 254)}", past()))
+    audit.flush()
+    cursor.executemany("INSERT INTO announcements (title, content, is_active, created_at) VALUES (?,?,?,?)",
+                       [(f"Announcement {i}", "Synthetic announcement", i == 0, past()) for i in range(10)])
+
+    return {"employees": employees.count, "projects": projects.count, "images": images.count, "assignments": assignments.count,
+            "wallet_transactions": ledger.count, "withdrawal_requests": withdrawals.count, "community_posts": posts.count,
+            "community_likes": likes.count, "community_comments": comments.count, "support_messages": support.count, "audit_logs": audit.count}
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Create the schema and seed users; --generate also fills it with synthetic data.")
+    parser.add_argument("--db", default=DB_FILE, help="SQLite file to (re)create")
+    parser.add_argument("--generate", action="store_true", help="Wipe the DB file and fill all tables with synthetic rows")
+    for key, default in GENERATOR_DEFAULTS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", dest=key, type=type(default), default=None, help=f"Generator setting (default: {default})")
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     # Uncomment next line to wipe DB for fresh install
     # if os.path.exists(DB_FILE): os.remove(DB_FILE)
+    if args.generate and os.path.exists(args.db):
+        print(f"--- ⚠️ REMOVING {args.db} FOR SYNTHETIC DATA GENERATION ---")
+        os.remove(args.db)
 
-    conn = sqlite3.connect(DB_FILE)
+    conn = sqlite3.connect(args.db)
     cursor = conn.cursor()
     
     try:
+        if args.generate: apply_bulk_pragmas(cursor)
         create_tables(cursor)
+        if args.generate:
+            conn.commit()
+            create_orm_tables(args.db)
+            cursor.execute("PRAGMA foreign_keys = OFF;") # create_tables switched it back on
 
         # SEED DATA
         insert_seed_user(cursor, "Rohit", "admin01", "M", "ADMIN-01", is_admin=True)
         insert_seed_user(cursor, "Admin", "admin123", "M", "MASTER-ADMIN", is_admin=True)
         insert_seed_user(cursor, "Vipin", "vipin01", "M", "PPX-CM-0008851")
 
+        if args.generate:
+            started = time.perf_counter()
+            counts = generate_synthetic_data(cursor, **{k: getattr(args, k) for k in GENERATOR_DEFAULTS})
+            conn.commit()
+            print(f"✅ Generated {sum(counts.values()):,} rows in {time.perf_counter() - started:.1f}s (password for all synthetic users: synthetic-pass)")
+            for table, count in counts.items(): print(f"   {table:<22}{count:>12,}")
+            cursor.execute("ANALYZE")
+
         conn.commit()
         print("\n🚀 Database setup complete. You can now run 'uvicorn main:app --reload'")
         
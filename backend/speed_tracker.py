@@ -0,0 +1,195 @@
+import os
+import json
+import math
+import asyncio
+import contextlib
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy.orm import Session
+
+import database
+import models
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SPEED_CHECKPOINT_SECONDS = int(os.getenv("SPEED_CHECKPOINT_SECONDS", 30))
+SPEED_MIN_COHORT_SAMPLES = int(os.getenv("SPEED_MIN_COHORT_SAMPLES", 50))
+WORK_TIMER_MAX_SECONDS = int(os.getenv("WORK_TIMER_MAX_SECONDS", 1800)) # Longer gaps are idle time, not work
+
+GLOBAL_COHORT = "global"
+
+
+class LogHistogram:
+    """
+    HDR-style histogram with log-spaced buckets (~2% relative error).
+
+    Memory is bounded by the value range (a few hundred buckets for 0.1s..1h), histograms
+    merge by adding counts, and a rank lookup walks at most that many buckets.
+    """
+
+    GROWTH = 1.02
+    MIN_VALUE = 0.1
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: Dict[int, int] = counts or {}
+        self.total = sum(self.counts.values())
+
+    def _bucket(self, value: float) -> int:
+        return int(math.log(max(value, self.MIN_VALUE) / self.MIN_VALUE, self.GROWTH))
+
+    def _bucket_value(self, bucket: int) -> float:
+        return self.MIN_VALUE * (self.GROWTH ** (bucket + 0.5))
+
+    def add(self, value: float, count: int = 1):
+        b = self._bucket(value)
+        self.counts[b] = self.counts.get(b, 0) + count
+        self.total += count
+
+    def merge(self, other: "LogHistogram"):
+        for b, c in other.counts.items():
+            self.counts[b] = self.counts.get(b, 0) + c
+        self.total += other.total
+
+    def rank(self, value: float) -> float:
+        """Fraction of samples <= value (0..1)."""
+        if not self.total: return 0.0
+        target = self._bucket(value)
+        below = sum(c for b, c in self.counts.items() if b < target)
+        return (below + self.counts.get(target, 0) / 2) / self.total
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.total: return None
+        threshold = q * self.total
+        seen = 0
+        for b in sorted(self.counts):
+            seen += self.counts[b]
+            if seen >= threshold: return self._bucket_value(b)
+        return self._bucket_value(max(self.counts))
+
+    def to_json(self) -> str:
+        return json.dumps(self.counts)
+
+    @classmethod
+    def from_json(cls, data: Optional[str]) -> "LogHistogram":
+        return cls({int(k): v for k, v in json.loads(data).items()} if data else None)
+
+
+class SpeedTracker:
+    """
+    Per-cohort distributions of seconds spent per image.
+
+    Samples land in memory (merged view + unsaved delta). Checkpoints fold the delta into the
+    DB row and reload it, so every worker process converges on the same platform-wide sketch.
+    """
+
+    def __init__(self):
+        self.sketches: Dict[str, LogHistogram] = {}
+        self.pending: Dict[str, LogHistogram] = {}
+        self._lock = threading.Lock()
+        self._checkpoint_lock = threading.Lock() # One checkpoint at a time (a cancelled to_thread keeps running)
+        self._task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def cohorts_for(level: Optional[int]):
+        return (GLOBAL_COHORT, f"level:{level or 1}")
+
+    def record(self, level: Optional[int], seconds: float):
+        with self._lock:
+            for cohort in self.cohorts_for(level):
+                self.sketches.setdefault(cohort, LogHistogram()).add(seconds)
+                self.pending.setdefault(cohort, LogHistogram()).add(seconds)
+
+    def speed_percentile(self, level: Optional[int], avg_seconds: float) -> int:
+        """Share of the cohort's images that took longer than the user's average (0-100)."""
+        with self._lock:
+            sketch = self.sketches.get(f"level:{level or 1}")
+            if not sketch or sketch.total < SPEED_MIN_COHORT_SAMPLES:
+                sketch = self.sketches.get(GLOBAL_COHORT)
+            if not sketch or not sketch.total: return 0
+            return int(round((1 - sketch.rank(avg_seconds)) * 100))
+
+    def load(self):
+        db = database.SessionLocal()
+        try:
+            rows = db.query(models.QuantileSketch).all()
+            with self._lock:
+                self.sketches = {r.cohort: LogHistogram.from_json(r.data) for r in rows}
+                for cohort, delta in self.pending.items():
+                    self.sketches.setdefault(cohort, LogHistogram()).merge(delta)
+        finally:
+            db.close()
+
+    def checkpoint(self):
+        """Merges unsaved samples into the stored sketches and refreshes the in-memory view."""
+        with self._checkpoint_lock:
+            self._checkpoint()
+
+    def _checkpoint(self):
+        with self._lock:
+            pending, self.pending = self.pending, {}
+        db = database.SessionLocal()
+        try:
+            for cohort, delta in pending.items():
+                row = db.query(models.QuantileSketch).filter(models.QuantileSketch.cohort == cohort).first()
+                if not row:
+                    row = models.QuantileSketch(cohort=cohort)
+                    db.add(row)
+                merged = LogHistogram.from_json(row.data)
+                merged.merge(delta)
+                row.data = merged.to_json()
+                row.sample_count = merged.total
+                row.updated_at = datetime.now()
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the samples back so the next checkpoint retries them
+            with self._lock:
+                for cohort, delta in pending.items():
+                    self.pending.setdefault(cohort, LogHistogram()).merge(delta)
+            raise
+        finally:
+            db.close()
+        self.load()
+
+    async def start(self):
+        await asyncio.to_thread(self.load)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError): await task
+        await asyncio.to_thread(self.checkpoint)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(SPEED_CHECKPOINT_SECONDS)
+            try:
+                await asyncio.to_thread(self.checkpoint)
+            except Exception as e:
+                logger.error(f"Speed Checkpoint Error: {e}")
+
+
+def start_work_timer(db: Session, user_id: str, image_id: str):
+    """Marks when an image was served to the annotator (no commit)."""
+    timer = db.query(models.WorkTimer).filter(models.WorkTimer.user_id == user_id, models.WorkTimer.image_id == image_id).first()
+    if timer:
+        timer.served_at = datetime.now()
+    else:
+        db.add(models.WorkTimer(user_id=user_id, image_id=image_id, served_at=datetime.now(), time_spent_seconds=0.0))
+
+
+def stop_work_timer(db: Session, user_id: str, image_id: str) -> Optional[float]:
+    """Adds the time since the image was served to its total and returns it, or None if untimed/idle."""
+    timer = db.query(models.WorkTimer).filter(models.WorkTimer.user_id == user_id, models.WorkTimer.image_id == image_id).first()
+    if not timer or not timer.served_at: return None
+    elapsed = (datetime.now() - timer.served_at).total_seconds()
+    timer.served_at = None
+    if elapsed <= 0 or elapsed > WORK_TIMER_MAX_SECONDS: return None
+    timer.time_spent_seconds = (timer.time_spent_seconds or 0.0) + elapsed
+    return elapsed
@@ -0,0 +1,176 @@
+import os
+import re
+import sys
+import gzip
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from mimetypes import guess_type
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles, NotModifiedResponse
+
+try:
+    import brotli # Optional: .br variants are only built and served when installed
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+STATIC_DIR = "static"
+HASH_CACHE_ENTRIES = 8192
+HASH_CHUNK_BYTES = 1024 * 1024
+PRECOMPRESS_DIRS = ("css", "js")
+PRECOMPRESS_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".html", ".map"}
+PRECOMPRESS_MIN_BYTES = 1024
+
+# Paths (relative to static/) that are never rewritten once created: batch images live under a
+# unique BATCH-* id and uploaded avatars carry their upload timestamp in the name.
+IMMUTABLE_PATTERNS = [re.compile(r"^uploads/BATCH-[^/]+/"), re.compile(r"^uploads/avatar_")]
+# Identity documents: revalidated every time and never stored by shared caches
+PRIVATE_PATTERNS = [re.compile(r"^uploads/kyc/")]
+
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_PRIVATE = "private, no-cache"
+CACHE_REVALIDATE = "no-cache"
+
+
+class ContentHashCache:
+    """(path, mtime, size) -> content hash, so each file version is read and hashed once."""
+
+    def __init__(self, max_entries: int = HASH_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._hashes: "OrderedDict[str, Tuple[int, int, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, full_path: str, stat_result: os.stat_result) -> str:
+        with self._lock:
+            cached = self._hashes.get(full_path)
+            if cached and cached[0] == stat_result.st_mtime_ns and cached[1] == stat_result.st_size:
+                self._hashes.move_to_end(full_path)
+                return cached[2]
+        digest = hashlib.blake2b(digest_size=16)
+        with open(full_path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK_BYTES):
+                digest.update(chunk)
+        value = digest.hexdigest()
+        with self._lock:
+            self._hashes[full_path] = (stat_result.st_mtime_ns, stat_result.st_size, value)
+            self._hashes.move_to_end(full_path)
+            while len(self._hashes) > self.max_entries:
+                self._hashes.popitem(last=False)
+        return value
+
+
+content_hashes = ContentHashCache()
+
+
+def cache_control_for(rel_path: str) -> str:
+    if any(p.match(rel_path) for p in PRIVATE_PATTERNS): return CACHE_PRIVATE
+    if any(p.match(rel_path) for p in IMMUTABLE_PATTERNS): return CACHE_IMMUTABLE
+    return CACHE_REVALIDATE
+
+
+def _accepted_encodings(request_headers: Headers) -> set:
+    accepted = set()
+    for part in request_headers.get("accept-encoding", "").split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding and params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.lower())
+    return accepted
+
+
+class OptimizedStaticFiles(StaticFiles):
+    """
+    StaticFiles with content-hash ETags, per-path Cache-Control and precompressed variants.
+
+    - ETag is a hash of the bytes (not mtime/size), so a re-upload with identical content still
+      revalidates to 304 and copies on other hosts agree. Hashes are computed in the lookup
+      thread and memoised per file version.
+    - Content-addressed uploads get a one year `immutable` lifetime; everything else is
+      `no-cache` (cheap 304 revalidation).
+    - Range / If-Range requests and zero-copy `http.response.pathsend` (on servers offering
+      that extension) come from Starlette's FileResponse.
+    - `foo.css.br` / `foo.css.gz` written by `precompress_static()` are served to clients that
+      accept them.
+    """
+
+    def lookup_path(self, path: str) -> Tuple[str, Optional[os.stat_result]]:
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is not None and os.path.isfile(full_path):
+            content_hashes.get(full_path, stat_result) # Warm the hash off the event loop
+        return full_path, stat_result
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        rel_path = os.path.relpath(full_path, os.path.realpath(self.directory)).replace(os.sep, "/")
+        etag = content_hashes.get(full_path, stat_result)
+        headers = {"cache-control": cache_control_for(rel_path)}
+        serve_path, serve_stat = full_path, stat_result
+
+        if os.path.splitext(full_path)[1].lower() in PRECOMPRESS_EXTENSIONS:
+            headers["vary"] = "Accept-Encoding"
+            accepted = _accepted_encodings(request_headers)
+            for coding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                if coding not in accepted: continue
+                try:
+                    variant_stat = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                if variant_stat.st_mtime_ns >= stat_result.st_mtime_ns:
+                    serve_path, serve_stat = full_path + suffix, variant_stat
+                    headers["content-encoding"] = coding
+                    etag = f"{etag}-{coding}"
+                    break
+
+        headers["etag"] = f'"{etag}"'
+        response = FileResponse(serve_path, status_code=status_code, headers=headers, stat_result=serve_stat,
+                                media_type=guess_type(full_path)[0] or "application/octet-stream")
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+def _write_if_smaller(target: str, data: bytes, original: os.stat_result) -> bool:
+    if len(data) >= original.st_size: return False
+    tmp = target + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, target)
+    os.utime(target, ns=(original.st_mtime_ns, original.st_mtime_ns)) # Same mtime as the source marks it fresh
+    return True
+
+
+def precompress_static(directory: str = STATIC_DIR, force: bool = False) -> int:
+    """Writes .gz (and .br when brotli is installed) next to text assets that are missing or stale ones. Returns files written."""
+    written = 0
+    for sub in PRECOMPRESS_DIRS:
+        for root, _, files in os.walk(os.path.join(directory, sub)):
+            for name in files:
+                if os.path.splitext(name)[1].lower() not in PRECOMPRESS_EXTENSIONS: continue
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                if st.st_size < PRECOMPRESS_MIN_BYTES: continue
+                variants = [(".gz", lambda b: gzip.compress(b, compresslevel=9, mtime=0))]
+                if brotli is not None:
+                    variants.append((".br", lambda b: brotli.compress(b, quality=11)))
+                data = None
+                for suffix, compress in variants:
+                    target = path + suffix
+                    if not force and os.path.exists(target) and os.stat(target).st_mtime_ns >= st.st_mtime_ns: continue
+                    if data is None:
+                        with open(path, "rb") as f: data = f.read()
+                    if _write_if_smaller(target, compress(data), st):
+                        written += 1
+    if written: logger.info(f"Precompressed {written} static asset variants")
+    return written
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    count = precompress_static(force="--force" in sys.argv)
+    print(f"Wrote {count} compressed variants" + ("" if brotli else " (install brotli for .br)"))
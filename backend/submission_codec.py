@@ -0,0 +1,340 @@
+import sys
+import json
+import time
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import msgpack
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+import models
+from fast_json import dumps
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+PROJECT_SCHEMA_TTL_SECONDS = 30 # Bounds how long another process keeps validating against a replaced schema
+MIGRATE_BATCH = 5000
+REVIEW_PAGE_MAX = 1000
+REVIEW_STREAM_CHUNK = 500
+
+# The forms the annotation UIs submit: dashboard.html's prescription form (scrapeFormData) and the
+# single text box of employee_landing.html (submitWorkEntry). Projects without a schema of their own use it.
+DEFAULT_FORM_DEFINITION = {"fields": [
+    {"name": "name", "type": "string", "max_length": 200},
+    {"name": "notes", "type": "string", "max_length": 10000},
+    {"name": "medicines", "type": "records", "max_items": 100, "fields": [
+        {"name": "name", "type": "string", "max_length": 200},
+        {"name": "dose", "type": "string", "max_length": 100},
+        {"name": "freq", "type": "string", "max_length": 100},
+        {"name": "days", "type": "string", "max_length": 20},
+    ]},
+    {"name": "label", "type": "string", "max_length": 10000},
+]}
+# One payload per UI, as its JavaScript builds it; `--check-forms` validates them against the live schemas
+UI_SAMPLE_SUBMISSIONS = {
+    "dashboard.html": {"name": "Jane Doe", "notes": "Follow up in a week", "medicines": [{"name": "Paracetamol", "dose": "500mg", "freq": "1-0-1", "days": "5"}]},
+    "employee_landing.html": {"label": "Jane Doe"},
+}
+SCALAR_TYPES = {"string", "integer", "number", "boolean", "enum"}
+
+
+class SubmissionError(ValueError):
+    """Form data (or a schema definition) that does not fit the expected shape."""
+
+
+def _check_fields(fields: Any, nested: bool = False) -> List[Dict[str, Any]]:
+    if not isinstance(fields, list) or not fields:
+        raise SubmissionError("A schema needs a non-empty 'fields' list")
+    names = set()
+    for field in fields:
+        name, kind = field.get("name") if isinstance(field, dict) else None, field.get("type") if isinstance(field, dict) else None
+        if not isinstance(name, str) or not name: raise SubmissionError("Every field needs a name")
+        if name in names: raise SubmissionError(f"Duplicate field '{name}'")
+        names.add(name)
+        if kind == "records":
+            if nested: raise SubmissionError(f"'{name}': records cannot be nested")
+            _check_fields(field.get("fields"), nested=True)
+        elif kind not in SCALAR_TYPES:
+            raise SubmissionError(f"'{name}': unknown type {kind!r}")
+        if kind == "enum" and not (isinstance(field.get("choices"), list) and field["choices"]):
+            raise SubmissionError(f"'{name}': enum needs 'choices'")
+    return fields
+
+
+class FormSchema:
+    """
+    One immutable version of a project's form.
+
+    Submissions are validated against it once, on write, and stored as a msgpack array of
+    values in field order (records as arrays of arrays). Field names live only here, so rows
+    are a fraction of the JSON size and decode with one C-level unpack plus a zip.
+    """
+
+    def __init__(self, schema_id: int, definition: Dict[str, Any]):
+        self.id = schema_id
+        self.definition = definition
+        self.fields = _check_fields(definition.get("fields"))
+
+    def _value(self, field: Dict[str, Any], value: Any, path: str) -> Any:
+        if value is None or value == "" and field["type"] != "string":
+            if field.get("required"): raise SubmissionError(f"'{path}' is required")
+            return None
+        kind = field["type"]
+        if kind == "string":
+            if not isinstance(value, str): raise SubmissionError(f"'{path}' must be a string")
+            if field.get("required") and not value.strip(): raise SubmissionError(f"'{path}' is required")
+            if len(value) > field.get("max_length", 10000): raise SubmissionError(f"'{path}' is too long")
+        elif kind == "integer":
+            if isinstance(value, bool) or not isinstance(value, int): raise SubmissionError(f"'{path}' must be an integer")
+        elif kind == "number":
+            if isinstance(value, bool) or not isinstance(value, (int, float)): raise SubmissionError(f"'{path}' must be a number")
+        elif kind == "boolean":
+            if not isinstance(value, bool): raise SubmissionError(f"'{path}' must be true or false")
+        elif kind == "enum":
+            if value not in field["choices"]: raise SubmissionError(f"'{path}' must be one of {field['choices']}")
+        elif kind == "records":
+            if not isinstance(value, list): raise SubmissionError(f"'{path}' must be a list")
+            if len(value) > field.get("max_items", 1000): raise SubmissionError(f"'{path}' has too many rows")
+            return [self._row(field["fields"], item, f"{path}[{i}]") for i, item in enumerate(value)]
+        if "min" in field and value < field["min"] or "max" in field and value > field["max"]:
+            raise SubmissionError(f"'{path}' is out of range")
+        return value
+
+    def _row(self, fields: List[Dict[str, Any]], data: Any, path: str = "") -> list:
+        if not isinstance(data, dict): raise SubmissionError(f"'{path or 'form'}' must be an object")
+        unknown = set(data) - {f["name"] for f in fields}
+        if unknown: raise SubmissionError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+        return [self._value(f, data.get(f["name"]), f"{path}.{f['name']}" if path else f["name"]) for f in fields]
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        """Validates `data` and returns its compact encoding (raises SubmissionError)."""
+        return msgpack.packb(self._row(self.fields, data), use_bin_type=True)
+
+    def decode(self, blob: bytes) -> Dict[str, Any]:
+        values = msgpack.unpackb(blob, raw=False)
+        out = {}
+        for field, value in zip(self.fields, values):
+            if field["type"] == "records" and value is not None:
+                names = [f["name"] for f in field["fields"]]
+                value = [dict(zip(names, row)) for row in value]
+            out[field["name"]] = value
+        return out
+
+
+class SchemaRegistry:
+    """Schema versions by id (immutable, cached forever) and each project's current version (cached briefly)."""
+
+    def __init__(self):
+        self._by_id: Dict[int, FormSchema] = {}
+        self._current: Dict[Optional[str], Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, db: Session, schema_id: int) -> FormSchema:
+        schema = self._by_id.get(schema_id)
+        if schema is None:
+            row = db.query(models.FormSchema).filter(models.FormSchema.id == schema_id).first()
+            if row is None: raise SubmissionError(f"Unknown form schema {schema_id}")
+            schema = FormSchema(row.id, json.loads(row.definition))
+            with self._lock: self._by_id[schema_id] = schema
+        return schema
+
+    def for_project(self, db: Session, project_id: Optional[str]) -> FormSchema:
+        cached = self._current.get(project_id)
+        if cached and cached[0] > time.monotonic():
+            return self.get(db, cached[1])
+        row = None
+        if project_id is not None:
+            row = db.query(models.FormSchema.id).filter(models.FormSchema.project_id == project_id).order_by(models.FormSchema.id.desc()).first()
+        if row is None:
+            row = db.query(models.FormSchema.id).filter(models.FormSchema.project_id.is_(None)).order_by(models.FormSchema.id.desc()).first()
+        if row is None: raise SubmissionError("No form schema configured")
+        with self._lock: self._current[project_id] = (time.monotonic() + PROJECT_SCHEMA_TTL_SECONDS, row.id)
+        return self.get(db, row.id)
+
+    def forget(self, project_id: Optional[str] = None):
+        with self._lock:
+            if project_id is None: self._current.clear()
+            else: self._current.pop(project_id, None)
+
+
+registry = SchemaRegistry()
+
+
+def ensure_default_schema():
+    """
+    Stores DEFAULT_FORM_DEFINITION as the default (project-less) schema if there is none yet.
+
+    A stored default missing some of its top-level fields gets a new version with them appended,
+    so a UI whose field was added later keeps validating; earlier submissions decode with their own version.
+    """
+    import database
+    db = database.SessionLocal()
+    try:
+        row = db.query(models.FormSchema).filter(models.FormSchema.project_id.is_(None)).order_by(models.FormSchema.id.desc()).first()
+        if row is None:
+            db.add(models.FormSchema(project_id=None, definition=json.dumps(DEFAULT_FORM_DEFINITION)))
+            db.commit()
+            logger.info("Stored the default submission form schema")
+        else:
+            definition = json.loads(row.definition)
+            names = {f.get("name") for f in definition.get("fields", [])}
+            missing = [f for f in DEFAULT_FORM_DEFINITION["fields"] if f["name"] not in names]
+            if missing:
+                save_project_schema(db, None, {**definition, "fields": definition["fields"] + missing})
+                logger.info(f"Added field(s) {', '.join(f['name'] for f in missing)} to the default submission form schema")
+        for ui, error in check_ui_forms(db).items():
+            logger.warning(f"The default form schema rejects {ui} submissions: {error}")
+    finally:
+        db.close()
+
+
+def check_ui_forms(db: Session, project_id: Optional[str] = None) -> Dict[str, str]:
+    """Validates each UI's sample payload against the project's schema; returns {ui: error} for the ones rejected."""
+    schema = registry.for_project(db, project_id)
+    failures = {}
+    for ui, sample in UI_SAMPLE_SUBMISSIONS.items():
+        try:
+            schema.encode(sample)
+        except SubmissionError as e:
+            failures[ui] = str(e)
+    return failures
+
+
+def save_project_schema(db: Session, project_id: Optional[str], definition: Dict[str, Any]) -> FormSchema:
+    """Adds a new schema version for a project (None = the default). Earlier submissions keep decoding with their own version."""
+    FormSchema(0, definition) # Raises SubmissionError on a malformed definition
+    row = models.FormSchema(project_id=project_id, definition=json.dumps(definition))
+    db.add(row)
+    db.commit()
+    registry.forget(project_id)
+    if project_id is None: registry.forget()
+    return registry.get(db, row.id)
+
+
+def encode_submission(db: Session, project_id: str, form_data: Dict[str, Any]) -> Tuple[int, bytes]:
+    schema = registry.for_project(db, project_id)
+    return schema.id, schema.encode(form_data)
+
+
+def decode_submission(db: Session, schema_id: Optional[int], blob: Optional[bytes], legacy_json: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Form data of an assignment row: the encoded form, or the free-text JSON of rows written before schemas existed."""
+    if blob is not None:
+        return registry.get(db, schema_id).decode(blob)
+    if legacy_json:
+        try:
+            return json.loads(legacy_json)
+        except ValueError:
+            return {}
+    return None
+
+
+def encode_review_cursor(sequence: int, image_id: str) -> str:
+    return f"{sequence}|{image_id}"
+
+
+def decode_review_cursor(cursor: str) -> Tuple[int, str]:
+    """Raises ValueError on a malformed cursor."""
+    sequence, sep, image_id = cursor.partition("|")
+    if not sep or not image_id: raise ValueError(cursor)
+    return int(sequence), image_id
+
+
+_REVIEW_SQL = """
+    SELECT i.id, i.storage_url, i.sequence_index, a.status, a.schema_id, a.submission_blob, a.submission_data
+    FROM images i LEFT JOIN assignments a ON a.image_id = i.id AND a.user_id = :assignee
+    WHERE i.project_id = :pid {after}
+    ORDER BY i.sequence_index, i.id {limit}"""
+
+
+def load_review_rows(db: Session, project_id: str, assignee_id: Optional[str], after: Optional[Tuple[int, str]] = None,
+                     limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    A project's images in sequence order, each with the assignee's decoded submission.
+
+    One LEFT JOIN (ix_images_project_seq + ix_assignments_image_user) instead of a query per
+    image; `after` is the (sequence, image id) of the last row already returned.
+    """
+    params = {"pid": project_id, "assignee": assignee_id}
+    if after is not None: params["seq"], params["image_id"] = after
+    if limit is not None: params["n"] = limit
+    sql = _REVIEW_SQL.format(after="AND (i.sequence_index, i.id) > (:seq, :image_id)" if after is not None else "",
+                             limit="LIMIT :n" if limit is not None else "")
+    rows = db.execute(text(sql), params).fetchall()
+    return [{
+        "image_id": image_id,
+        "image_url": url,
+        "sequence": sequence,
+        "data": decode_submission(db, schema_id, blob, legacy) or {},
+        "status": status or "PENDING"
+    } for image_id, url, sequence, status, schema_id, blob, legacy in rows]
+
+
+def stream_review_rows(project_id: str, assignee_id: Optional[str]) -> Iterator[bytes]:
+    """NDJSON lines of load_review_rows, fetched REVIEW_STREAM_CHUNK rows at a time on a session of its own."""
+    import database
+    after = None
+    while True:
+        db = database.SessionLocal()
+        try:
+            rows = load_review_rows(db, project_id, assignee_id, after=after, limit=REVIEW_STREAM_CHUNK)
+        finally:
+            db.close()
+        if not rows: return
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+        if len(rows) < REVIEW_STREAM_CHUNK: return
+        after = (rows[-1]["sequence"], rows[-1]["image_id"])
+
+
+def migrate_legacy_submissions(batch: int = MIGRATE_BATCH) -> Dict[str, int]:
+    """Re-encodes JSON submissions that fit their project's schema; the rest stay as JSON (still readable)."""
+    import database
+    ensure_default_schema()
+    converted = skipped = 0
+    after = ""
+    while True:
+        db = database.SessionLocal()
+        try:
+            rows = db.execute(text("""
+                SELECT a.id, a.submission_data, i.project_id FROM assignments a JOIN images i ON i.id = a.image_id
+                WHERE a.submission_blob IS NULL AND a.submission_data IS NOT NULL AND a.id > :after
+                ORDER BY a.id LIMIT :n"""), {"after": after, "n": batch}).fetchall()
+            if not rows: break
+            updates = []
+            for assignment_id, data, project_id in rows:
+                try:
+                    schema_id, blob = encode_submission(db, project_id, json.loads(data))
+                except ValueError: # SubmissionError or unparsable JSON
+                    skipped += 1
+                    continue
+                updates.append({"id": assignment_id, "schema_id": schema_id, "blob": blob})
+            if updates:
+                db.execute(text("UPDATE assignments SET schema_id = :schema_id, submission_blob = :blob, submission_data = NULL WHERE id = :id"), updates)
+                db.commit()
+            converted += len(updates)
+            after = rows[-1][0]
+        finally:
+            db.close()
+    logger.info(f"Migrated {converted} submissions ({skipped} left as JSON)")
+    return {"converted": converted, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    if "--migrate" in sys.argv:
+        print(migrate_legacy_submissions())
+    elif "--check-forms" in sys.argv:
+        import database
+        ensure_default_schema()
+        db = database.SessionLocal()
+        try:
+            project_ids = [None] + [r[0] for r in db.execute(text("SELECT DISTINCT project_id FROM form_schemas WHERE project_id IS NOT NULL"))]
+            failures = {project_id or "(default)": f for project_id in project_ids if (f := check_ui_forms(db, project_id))}
+        finally:
+            db.close()
+        print(json.dumps(failures or "All submission UIs pass validation", indent=2))
+        sys.exit(1 if failures else 0)
+    else:
+        print("Usage: python submission_codec.py --migrate | --check-forms")
@@ -0,0 +1,96 @@
+import os
+import sys
+import tempfile
+
+# The app reads its configuration at import time: point it at scratch files and keep background loops off
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRATCH_DIR = tempfile.mkdtemp(prefix="meddata-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(SCRATCH_DIR, 'import.db')}")
+os.environ.setdefault("LOG_FILE", os.path.join(SCRATCH_DIR, "backend.log"))
+os.environ.setdefault("JOB_WORKERS", "0")
+os.environ.setdefault("ALLOCATOR_INTERVAL_SECONDS", "0")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "1")
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(BACKEND_DIR) # main.py serves templates/ and static/ relative to the working directory
+
+import uuid
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import database
+import models
+import submission_codec
+from main import hash_password
+
+PASSWORD = "pass1234"
+PASSWORD_HASH = hash_password(PASSWORD) # bcrypt is slow on purpose; hash once for every test user
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """A fresh SQLite file per test, swapped in for database.engine / database.SessionLocal."""
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=test_engine)
+    monkeypatch.setattr(database, "engine", test_engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=test_engine))
+    # Schema ids are per database: drop whatever the registry cached from the previous test's file
+    submission_codec.registry._by_id.clear()
+    submission_codec.registry.forget()
+    yield test_engine
+    test_engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = database.SessionLocal()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def client(engine, monkeypatch):
+    """TestClient running the app's startup/shutdown against the per-test database."""
+    from fastapi.testclient import TestClient
+    import main
+    # Each TestClient runs its own event loop; the app's queues and events bind to the loop that first uses them
+    monkeypatch.setattr(main, "chat_queue", main.ChatWriteQueue())
+    monkeypatch.setattr(main, "audit_writer", main.AuditLogWriter())
+    monkeypatch.setattr(main, "deadline_scheduler", main.DeadlineScheduler())
+    monkeypatch.setattr(main, "work_allocator", main.WorkAllocator(on_assigned=main.on_unit_assigned))
+    monkeypatch.setattr(main, "speed_tracker", main.SpeedTracker())
+    main.response_cache.clear()
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def make_employee(db, username=None, role="EMPLOYEE", **fields) -> models.Employee:
+    username = username or f"user-{uuid.uuid4().hex[:8]}"
+    employee = models.Employee(
+        id=str(uuid.uuid4()), username=username, employee_code=username.upper(), full_name=fields.pop("full_name", username.title()),
+        password_hash=PASSWORD_HASH, role=role, status="ACTIVE", wallet_balance=0.0, total_earned=0.0,
+        last_login=fields.pop("last_login", datetime.now()), **fields
+    )
+    db.add(employee)
+    db.commit()
+    return employee
+
+
+def make_project(db, assignee=None, images=3, project_id=None, **fields) -> models.Project:
+    project = models.Project(
+        id=project_id or f"BATCH-{uuid.uuid4().hex[:6]}", assigned_to_id=assignee.id if assignee else None,
+        salary_per_completion=fields.pop("salary_per_completion", 2.0), security_amount=fields.pop("security_amount", 5.0),
+        **fields
+    )
+    db.add(project)
+    for i in range(images):
+        db.add(models.Image(id=str(uuid.uuid4()), project_id=project.id, storage_url=f"/static/uploads/{project.id}/{i + 1}.jpg", sequence_index=i + 1))
+    db.commit()
+    return project
+
+
+def auth_headers(client, username):
+    token = client.post("/auth/login", json={"username": username, "password": PASSWORD}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
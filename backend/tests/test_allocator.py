@@ -0,0 +1,158 @@
+import uuid
+from datetime import date, datetime, timedelta
+
+import models
+import allocator
+from allocator import work_unit_position, blended_images_per_hour, assign_units, rebalance_units, run_allocation_cycle, WorkAllocator
+from deadline_scheduler import acquire_lease
+from conftest import make_employee, make_project, auth_headers
+
+
+def unit_images(db, project_id):
+    return db.query(models.Image).filter(models.Image.project_id == project_id).order_by(models.Image.sequence_index).all()
+
+
+def label(db, user, images):
+    for image in images: db.add(models.Assignment(id=str(uuid.uuid4()), user_id=user.id, image_id=image.id))
+    db.commit()
+
+
+def timed_stats(db, user, timed, seconds):
+    db.add(models.EmployeeDailyStat(employee_id=user.id, day=date.today(), timed_images=timed, time_spent_seconds=seconds))
+    db.commit()
+
+
+def expired_unit(db, assignee, images=20):
+    """An auto-assigned unit the deadline scheduler already locked at its deadline."""
+    now = datetime.now()
+    return make_project(db, assignee, images=images, auto_assign=True, is_finalized=True, assigned_at=now - timedelta(hours=48),
+                        deadline=now - timedelta(minutes=1), status="IN_PROGRESS")
+
+
+def test_work_unit_position_splits_uploads_into_numbered_units():
+    assert work_unit_position("B", 4, 5, 100) == ("B", 5)
+    assert work_unit_position("B", 4, 5, 0) == ("B", 5)
+    assert [work_unit_position("B", i, 250, 100) for i in (0, 99, 100, 249)] == [("B-U01", 1), ("B-U01", 100), ("B-U02", 1), ("B-U03", 50)]
+
+
+def test_short_timing_samples_blend_toward_the_default_rate():
+    assert blended_images_per_hour(0, 0) == allocator.DEFAULT_IMAGES_PER_HOUR
+    assert blended_images_per_hour(50, 1800) == 100.0
+    # Ten images in a minute measure 600/hour but only carry a fifth of the weight
+    assert blended_images_per_hour(10, 60) == 0.2 * 600 + 0.8 * 60
+    # Timer noise (milliseconds an image) is capped instead of dominating the ranking
+    assert blended_images_per_hour(1000, 1) == allocator.ALLOCATOR_MAX_IMAGES_PER_HOUR
+
+
+def test_units_go_to_the_best_ranked_annotator_and_spread_with_load(db):
+    fast, steady = make_employee(db), make_employee(db)
+    make_employee(db, role="ADMIN")
+    make_employee(db, last_login=datetime.now() - timedelta(days=30)) # Inactive: never picked
+    timed_stats(db, fast, 50, 1800)
+    units = [make_project(db, images=100, project_id=f"B-U0{n}", auto_assign=True, time_limit_hours=24) for n in (1, 2, 3, 4, 5)]
+
+    now = datetime.now()
+    assigned = assign_units(db, now)
+    db.commit()
+    # fast scores 0.8 x 100 and steady 0.8 x 60; a 100-image unit halves a score, so the second goes to steady
+    assert [(a["project_id"], a["employee_id"]) for a in assigned] == [
+        ("B-U01", fast.id), ("B-U02", steady.id), ("B-U03", fast.id), ("B-U04", steady.id)]
+    db.expire_all()
+    first = db.get(models.Project, units[0].id)
+    assert (first.assigned_at, first.deadline, first.is_finalized) == (now, now + timedelta(hours=24), False)
+    assert db.get(models.Project, units[4].id).assigned_to_id is None # Everyone is at ALLOCATOR_MAX_OPEN_UNITS
+
+
+def test_a_split_unit_does_not_go_back_to_the_annotator_who_fell_behind(db):
+    fast, steady = make_employee(db), make_employee(db)
+    timed_stats(db, fast, 50, 1800)
+    source = make_project(db, fast, images=0, project_id="B-U01", auto_assign=True, is_finalized=True)
+    make_project(db, images=20, project_id="B-U01-S1A2B", auto_assign=True, split_from_id=source.id)
+
+    assert [a["employee_id"] for a in assign_units(db, datetime.now())] == [steady.id]
+
+
+def test_missed_deadline_moves_only_images_nobody_labelled(db):
+    worker, co = make_employee(db), make_employee(db)
+    unit = expired_unit(db, worker)
+    db.add(models.ProjectAnnotator(project_id=unit.id, user_id=co.id))
+    images = unit_images(db, unit.id)
+    label(db, worker, images[:2])
+    label(db, co, images[2:5] + images[-1:]) # Co-annotator labels stay with the unit they are paid and scored on
+
+    splits = rebalance_units(db, datetime.now())
+    db.commit()
+    assert [(s["from"], s["images"], s["missed_deadline"]) for s in splits] == [(unit.id, 14, True)]
+    moved = unit_images(db, splits[0]["unit"])
+    assert [i.id for i in moved] == [i.id for i in images[5:-1]]
+    assert [i.sequence_index for i in moved] == list(range(1, 15))
+    assert {i.id for i in unit_images(db, unit.id)} == {i.id for i in images[:5] + images[-1:]}
+    split = db.get(models.Project, splits[0]["unit"])
+    assert (split.split_from_id, split.assigned_to_id, split.security_amount, split.auto_assign) == (unit.id, None, 0.0, True)
+
+
+def test_split_is_skipped_when_co_annotators_labelled_the_tail(db):
+    worker, co = make_employee(db), make_employee(db)
+    unit = expired_unit(db, worker)
+    label(db, co, unit_images(db, unit.id)[:15])
+
+    assert rebalance_units(db, datetime.now()) == []
+    assert len(unit_images(db, unit.id)) == 20
+
+
+def test_slow_pace_splits_off_what_it_cannot_finish(db):
+    worker = make_employee(db)
+    now = datetime.now()
+    unit = make_project(db, worker, images=100, auto_assign=True, assigned_at=now - timedelta(hours=10), deadline=now + timedelta(hours=10))
+    label(db, worker, unit_images(db, unit.id)[:5])
+    # Five images in ten hours covers five more before the deadline; the other 90 move
+    assert [s["images"] for s in rebalance_units(db, now)] == [90]
+
+    on_track = make_project(db, worker, images=100, auto_assign=True, assigned_at=now - timedelta(hours=1), deadline=now + timedelta(hours=19))
+    assert rebalance_units(db, now) == [] # Too early in its window to judge
+    assert len(unit_images(db, on_track.id)) == 100
+
+
+def test_stale_submit_to_a_moved_image_is_rejected(db, client):
+    worker, other = make_employee(db), make_employee(db)
+    unit = expired_unit(db, worker)
+    db.query(models.Project).filter(models.Project.id == unit.id).update({"is_finalized": False}) # The form was still open
+    db.commit()
+    image = unit_images(db, unit.id)[-1]
+    split = make_project(db, other, images=0, auto_assign=True, split_from_id=unit.id)
+    image.project_id = split.id
+    db.commit()
+
+    stale = client.post("/work/submit", json={"employee_id": worker.id, "image_id": image.id, "form_data": {"label": "late"}}, headers=auth_headers(client, worker.username))
+    assert (stale.status_code, stale.json()["detail"]) == (409, "Image was moved to another work unit")
+    fresh = client.post("/work/submit", json={"employee_id": other.id, "image_id": image.id, "form_data": {"label": "new"}}, headers=auth_headers(client, other.username))
+    assert fresh.status_code == 200
+    assert db.query(models.Assignment).filter(models.Assignment.image_id == image.id).count() == 1
+
+
+def test_cycle_rebalances_then_assigns_and_respects_the_lease(db):
+    worker, other = make_employee(db), make_employee(db)
+    unit = expired_unit(db, worker)
+    label(db, worker, unit_images(db, unit.id)[:2])
+
+    assert acquire_lease(WorkAllocator.LEASE_NAME, "another-process", 60)
+    assert run_allocation_cycle("this-process") is None
+    db.query(models.SchedulerLease).delete()
+    db.commit()
+
+    result = run_allocation_cycle("this-process")
+    assert [s["images"] for s in result["split"]] == [18]
+    assert [(a["project_id"], a["employee_id"]) for a in result["assigned"]] == [(result["split"][0]["unit"], other.id)]
+    assert db.query(models.SchedulerLease).count() == 0
+
+
+def test_allocator_endpoints(db, client):
+    admin, worker = make_employee(db, role="ADMIN"), make_employee(db)
+    make_project(db, images=10, auto_assign=True)
+    headers = auth_headers(client, admin.username)
+
+    queue = client.get("/api/admin/allocator/queue", headers=headers).json()
+    assert ([a["employee_id"] for a in queue["annotators"]], queue["unassigned_units"]) == ([worker.id], 1)
+    assert client.post("/api/admin/allocator/run", headers=auth_headers(client, worker.username)).status_code == 403
+    assert client.post("/api/admin/allocator/run", headers=headers).status_code == 200
+    assert client.get("/api/admin/allocator/queue", headers=headers).json()["unassigned_units"] == 0
@@ -0,0 +1,75 @@
+import time
+import uuid
+from datetime import date, timedelta
+
+import pytest
+
+import models
+from analytics import record_daily_stat, rebuild_daily_stats, build_series
+from conftest import make_employee, make_project, auth_headers
+
+
+@pytest.fixture
+def india_time(monkeypatch):
+    """Local clock at UTC+05:30, so a late-evening UTC event falls on the next local day."""
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_record_daily_stat_upserts_increments(db):
+    user = make_employee(db)
+    record_daily_stat(db, user.id, earnings=10.0, images_completed=1)
+    record_daily_stat(db, user.id, earnings=2.5, approvals=1)
+    db.commit()
+    row = db.query(models.EmployeeDailyStat).filter(models.EmployeeDailyStat.employee_id == user.id).one()
+    assert (row.day, row.earnings, row.images_completed, row.approvals, row.rejections) == (date.today(), 12.5, 1, 1, 0)
+
+
+def test_build_series_is_zero_filled_oldest_first(db):
+    user = make_employee(db)
+    today = date(2026, 3, 10)
+    record_daily_stat(db, user.id, day=today - timedelta(days=2), earnings=4.0, time_spent_seconds=30.0, timed_images=3)
+    db.commit()
+    series = build_series(db, user.id, 7, today=today)
+    assert [d["date"] for d in series] == [(today - timedelta(days=6 - i)).isoformat() for i in range(7)]
+    assert [d["earnings"] for d in series] == [0.0, 0.0, 0.0, 0.0, 4.0, 0.0, 0.0]
+    assert series[4]["avg_seconds_per_image"] == 10.0
+
+
+def test_backfill_buckets_utc_timestamps_on_the_local_day(db, india_time):
+    user = make_employee(db)
+    project = make_project(db, user, images=1)
+    image = db.query(models.Image).filter(models.Image.project_id == project.id).one()
+    late_evening_utc = "2026-01-01 20:00:00" # 01:30 on 2 January in India
+    with db.bind.begin() as conn:
+        conn.exec_driver_sql("INSERT INTO wallet_transactions (id, employee_id, amount, transaction_type, timestamp) VALUES (?, ?, 50, 'PROJECT_PAYOUT', ?)",
+                             (str(uuid.uuid4()), user.id, late_evening_utc))
+        conn.exec_driver_sql("INSERT INTO assignments (id, user_id, image_id, started_at) VALUES (?, ?, ?, ?)", (str(uuid.uuid4()), user.id, image.id, late_evening_utc))
+    rebuild_daily_stats()
+    rows = {r.day: r for r in db.query(models.EmployeeDailyStat).filter(models.EmployeeDailyStat.employee_id == user.id)}
+    assert list(rows) == [date(2026, 1, 2)]
+    assert (rows[date(2026, 1, 2)].earnings, rows[date(2026, 1, 2)].images_completed) == (50.0, 1)
+
+
+def test_backfill_only_runs_on_an_empty_rollup(db):
+    user = make_employee(db)
+    record_daily_stat(db, user.id, earnings=1.0)
+    db.add(models.WalletTransaction(id=str(uuid.uuid4()), employee_id=user.id, amount=99.0, transaction_type="PROJECT_PAYOUT"))
+    db.commit()
+    rebuild_daily_stats()
+    assert db.query(models.EmployeeDailyStat.earnings).scalar() == 1.0
+
+
+def test_personal_analytics_reads_the_rollup(db, client):
+    user = make_employee(db)
+    record_daily_stat(db, user.id, earnings=20.0, approvals=3, rejections=1)
+    record_daily_stat(db, user.id, day=date.today() - timedelta(days=40), earnings=500.0) # Outside the 30 day window
+    db.commit()
+    body = client.get("/api/analytics/personal", params={"days": 7}, headers=auth_headers(client, user.username)).json()
+    assert body["total_earnings_30d"] == 20.0
+    assert body["avg_quality_30d"] == 75.0
+    assert len(body["daily_earnings"]) == 7 and body["daily_earnings"][-1]["amount"] == 20.0
+    assert client.get("/api/analytics/personal", params={"days": 5}, headers=auth_headers(client, user.username)).status_code == 400
@@ -0,0 +1,140 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy import text
+
+import audit_log
+import models
+from audit_log import AuditLogWriter, append_entries, seal_legacy_entries, verify_chain
+
+
+def _entry(action, details="", user_id="u1"):
+    return {"action": action, "details": details, "user_id": user_id, "username": "alice", "ip_address": "10.0.0.1", "timestamp": datetime.now()}
+
+
+def _actions(db):
+    return [a for (a,) in db.query(models.AuditLog.action).order_by(models.AuditLog.id)]
+
+
+def test_appended_entries_form_a_valid_chain(db):
+    assert append_entries([_entry("A"), _entry("B")]) == 2
+    assert append_entries([_entry("C")]) == 3
+    rows = db.query(models.AuditLog).order_by(models.AuditLog.id).all()
+    assert rows[0].prev_hash == audit_log.GENESIS_HASH
+    assert [r.prev_hash for r in rows[1:]] == [r.block_hash for r in rows[:-1]]
+    result = verify_chain()
+    assert result["valid"] and result["entries_checked"] == 3 and result["last_id"] == 3
+
+
+def test_verify_detects_a_modified_entry(engine):
+    append_entries([_entry(a) for a in "ABC"])
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE audit_logs SET details = 'edited' WHERE id = 2"))
+    result = verify_chain()
+    assert (result["valid"], result["first_bad_id"]) == (False, 2)
+    assert result["reason"].startswith("block_hash mismatch")
+
+
+def test_verify_detects_a_removed_entry(engine):
+    append_entries([_entry(a) for a in "ABC"])
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM audit_logs WHERE id = 2"))
+    result = verify_chain()
+    assert (result["valid"], result["first_bad_id"]) == (False, 3)
+    assert result["reason"].startswith("prev_hash does not link")
+
+
+def test_verify_resumes_from_its_checkpoint(engine):
+    append_entries([_entry(a) for a in "ABC"])
+    assert verify_chain()["entries_checked"] == 3
+    append_entries([_entry("D")])
+    result = verify_chain()
+    assert (result["valid"], result["from_checkpoint"], result["entries_checked"]) == (True, 3, 1)
+
+    # Rewriting the checkpointed entry is still caught, even though it is behind the checkpoint
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE audit_logs SET action = 'X' WHERE id = 4"))
+    result = verify_chain()
+    assert (result["valid"], result["first_bad_id"], result["reason"]) == (False, 4, "checkpointed entry missing or modified")
+    assert verify_chain(full=True)["first_bad_id"] == 4
+
+
+def test_legacy_rows_are_sealed_once(engine):
+    with engine.begin() as conn:
+        for action in "AB":
+            conn.execute(text("INSERT INTO audit_logs (action, details, timestamp) VALUES (:a, 'old', '2026-01-01 10:00:00')"), {"a": action})
+    seal_legacy_entries()
+    append_entries([_entry("C")])
+    assert verify_chain(full=True)["entries_checked"] == 3
+
+    # Once the chain exists, an unhashed row is tampering, not something to seal
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO audit_logs (action, details, timestamp) VALUES ('Z', 'forged', '2026-01-01 10:00:00')"))
+    seal_legacy_entries()
+    result = verify_chain(full=True)
+    assert (result["valid"], result["first_bad_id"]) == (False, 4)
+
+
+def test_writer_group_commits_in_order(db):
+    async def run():
+        writer = AuditLogWriter(flush_interval_ms=50)
+        await writer.start()
+        for a in "ABCD": writer.record(a, "burst")
+        await asyncio.sleep(0.2)
+        await writer.stop()
+
+    asyncio.run(run())
+    assert _actions(db) == list("ABCD")
+    assert verify_chain()["valid"]
+
+
+def test_stop_keeps_the_entry_dequeued_before_cancellation(db):
+    async def run():
+        writer = AuditLogWriter(flush_interval_ms=10_000) # Still collecting the burst when stopped
+        await writer.start()
+        writer.record("first", "")
+        await asyncio.sleep(0.05)
+        writer.record("second", "")
+        await writer.stop()
+
+    asyncio.run(run())
+    assert _actions(db) == ["first", "second"]
+
+
+def test_failed_batch_is_retried_ahead_of_newer_entries(db, monkeypatch):
+    failures = []
+
+    def flaky(batch):
+        if not failures:
+            failures.append(len(batch))
+            raise RuntimeError("database is locked")
+        return append_entries(batch)
+
+    monkeypatch.setattr(audit_log, "append_entries", flaky)
+    monkeypatch.setattr("audit_log.asyncio.sleep", _fast_sleep)
+
+    async def run():
+        writer = AuditLogWriter(flush_interval_ms=1)
+        await writer.start()
+        for a in "ABC": writer.record(a, "")
+        await _real_sleep(0.005) # The first flush fails while D is recorded
+        writer.record("D", "")
+        await _real_sleep(0.1)
+        await writer.stop()
+
+    asyncio.run(run())
+    assert failures
+    assert _actions(db) == list("ABCD")
+    assert verify_chain()["valid"]
+
+
+def test_record_without_a_writer_appends_immediately(db):
+    AuditLogWriter().record("CLI", "no loop running")
+    assert _actions(db) == ["CLI"]
+
+
+_real_sleep = asyncio.sleep
+
+
+async def _fast_sleep(seconds):
+    await _real_sleep(min(seconds, 0.01))
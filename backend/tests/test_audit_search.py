@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from audit_log import append_entries, ensure_audit_search_index, search_entries
+from conftest import auth_headers, make_employee
+
+BASE = datetime(2026, 3, 1, 10, 0, 0) # No microseconds: the cursor must still round-trip exactly
+
+
+@pytest.fixture
+def entries(engine):
+    ensure_audit_search_index()
+    rows = []
+    for i in range(7):
+        rows.append({"action": "LOGIN" if i % 2 else "PROJECT_APPROVED", "details": f"entry {i} payout batch-{i}",
+                     "user_id": f"u{i % 3}", "username": f"user{i % 3}", "ip_address": None,
+                     "timestamp": BASE + timedelta(minutes=i // 3)}) # Groups of three share a timestamp
+    rows[5]["details"] = "Withdrawal approved for Ramesh"
+    append_entries(rows)
+
+
+def _ids(page):
+    return [item["id"] for item in page["items"]]
+
+
+def test_pages_walk_timestamp_ties_newest_first(db, entries):
+    seen, cursor = [], None
+    while True:
+        page = search_entries(db, limit=2, cursor=cursor)
+        seen += _ids(page)
+        cursor = page["next_cursor"]
+        if not cursor: break
+    assert seen == [7, 6, 5, 4, 3, 2, 1]
+
+
+def test_filters_combine(db, entries):
+    assert _ids(search_entries(db, action="LOGIN")) == [6, 4, 2]
+    assert _ids(search_entries(db, user_id="u1", action="LOGIN")) == [2]
+    assert _ids(search_entries(db, username="user0")) == [7, 4, 1]
+    assert _ids(search_entries(db, start=BASE + timedelta(minutes=1), end=BASE + timedelta(minutes=2))) == [6, 5, 4]
+
+
+def test_full_text_query(db, entries):
+    assert _ids(search_entries(db, q="ramesh")) == [6]
+    assert _ids(search_entries(db, q="withdrawal appr")) == [6] # Last word matches as a prefix
+    assert _ids(search_entries(db, q="payout", action="LOGIN")) == [4, 2]
+    assert search_entries(db, q="?!") == {"items": [], "next_cursor": None}
+
+
+def test_index_follows_later_appends(db, entries):
+    append_entries([{"action": "KYC_VERIFIED", "details": "KYC verified for Sunita", "timestamp": BASE + timedelta(hours=1)}])
+    assert _ids(search_entries(db, q="sunita")) == [8]
+
+
+def test_search_endpoint(client, db, entries):
+    make_employee(db, "Rohit", role="ADMIN")
+    employee = make_employee(db)
+    headers = auth_headers(client, "Rohit")
+    page = client.get("/api/admin/audit/search", params={"action": "LOGIN", "limit": 2}, headers=headers).json()
+    assert _ids(page) == [6, 4]
+    rest = client.get("/api/admin/audit/search", params={"action": "LOGIN", "cursor": page["next_cursor"]}, headers=headers).json()
+    assert _ids(rest) == [2] and rest["next_cursor"] is None
+    assert client.get("/api/admin/audit/search", params={"cursor": "garbage"}, headers=headers).status_code == 400
+    assert client.get("/api/admin/audit/search", headers=auth_headers(client, employee.username)).status_code == 403
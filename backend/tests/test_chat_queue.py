@@ -0,0 +1,118 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import models
+from chat_queue import ChatWriteQueue, rebuild_support_threads
+from conftest import make_employee, auth_headers
+
+
+def stored_messages(db, user_id):
+    return [m.message for m in db.query(models.SupportMessage).filter(models.SupportMessage.user_id == user_id).order_by(models.SupportMessage.timestamp)]
+
+
+def test_burst_is_persisted_with_its_thread_summary(db):
+    user = make_employee(db)
+
+    async def run():
+        queue = ChatWriteQueue(flush_interval_ms=20)
+        await queue.start()
+        for i in range(5): queue.enqueue(user.id, f"m{i}")
+        queue.enqueue(user.id, "reply", is_from_admin=True)
+        await asyncio.sleep(0.3)
+        await queue.stop()
+
+    asyncio.run(run())
+    assert stored_messages(db, user.id) == ["m0", "m1", "m2", "m3", "m4", "reply"]
+    thread = db.query(models.SupportThread).filter(models.SupportThread.user_id == user.id).one()
+    assert (thread.last_message, thread.unread_count) == ("reply", 5)
+
+
+def test_failed_flush_is_retried_in_order(db, monkeypatch):
+    user = make_employee(db)
+    queue = ChatWriteQueue(flush_interval_ms=1)
+    persist = queue._persist
+    failures = []
+
+    def flaky(batch):
+        if not failures:
+            failures.append(len(batch))
+            raise RuntimeError("database is locked")
+        persist(batch)
+
+    monkeypatch.setattr(queue, "_persist", flaky)
+    monkeypatch.setattr("chat_queue.asyncio.sleep", _fast_sleep)
+
+    async def run():
+        await queue.start()
+        for i in range(3): queue.enqueue(user.id, f"m{i}")
+        await asyncio.sleep(0.05)
+        queue.enqueue(user.id, "m3")
+        await queue.stop()
+
+    asyncio.run(run())
+    assert failures
+    assert stored_messages(db, user.id) == ["m0", "m1", "m2", "m3"]
+
+
+def test_stop_keeps_the_message_dequeued_before_cancellation(db):
+    user = make_employee(db)
+
+    async def run():
+        queue = ChatWriteQueue(flush_interval_ms=10_000) # The writer is still waiting for the burst when stopped
+        await queue.start()
+        queue.enqueue(user.id, "first")
+        await asyncio.sleep(0.05)
+        queue.enqueue(user.id, "second")
+        await queue.stop()
+
+    asyncio.run(run())
+    assert stored_messages(db, user.id) == ["first", "second"]
+
+
+def test_rebuild_repairs_missing_and_stale_summaries(db):
+    user = make_employee(db)
+
+    async def run():
+        queue = ChatWriteQueue()
+        queue.enqueue(user.id, "hello")
+        await queue.stop()
+
+    asyncio.run(run())
+    db.query(models.SupportThread).delete()
+    db.commit()
+    assert rebuild_support_threads() == 1
+    assert db.query(models.SupportThread.last_message).filter(models.SupportThread.user_id == user.id).scalar() == "hello"
+
+    # A message written without its summary update (another process, failed upsert) leaves it stale
+    db.add(models.SupportMessage(id="late", user_id=user.id, message="later", timestamp=datetime.now() + timedelta(seconds=1), is_read=False, is_from_admin=False))
+    db.commit()
+    assert rebuild_support_threads() == 1
+    db.expire_all()
+    thread = db.query(models.SupportThread).filter(models.SupportThread.user_id == user.id).one()
+    assert (thread.last_message, thread.unread_count) == ("later", 2)
+    assert rebuild_support_threads() == 0
+
+
+def test_inbox_lists_threads_newest_first_and_reading_clears_unread(db, client):
+    admin = make_employee(db, role="ADMIN")
+    quiet, busy = make_employee(db), make_employee(db)
+    writer = ChatWriteQueue()
+    start = datetime.now()
+    rows = [(quiet, "old question", 0), (busy, "first", 1), (busy, "second", 2)]
+    writer._persist([{"id": f"m{i}", "user_id": user.id, "message": text, "timestamp": start + timedelta(seconds=offset),
+                      "is_read": False, "is_from_admin": False} for i, (user, text, offset) in enumerate(rows)])
+    headers = auth_headers(client, admin.username)
+
+    inbox = client.get("/api/admin/support/users", headers=headers).json()
+    assert [(t["user_id"], t["last_message"], t["unread_count"]) for t in inbox] == [(busy.id, "second", 2), (quiet.id, "old question", 1)]
+
+    client.get(f"/api/admin/support/messages/{busy.id}", headers=headers)
+    inbox = client.get("/api/admin/support/users", headers=headers).json()
+    assert [t["unread_count"] for t in inbox] == [0, 1]
+
+
+_real_sleep = asyncio.sleep
+
+
+async def _fast_sleep(seconds):
+    await _real_sleep(min(seconds, 0.01))
@@ -0,0 +1,106 @@
+import threading
+import uuid
+from datetime import datetime
+
+import pytest
+
+import community_feed
+import database
+import models
+from community_feed import add_comment, comment_cache, delete_comment, load_comments
+from conftest import auth_headers, make_employee
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    comment_cache.invalidate()
+    community_feed.feed_cache.invalidate()
+
+
+def make_post(db, author, status="APPROVED"):
+    post = models.CommunityPost(id=str(uuid.uuid4()), author_id=author.id, author_name=author.username, content="hi",
+                                status=status, likes_count=0, comments_count=0, created_at=datetime.utcnow())
+    db.add(post)
+    db.commit()
+    return post
+
+
+def comments_count(db, post):
+    db.expire_all()
+    return db.get(models.CommunityPost, post.id).comments_count
+
+
+def test_concurrent_comments_keep_an_exact_count(db, engine):
+    author = make_employee(db)
+    post = make_post(db, author)
+
+    def writer(n):
+        session = database.SessionLocal()
+        try:
+            for i in range(10): add_comment(session, post.id, author.id, author.username, f"c{n}-{i}")
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    assert comments_count(db, post) == 40 == db.query(models.CommunityComment).count()
+
+
+def test_delete_never_takes_the_count_below_zero(db):
+    author = make_employee(db)
+    post = make_post(db, author)
+    comment = add_comment(db, post.id, author.id, author.username, "only")
+    db.query(models.CommunityPost).update({"comments_count": 0}) # Drifted counter
+    db.commit()
+    delete_comment(db, comment)
+    assert comments_count(db, post) == 0
+
+
+def test_pages_are_oldest_first(db):
+    author = make_employee(db)
+    post = make_post(db, author)
+    for i in range(5): add_comment(db, post.id, author.id, author.username, f"c{i}")
+    seen, cursor = [], None
+    while True:
+        page = load_comments(db, post.id, cursor=cursor, limit=2)
+        seen += [c["content"] for c in page["items"]]
+        cursor = page["next_cursor"]
+        if not cursor: break
+    assert seen == [f"c{i}" for i in range(5)]
+
+
+def test_first_page_is_cached_until_a_write(db):
+    author = make_employee(db)
+    post = make_post(db, author)
+    add_comment(db, post.id, author.id, author.username, "one")
+    assert [c["content"] for c in load_comments(db, post.id)["items"]] == ["one"]
+    hits = comment_cache.hits
+    load_comments(db, post.id)
+    assert comment_cache.hits == hits + 1
+
+    comment = add_comment(db, post.id, author.id, author.username, "two")
+    assert [c["content"] for c in load_comments(db, post.id)["items"]] == ["one", "two"]
+    delete_comment(db, comment)
+    assert [c["content"] for c in load_comments(db, post.id)["items"]] == ["one"]
+
+
+def test_comment_endpoints_enforce_visibility_and_ownership(client, db):
+    author, other = make_employee(db), make_employee(db)
+    make_employee(db, "Rohit", role="ADMIN")
+    pending = make_post(db, author, status="PENDING")
+    post = make_post(db, author)
+    author_headers, other_headers, admin_headers = (auth_headers(client, u) for u in (author.username, other.username, "Rohit"))
+
+    assert client.get(f"/api/community/posts/{pending.id}/comments", headers=other_headers).status_code == 404
+    assert client.post(f"/api/community/posts/{pending.id}/comments", json={"content": "x"}, headers=author_headers).status_code == 400
+    assert client.post(f"/api/community/posts/{post.id}/comments", json={"content": "   "}, headers=other_headers).status_code == 400
+
+    created = client.post(f"/api/community/posts/{post.id}/comments", json={"content": "nice"}, headers=other_headers).json()
+    listed = client.get(f"/api/community/posts/{post.id}/comments", headers=author_headers).json()
+    assert [c["content"] for c in listed["items"]] == ["nice"] and listed["next_cursor"] is None
+    assert client.get(f"/api/community/posts/{post.id}/comments", params={"cursor": "bad"}, headers=author_headers).status_code == 400
+
+    assert client.delete(f"/api/community/comments/{created['id']}", headers=author_headers).status_code == 403
+    assert client.delete(f"/api/community/comments/{created['id']}", headers=admin_headers).status_code == 200
+    assert comments_count(db, post) == 0
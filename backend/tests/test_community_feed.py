@@ -0,0 +1,115 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import community_feed
+import models
+from community_feed import PageCache, feed_cache, load_feed
+from conftest import auth_headers, make_employee
+
+BASE = datetime(2026, 5, 1, 9, 0, 0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    feed_cache.invalidate()
+    community_feed.comment_cache.invalidate()
+
+
+def make_post(db, author, status="APPROVED", minutes=0, post_id=None, **fields):
+    post = models.CommunityPost(id=post_id or str(uuid.uuid4()), author_id=author.id, author_name=author.username, content="hello",
+                                status=status, likes_count=0, comments_count=0, created_at=BASE + timedelta(minutes=minutes), **fields)
+    db.add(post)
+    db.commit()
+    return post
+
+
+def walk(db, user, limit):
+    ids, cursor = [], None
+    while True:
+        items, cursor = load_feed(db, user.id, cursor=cursor, limit=limit)
+        ids += [item["id"] for item in items]
+        if not cursor: return ids
+
+
+def test_pages_cover_every_post_once_across_ties(db):
+    author, reader = make_employee(db), make_employee(db)
+    posts = [make_post(db, author, minutes=i // 2, post_id=f"p{i}") for i in range(7)] # Pairs share created_at
+    expected = [p.id for p in sorted(posts, key=lambda p: (p.created_at, p.id), reverse=True)]
+    assert walk(db, reader, 2) == expected
+    assert walk(db, reader, 3) == expected
+
+
+def test_own_unapproved_posts_are_merged_in_order(db):
+    author, other = make_employee(db), make_employee(db)
+    make_post(db, other, minutes=0, post_id="approved-old")
+    make_post(db, author, status="PENDING", minutes=1, post_id="mine-pending")
+    make_post(db, other, status="PENDING", minutes=2, post_id="theirs-pending")
+    make_post(db, author, status="REJECTED", minutes=3, post_id="mine-rejected", admin_feedback="Off topic")
+    make_post(db, other, minutes=4, post_id="approved-new")
+
+    assert walk(db, author, 2) == ["approved-new", "mine-rejected", "mine-pending", "approved-old"]
+    assert walk(db, other, 2) == ["approved-new", "theirs-pending", "approved-old"]
+    items, _ = load_feed(db, author.id)
+    rejected = next(i for i in items if i["id"] == "mine-rejected")
+    assert (rejected["is_mine"], rejected["admin_feedback"]) == (True, "Off topic")
+
+
+def test_feedback_is_only_shown_to_the_author(db):
+    author, reader = make_employee(db), make_employee(db)
+    make_post(db, author, post_id="p", admin_feedback="internal note")
+    item = load_feed(db, reader.id)[0][0]
+    assert (item["is_mine"], item["admin_feedback"]) == (False, None)
+
+
+def test_is_liked_is_per_user(db):
+    author, fan, reader = make_employee(db), make_employee(db), make_employee(db)
+    make_post(db, author, post_id="liked")
+    make_post(db, author, minutes=1, post_id="not-liked")
+    db.add(models.CommunityLike(post_id="liked", user_id=fan.id))
+    db.commit()
+    assert {i["id"]: i["is_liked"] for i in load_feed(db, fan.id)[0]} == {"liked": True, "not-liked": False}
+    assert not any(i["is_liked"] for i in load_feed(db, reader.id)[0])
+
+
+def test_page_cache_ignores_pages_read_before_an_invalidation(monkeypatch):
+    cache = PageCache(ttl=60, max_pages=2)
+    generation = cache.generation
+    cache.invalidate() # A write committed while the page was being read
+    cache.put("k", ["stale"], generation)
+    assert cache.get("k") is None
+
+    for key in "abc": cache.put(key, [key], cache.generation)
+    assert cache.get("a") is None and cache.get("c") == ["c"] # LRU keeps max_pages
+
+    clock = [1000.0]
+    monkeypatch.setattr(community_feed.time, "monotonic", lambda: clock[0])
+    cache.put("t", ["t"], cache.generation)
+    clock[0] += 61
+    assert cache.get("t") is None
+
+
+def test_moderation_invalidates_the_shared_page(client, db):
+    author = make_employee(db)
+    make_employee(db, "Rohit", role="ADMIN")
+    reader = make_employee(db)
+    post = make_post(db, author, status="PENDING")
+    headers = auth_headers(client, reader.username)
+    assert client.get("/api/community/posts", headers=headers).json() == [] # Cached empty page
+
+    client.post(f"/api/admin/community/{post.id}/approve", headers=auth_headers(client, "Rohit"))
+    assert [p["id"] for p in client.get("/api/community/posts", headers=headers).json()] == [post.id]
+    client.post(f"/api/admin/community/{post.id}/reject", json={"reason": "spam"}, headers=auth_headers(client, "Rohit"))
+    assert client.get("/api/community/posts", headers=headers).json() == []
+
+
+def test_feed_endpoint_cursor_header(client, db):
+    author = make_employee(db)
+    for i in range(3): make_post(db, author, minutes=i, post_id=f"p{i}")
+    headers = auth_headers(client, author.username)
+    first = client.get("/api/community/posts", params={"limit": 2}, headers=headers)
+    assert [p["id"] for p in first.json()] == ["p2", "p1"]
+    rest = client.get("/api/community/posts", params={"limit": 2, "cursor": first.headers["x-next-cursor"]}, headers=headers)
+    assert [p["id"] for p in rest.json()] == ["p0"] and "x-next-cursor" not in rest.headers
+    assert client.get("/api/community/posts", params={"cursor": "nope"}, headers=headers).status_code == 400
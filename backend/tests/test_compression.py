@@ -0,0 +1,107 @@
+import asyncio
+import gzip
+import json
+import zlib
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+from pydantic import BaseModel
+
+import compression
+import fast_json
+from compression import CompressionMiddleware, choose_encoding
+from conftest import make_employee
+
+BIG = json.dumps([{"id": i, "name": "Paracetamol 500mg"} for i in range(200)]).encode()
+
+
+def run(app, accept="gzip", method="GET"):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "path": "/", "headers": [(b"accept-encoding", accept.encode())]}
+    asyncio.run(CompressionMiddleware(app)(scope, receive, send))
+    return dict(sent[0]["headers"]), sent[0]["status"], [m.get("body", b"") for m in sent[1:]]
+
+
+def single(body, content_type=b"application/json", status=200, extra=()):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()), *extra]})
+        await send({"type": "http.response.body", "body": body})
+    return app
+
+
+def test_choose_encoding():
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("") is None
+    assert choose_encoding("br, gzip") == ("br" if compression.brotli else "gzip")
+
+
+def test_large_json_is_gzipped_with_a_weak_etag():
+    headers, status, bodies = run(single(BIG, extra=[(b"etag", b'"abc"'), (b"vary", b"Origin")]))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert gzip.decompress(b"".join(bodies)) == BIG
+    assert int(headers[b"content-length"]) == len(b"".join(bodies)) < len(BIG)
+    assert headers[b"etag"] == b'W/"abc"'
+    assert headers[b"vary"] == b"Origin, Accept-Encoding"
+
+
+@pytest.mark.parametrize("app,accept,method", [
+    (single(b'{"ok":true}'), "gzip", "GET"),                                # Below COMPRESSION_MIN_BYTES
+    (single(BIG, content_type=b"image/png"), "gzip", "GET"),                 # Not a text type
+    (single(BIG, extra=[(b"content-encoding", b"br")]), "gzip", "GET"),     # Already encoded (precompressed static)
+    (single(BIG, status=206), "gzip", "GET"),                                # Partial content
+    (single(BIG), "identity", "GET"),
+    (single(BIG), "gzip", "HEAD"),
+])
+def test_passthrough(app, accept, method):
+    headers, _, bodies = run(app, accept=accept, method=method)
+    assert headers.get(b"content-encoding") in (None, b"br")
+    assert b"".join(bodies) in (BIG, b'{"ok":true}')
+
+
+def test_streamed_chunks_are_flushed_as_they_arrive():
+    lines = [json.dumps({"line": i, "pad": "x" * 50}).encode() + b"\n" for i in range(5)]
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        for line in lines: await send({"type": "http.response.body", "body": line, "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    headers, _, bodies = run(app)
+    assert headers[b"content-encoding"] == b"gzip" and b"content-length" not in headers
+    decoder = zlib.decompressobj(31)
+    for line, chunk in zip(lines, bodies):
+        assert decoder.decompress(chunk) == line # Each line is readable without waiting for the next
+    assert decoder.decompress(b"".join(bodies[len(lines):])) + decoder.flush() == b""
+
+
+def test_api_responses_are_compressed_end_to_end(client, db):
+    for i in range(30): make_employee(db, f"staff_{i:02d}")
+    response = client.get("/api/employees/list", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()) == 30 # httpx decodes it transparently
+    small = client.get("/api/system/config", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+
+
+class Payload(BaseModel):
+    name: str
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_fast_json_encodes_app_types(monkeypatch, use_orjson):
+    if use_orjson: pytest.importorskip("orjson")
+    else: monkeypatch.setattr(fast_json, "orjson", None)
+    content = {"when": datetime(2026, 1, 2, 3, 4, 5), "amount": Decimal("12.50"), "tags": {"a"}, "model": Payload(name="x"), 1: "int key"}
+    decoded = json.loads(fast_json.dumps(content))
+    assert decoded == {"when": "2026-01-02T03:04:05", "amount": 12.5, "tags": ["a"], "model": {"name": "x"}, "1": "int key"}
+    assert json.loads(fast_json.FastJSONResponse({"ok": True}).body) == {"ok": True}
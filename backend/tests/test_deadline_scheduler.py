@@ -0,0 +1,87 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import models
+import deadline_scheduler
+from deadline_scheduler import DeadlineScheduler, acquire_lease, finalize_projects
+from conftest import make_project
+
+
+def test_scheduled_deadline_finalizes_only_due_projects(db):
+    due = make_project(db, deadline=datetime.now() + timedelta(milliseconds=200))
+    later = make_project(db, deadline=datetime.now() + timedelta(hours=1))
+
+    async def run():
+        scheduler = DeadlineScheduler()
+        await scheduler.start()
+        await asyncio.sleep(0.1) # Leadership and the initial heap load
+        assert scheduler.is_leader and scheduler.pending == 2
+        await asyncio.sleep(0.4)
+        pending = scheduler.pending
+        await scheduler.stop()
+        return pending
+
+    assert asyncio.run(run()) == 1
+    db.expire_all()
+    assert db.get(models.Project, due.id).is_finalized
+    assert not db.get(models.Project, later.id).is_finalized
+
+
+def test_schedule_wakes_the_loop_for_an_earlier_deadline(db):
+    project = make_project(db)
+
+    async def run():
+        scheduler = DeadlineScheduler()
+        await scheduler.start()
+        await asyncio.sleep(0.1)
+        deadline = datetime.now() + timedelta(milliseconds=100)
+        db.query(models.Project).filter(models.Project.id == project.id).update({"deadline": deadline})
+        db.commit()
+        scheduler.schedule(project.id, deadline)
+        await asyncio.sleep(0.4)
+        await scheduler.stop()
+
+    asyncio.run(run())
+    db.expire_all()
+    assert db.get(models.Project, project.id).is_finalized
+
+
+def test_failed_finalization_keeps_the_deadlines_for_a_retry(db, monkeypatch):
+    project = make_project(db, deadline=datetime.now() - timedelta(seconds=1))
+    calls = []
+
+    def flaky(project_ids, now):
+        calls.append(list(project_ids))
+        if len(calls) == 1: raise RuntimeError("database is locked")
+        return finalize_projects(project_ids, now)
+
+    monkeypatch.setattr(deadline_scheduler, "finalize_projects", flaky)
+    monkeypatch.setattr(deadline_scheduler, "SCHEDULER_RETRY_SECONDS", 0)
+
+    async def run():
+        scheduler = DeadlineScheduler()
+        scheduler._heap = [(project.deadline, project.id)]
+        await scheduler._fire_due()
+        assert scheduler.pending == 1 # Put back after the failure
+        await scheduler._fire_due()
+        return scheduler.pending
+
+    assert asyncio.run(run()) == 0
+    assert calls == [[project.id], [project.id]]
+    db.expire_all()
+    assert db.get(models.Project, project.id).is_finalized
+
+
+def test_finalize_is_conditional_and_idempotent(db):
+    due = make_project(db, deadline=datetime.now() - timedelta(minutes=1))
+    moved = make_project(db, deadline=datetime.now() + timedelta(hours=2)) # Deadline extended after it was scheduled
+    assert finalize_projects([due.id, moved.id], datetime.now()) == 1
+    assert finalize_projects([due.id, moved.id], datetime.now()) == 0
+
+
+def test_only_one_owner_holds_the_lease(db):
+    assert acquire_lease("test", "a", ttl_seconds=30)
+    assert not acquire_lease("test", "b", ttl_seconds=30)
+    assert acquire_lease("test", "a", ttl_seconds=30) # Renewal
+    assert acquire_lease("expired", "a", ttl_seconds=-1)
+    assert acquire_lease("expired", "b", ttl_seconds=30) # Taken over once expired
@@ -0,0 +1,138 @@
+import csv
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import export_engine
+import models
+from conftest import auth_headers, make_employee, make_project
+from deadline_scheduler import acquire_lease
+from export_engine import ExportError, run_export
+from submission_codec import encode_submission, ensure_default_schema
+
+HOUR_AGO = datetime.now() - timedelta(hours=1)
+
+
+@pytest.fixture(autouse=True)
+def export_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(export_engine, "EXPORT_DIR", str(tmp_path / "exports"))
+    return tmp_path / "exports"
+
+
+def approved_project(db, worker, completed_at=HOUR_AGO, labelled=2, images=3, project_id=None):
+    ensure_default_schema()
+    project = make_project(db, assignee=worker, images=images, project_id=project_id, is_finalized=True, is_approved=True,
+                           status="COMPLETED", completed_at=completed_at)
+    for image in db.query(models.Image).filter(models.Image.project_id == project.id).order_by(models.Image.sequence_index).limit(labelled):
+        schema_id, blob = encode_submission(db, project.id, {"label": f"{project.id}-{image.sequence_index}"})
+        db.add(models.Assignment(id=str(uuid.uuid4()), user_id=worker.id, image_id=image.id, schema_id=schema_id, submission_blob=blob))
+    db.commit()
+    return project
+
+
+def read_jsonl(run):
+    run_dir = os.path.join(export_engine.EXPORT_DIR, run["name"], run["id"])
+    rows = []
+    for name in run["files"]:
+        with open(os.path.join(run_dir, name)) as f:
+            rows += [json.loads(line) for line in f]
+    return rows
+
+
+def test_incremental_runs_export_each_project_once(db):
+    worker = make_employee(db)
+    approved_project(db, worker, HOUR_AGO - timedelta(minutes=5), project_id="A")
+    approved_project(db, worker, HOUR_AGO, project_id="B")
+    make_project(db, assignee=worker, project_id="OPEN") # Not approved: never exported
+
+    first = run_export(workers=1)
+    assert (first["projects"], first["rows"]) == (2, 4) # Unlabelled images are left out
+    assert first["watermark"]["project_id"] == "B"
+    assert [r["data"]["label"] for r in read_jsonl(first)] == ["A-1", "A-2", "B-1", "B-2"]
+    assert read_jsonl(first)[0]["annotator_id"] == worker.id
+
+    second = run_export(workers=1)
+    assert (second["projects"], second["rows"], second["files"]) == (0, 0, [])
+    assert second["watermark"] == first["watermark"] # An empty run keeps the watermark
+
+    approved_project(db, worker, HOUR_AGO, project_id="C") # Same completed_at as B: ordered by id after it
+    third = run_export(workers=1)
+    assert [r["project_id"] for r in read_jsonl(third)] == ["C", "C"]
+    assert run_export(workers=1, full=True)["projects"] == 3
+
+
+def test_recent_approvals_wait_for_the_settle_window(db):
+    worker = make_employee(db)
+    approved_project(db, worker, datetime.now(), project_id="FRESH")
+    assert run_export(workers=1)["projects"] == 0
+    assert run_export(workers=1)["watermark"] is None # Nothing passed, so FRESH is still ahead of the watermark
+
+
+def test_streams_keep_separate_watermarks(db):
+    worker = make_employee(db)
+    approved_project(db, worker, project_id="A")
+    assert run_export(workers=1, name="nightly")["projects"] == 1
+    assert run_export(workers=1, name="adhoc")["projects"] == 1
+    assert run_export(workers=1, fmt="csv", name="nightly")["projects"] == 1
+
+
+def test_shards_and_csv(db, monkeypatch):
+    monkeypatch.setattr(export_engine, "EXPORT_SHARD_PROJECTS", 2)
+    worker = make_employee(db)
+    for i in range(5): approved_project(db, worker, HOUR_AGO + timedelta(seconds=i), labelled=1, project_id=f"P{i}")
+    run = run_export(fmt="csv", workers=1)
+    assert run["files"] == ["part-00000.csv", "part-00001.csv", "part-00002.csv"]
+    run_dir = os.path.join(export_engine.EXPORT_DIR, "default", run["id"])
+    with open(os.path.join(run_dir, "part-00000.csv"), newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert list(rows[0]) == export_engine.EXPORT_COLUMNS
+    assert [json.loads(r["data"])["label"] for r in rows] == ["P0-1", "P1-1"]
+    with open(os.path.join(run_dir, "manifest.json")) as f:
+        assert json.load(f)["rows"] == 5
+
+
+def test_failed_run_does_not_advance_the_watermark(db, monkeypatch, export_dir):
+    worker = make_employee(db)
+    approved_project(db, worker, project_id="A")
+    real_shard = export_engine.export_shard
+
+    def broken(*args):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(export_engine, "export_shard", broken)
+    with pytest.raises(OSError):
+        run_export(workers=1)
+    failed = db.query(models.DatasetExport).one()
+    assert (failed.status, failed.error, failed.watermark_project_id) == ("FAILED", "disk full", None)
+    assert not os.path.exists(os.path.join(export_dir, "default", failed.id))
+
+    monkeypatch.setattr(export_engine, "export_shard", real_shard)
+    assert run_export(workers=1)["projects"] == 1 # Redone by the next run
+
+
+def test_overlapping_runs_and_bad_formats_are_refused(db):
+    acquire_lease("export:default:jsonl", "someone-else", 60)
+    with pytest.raises(ExportError, match="already running"):
+        run_export(workers=1)
+    with pytest.raises(ExportError, match="Unknown export format"):
+        run_export(fmt="xlsx")
+
+
+def test_export_endpoints(client, db):
+    make_employee(db, "Rohit", role="ADMIN")
+    headers = auth_headers(client, "Rohit")
+    assert client.post("/api/admin/exports", json={"format": "xlsx"}, headers=headers).status_code == 400
+    job = client.post("/api/admin/exports", json={"format": "jsonl", "name": "nightly"}, headers=headers).json()
+    assert job["status"] == "QUEUED"
+
+    worker = make_employee(db)
+    approved_project(db, worker, project_id="A")
+    run = run_export(workers=1)
+    listed = client.get("/api/admin/exports", headers=headers).json()
+    assert [r["id"] for r in listed] == [run["id"]]
+    download = client.get(f"/api/admin/exports/{run['id']}/files/part-00000.jsonl", headers=headers)
+    assert [json.loads(line)["project_id"] for line in download.text.splitlines()] == ["A", "A"]
+    assert client.get(f"/api/admin/exports/{run['id']}/files/..%2Fsecret", headers=headers).status_code == 404
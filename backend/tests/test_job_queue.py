@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import models
+import job_queue
+from job_queue import enqueue_job, claim_next_job, execute_job, requeue_stale_jobs, job_handler, PRIORITY_HIGH, PRIORITY_LOW
+
+
+@job_handler("test_echo")
+def _echo(db, payload):
+    return {"echo": payload["value"]}
+
+
+@job_handler("test_fail")
+def _fail(db, payload):
+    db.add(models.Announcement(title="written before the failure", content=""))
+    db.flush()
+    raise RuntimeError("boom")
+
+
+def run_next(db, worker="test-worker"):
+    job = claim_next_job(db, worker)
+    if job: execute_job(db, job)
+    return job
+
+
+def test_idempotency_key_returns_the_existing_job(db):
+    first = enqueue_job(db, "test_echo", {"value": 1}, idempotency_key="once")
+    again = enqueue_job(db, "test_echo", {"value": 2}, idempotency_key="once")
+    assert again.id == first.id
+    assert db.query(models.BackgroundJob).count() == 1
+
+
+def test_claims_by_priority_then_age_and_skips_delayed_jobs(db):
+    low = enqueue_job(db, "test_echo", {"value": "low"}, priority=PRIORITY_LOW)
+    enqueue_job(db, "test_echo", {"value": "later"}, priority=PRIORITY_HIGH, delay_seconds=60)
+    high = enqueue_job(db, "test_echo", {"value": "high"}, priority=PRIORITY_HIGH)
+    assert [run_next(db).id, run_next(db).id, run_next(db)] == [high.id, low.id, None]
+    db.refresh(high)
+    assert (high.status, job_queue.serialize_job(high)["result"]) == ("SUCCEEDED", {"echo": "high"})
+
+
+def test_failure_rolls_back_handler_writes_and_retries_with_backoff(db, monkeypatch):
+    monkeypatch.setattr(job_queue, "backoff_seconds", lambda attempts: 0)
+    job = enqueue_job(db, "test_fail", max_attempts=2)
+    run_next(db)
+    db.refresh(job)
+    assert (job.status, job.attempts, job.last_error) == ("QUEUED", 1, "boom")
+    assert db.query(models.Announcement).count() == 0
+    run_next(db)
+    db.refresh(job)
+    assert (job.status, job.attempts) == ("FAILED", 2)
+    assert run_next(db) is None
+
+
+def test_backoff_grows_exponentially_and_is_capped(monkeypatch):
+    monkeypatch.setattr(job_queue.random, "uniform", lambda a, b: 1.0)
+    assert [job_queue.backoff_seconds(n) for n in (1, 2, 3)] == [2, 4, 8]
+    assert job_queue.backoff_seconds(50) == job_queue.JOB_BACKOFF_MAX_SECONDS
+
+
+def test_jobs_of_a_dead_worker_are_requeued(db):
+    job = enqueue_job(db, "test_echo", {"value": 1})
+    claim_next_job(db, "dead-worker")
+    db.query(models.BackgroundJob).update({"locked_at": datetime.now() - timedelta(seconds=job_queue.JOB_LOCK_TIMEOUT_SECONDS + 1)})
+    db.commit()
+    assert requeue_stale_jobs(db) == 1
+    assert run_next(db).id == job.id
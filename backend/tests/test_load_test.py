@@ -0,0 +1,56 @@
+import os
+import sys
+
+from conftest import BACKEND_DIR
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, "benchmarks"))
+from load_test import Recorder, compare, percentile
+from seed import BENCH_PASSWORD, seed_database
+
+
+def test_percentile():
+    assert percentile([], 0.95) == 0.0
+    ordered = [float(i) for i in range(1, 101)]
+    assert percentile(ordered, 0.50) == 51.0
+    assert percentile(ordered, 0.99) == 100.0
+    assert percentile(ordered, 1.0) == 100.0
+
+
+def test_report_counts_errors_and_queries():
+    recorder = Recorder()
+    for ms, status, queries in [(10, 200, 3), (20, 200, 5), (30, 500, None), (40, 0, None)]:
+        recorder.add("GET /x", ms, status, queries)
+    report = recorder.report(duration=2.0)
+    endpoint = report["endpoints"]["GET /x"]
+    assert report["total_requests"] == 4 and report["throughput_rps"] == 2.0
+    assert endpoint["errors"] == 2
+    assert endpoint["queries_per_request"] == 4.0
+    assert endpoint["p50_ms"] == 30
+
+
+def _report(p95, queries):
+    return {"endpoints": {"GET /x": {"p95_ms": p95, "throughput_rps": 10.0, "queries_per_request": queries}}}
+
+
+def test_compare_flags_latency_and_query_regressions():
+    baseline = _report(100.0, 3.0)
+    assert compare(_report(110.0, 3.4), baseline, tolerance=0.15)["regressions"] == []
+    regressions = compare(_report(120.0, 4.0), baseline, tolerance=0.15)["regressions"]
+    assert regressions == ["GET /x: p95 100.0ms -> 120.0ms", "GET /x: queries/request 3.0 -> 4.0"]
+
+
+def test_compare_ignores_endpoints_missing_from_the_baseline():
+    comparison = compare(_report(500.0, None), {"endpoints": {}}, tolerance=0.15)
+    assert comparison == {"tolerance": 0.15, "endpoints": {}, "regressions": []}
+
+
+def test_seeded_users_have_work_to_do(engine, client):
+    rows = seed_database(employees=2, projects_per_employee=2, history_per_employee=1, images_per_project=4,
+                         completion=0.5, ledger_per_employee=3, seed=1)
+    assert rows == {"employees": 2, "projects": 6, "images": 24, "assignments": 4 * 2 + 2 * 2 * 2, "wallet_transactions": 6}
+
+    login = client.post("/auth/login", json={"username": "bench_00000", "password": BENCH_PASSWORD}).json()
+    headers = {"Authorization": f"Bearer {login['access_token']}"}
+    projects = client.get(f"/api/projects/available/{login['user_id']}", headers=headers).json()
+    # The load test only works projects the available endpoint reports as IN PROGRESS
+    assert sum(1 for p in projects if p["status"] == "IN PROGRESS") == 2
@@ -0,0 +1,72 @@
+import json
+import logging
+import queue
+import sys
+
+import logging_setup
+from logging_setup import JsonFormatter, NonBlockingQueueHandler, RequestIdFilter, SizeAndTimeRotatingFileHandler, request_id_var
+
+
+def _record(msg="hello %s", args=("world",), **extra):
+    record = logging.LogRecord("test", logging.INFO, __file__, 1, msg, args, None)
+    record.__dict__.update(extra)
+    return record
+
+
+def test_full_queue_drops_instead_of_blocking(monkeypatch):
+    monkeypatch.setattr(NonBlockingQueueHandler, "dropped", 0)
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    for i in range(5):
+        handler.handle(_record(args=(i,)))
+    assert handler.queue.qsize() == 2
+    assert NonBlockingQueueHandler.dropped == 3
+
+
+def test_records_are_rendered_before_queueing():
+    handler = NonBlockingQueueHandler(queue.Queue())
+    items = ["first"]
+    try:
+        raise ValueError("boom")
+    except ValueError:
+        record = logging.LogRecord("test", logging.ERROR, __file__, 1, "items=%s", (items,), sys.exc_info())
+    handler.handle(record)
+    items.append("mutated later")
+    queued = handler.queue.get_nowait()
+    assert queued.getMessage() == "items=['first']"
+    assert queued.exc_info is None and "ValueError: boom" in queued.exc_text
+
+
+def test_json_lines_carry_request_id_and_fields():
+    token = request_id_var.set("req-123")
+    try:
+        record = _record(fields={"status": 200, "path": "/x"})
+        RequestIdFilter().filter(record)
+    finally:
+        request_id_var.reset(token)
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["msg"] == "hello world"
+    assert entry["request_id"] == "req-123"
+    assert (entry["status"], entry["path"]) == (200, "/x")
+    assert "request_id" not in json.loads(JsonFormatter().format(_record()))
+
+
+def test_file_rotates_on_interval(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(logging_setup.time, "time", lambda: clock[0])
+    handler = SizeAndTimeRotatingFileHandler(str(tmp_path / "app.log"), backupCount=2, interval_seconds=60)
+    handler.setFormatter(JsonFormatter())
+    try:
+        handler.emit(_record(args=("one",)))
+        clock[0] += 61
+        handler.emit(_record(args=("two",)))
+    finally:
+        handler.close()
+    assert "one" in (tmp_path / "app.log.1").read_text()
+    assert "two" in (tmp_path / "app.log").read_text()
+
+
+def test_request_id_is_echoed_or_generated(client):
+    response = client.get("/api/system/config", headers={"X-Request-ID": "abc-1"})
+    assert response.headers["x-request-id"] == "abc-1"
+    generated = client.get("/api/system/config").headers["x-request-id"]
+    assert len(generated) == 16 and generated != "abc-1"
@@ -0,0 +1,129 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine, text
+
+import main
+import metrics
+from conftest import auth_headers, make_employee
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch):
+    """Metrics created by a test register into a throwaway registry."""
+    monkeypatch.setattr(metrics, "REGISTRY", [])
+    return metrics.REGISTRY
+
+
+def _hammer(target, threads=8, per_thread=5000):
+    barrier = threading.Barrier(threads)
+
+    def work():
+        barrier.wait()
+        for _ in range(per_thread): target()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for w in workers: w.start()
+    for w in workers: w.join()
+    return threads * per_thread
+
+
+def test_concurrent_increments_are_not_lost():
+    counter = metrics.Counter("test_total", "test", ("kind",))
+    expected = _hammer(lambda: counter.inc(kind="a"))
+    assert counter.values == {("a",): expected}
+
+
+def test_concurrent_gauge_moves_and_observations_are_exact():
+    gauge = metrics.Gauge("test_inflight", "test")
+    histogram = metrics.Histogram("test_seconds", "test", buckets=(1.0,))
+
+    def step():
+        gauge.inc()
+        gauge.dec()
+        histogram.observe(0.5)
+
+    expected = _hammer(step)
+    assert gauge.values == {(): 0}
+    assert histogram.series == {(): [expected, 0, expected * 0.5]}
+
+
+def test_dead_thread_shards_are_folded_into_retired():
+    counter = metrics.Counter("test_total", "test")
+    for _ in range(5):
+        worker = threading.Thread(target=lambda: counter.inc(2))
+        worker.start()
+        worker.join()
+    counter.inc()
+    assert counter.values == {(): 11}
+    # Only this thread's shard is still tracked; the exited workers' counts live on in _retired
+    assert [thread for thread, _ in counter._shards] == [threading.current_thread()]
+    assert counter._retired == {(): 10}
+    assert counter.values == {(): 11}
+
+
+def test_gauge_set_and_callback():
+    gauge = metrics.Gauge("test_gauge", "test", ("pool",))
+    gauge.set(3, pool="a")
+    gauge.set(4, pool="a")
+    assert gauge.values == {("a",): 4}
+    assert metrics.Gauge("test_cb", "test", func=lambda: 7).samples() == ["test_cb 7.0"]
+    assert metrics.Gauge("test_broken", "test", func=lambda: 1 / 0).samples() == []
+
+
+def test_histogram_renders_cumulative_buckets(registry):
+    histogram = metrics.Histogram("test_seconds", "Test latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, route="/x")
+    text_format = metrics.render_metrics()
+    assert "# TYPE test_seconds histogram" in text_format
+    assert 'test_seconds_bucket{route="/x",le="0.1"} 1' in text_format
+    assert 'test_seconds_bucket{route="/x",le="1.0"} 3' in text_format
+    assert 'test_seconds_bucket{route="/x",le="+Inf"} 4' in text_format
+    assert 'test_seconds_sum{route="/x"} 4.05' in text_format
+    assert 'test_seconds_count{route="/x"} 4' in text_format
+
+
+def test_pool_wait_is_measured(tmp_path, monkeypatch):
+    wait = metrics.Histogram("test_pool_wait", "test", buckets=(0.1,))
+    monkeypatch.setattr(metrics, "db_pool_wait", wait)
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}", pool_size=1, max_overflow=0, pool_timeout=5)
+    metrics.install_pool_metrics(engine)
+
+    held = engine.connect()
+    releaser = threading.Timer(0.3, held.close)
+    releaser.start()
+    with engine.connect() as conn: # Blocks until the timer hands the only connection back
+        conn.execute(text("SELECT 1"))
+    releaser.join()
+    fast, slow, total = wait.series[()]
+    assert (fast, slow) == (1, 1) # The first checkout was immediate, the second waited
+    assert total >= 0.25
+
+    # dispose() replaces the pool; the new one is timed as well
+    engine.dispose()
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert sum(wait.series[()][:-1]) == 3
+    engine.dispose()
+
+
+def test_metrics_requires_an_admin_without_a_token(client, db, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", None)
+    employee = make_employee(db)
+    make_employee(db, "Rohit", role="ADMIN")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+    assert client.get("/metrics", headers=auth_headers(client, employee.username)).status_code == 403
+    response = client.get("/metrics", headers=auth_headers(client, "Rohit"))
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+
+def test_metrics_accepts_the_configured_token(client, db, monkeypatch):
+    monkeypatch.setattr(main, "METRICS_TOKEN", "scrape-secret")
+    make_employee(db, "Rohit", role="ADMIN")
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+    # With a token configured, an admin session is not a substitute for it
+    assert client.get("/metrics", headers=auth_headers(client, "Rohit")).status_code == 401
@@ -0,0 +1,87 @@
+import uuid
+
+import models
+import job_handlers # noqa: F401 (registers the handlers)
+from job_queue import claim_next_job, execute_job
+from job_handlers import run_project_payout
+from conftest import make_employee, make_project, auth_headers
+
+
+def label(db, project, user, count):
+    images = db.query(models.Image).filter(models.Image.project_id == project.id).order_by(models.Image.sequence_index).limit(count).all()
+    for image in images:
+        db.add(models.Assignment(id=str(uuid.uuid4()), user_id=user.id, image_id=image.id))
+    db.commit()
+
+
+def run_jobs(db):
+    while (job := claim_next_job(db, "test-worker")):
+        execute_job(db, job)
+
+
+def balance(db, user):
+    db.expire_all()
+    return db.get(models.Employee, user.id).wallet_balance
+
+
+def test_approval_is_queued_and_the_job_reports_the_payout(db, client):
+    admin, worker = make_employee(db, role="ADMIN"), make_employee(db)
+    project = make_project(db, worker, images=3, salary_per_completion=2.0, security_amount=5.0, is_finalized=True, status="SUBMITTED")
+    label(db, project, worker, 3)
+    headers = auth_headers(client, admin.username)
+
+    queued = client.post("/api/admin/approve-project", json={"project_id": project.id}, headers=headers).json()
+    assert queued["payout"] is None and queued["job_status"] == "QUEUED"
+    assert client.get(f"/api/admin/jobs/{queued['job_id']}", headers=headers).json()["status"] == "QUEUED"
+
+    run_jobs(db)
+    job = client.get(f"/api/admin/jobs/{queued['job_id']}", headers=headers).json()
+    assert job["status"] == "SUCCEEDED" and job["result"]["payout"] == 11.0
+    assert balance(db, worker) == 11.0
+    assert client.post("/api/admin/approve-project", json={"project_id": project.id}, headers=headers).json() == {"message": "Already approved", "payout": 11.0}
+
+
+def test_only_projects_awaiting_review_can_be_approved(db, client):
+    admin, worker = make_employee(db, role="ADMIN"), make_employee(db)
+    open_project = make_project(db, worker)
+    rejected = make_project(db, worker, is_finalized=True, status="REJECTED")
+    headers = auth_headers(client, admin.username)
+    for project in (open_project, rejected):
+        assert client.post("/api/admin/approve-project", json={"project_id": project.id}, headers=headers).status_code == 409
+
+
+def test_reapproval_after_rejection_pays_only_the_difference(db, client):
+    admin, worker = make_employee(db, role="ADMIN"), make_employee(db)
+    project = make_project(db, worker, images=4, salary_per_completion=2.0, security_amount=5.0, is_finalized=True, status="SUBMITTED")
+    label(db, project, worker, 2)
+    admin_headers, worker_headers = auth_headers(client, admin.username), auth_headers(client, worker.username)
+    client.post("/api/admin/approve-project", json={"project_id": project.id}, headers=admin_headers)
+    run_jobs(db)
+    assert balance(db, worker) == 9.0
+
+    client.post("/api/admin/reject-project", json={"project_id": project.id, "reason": "fix labels"}, headers=admin_headers)
+    label_rest = db.query(models.Image).filter(models.Image.project_id == project.id, models.Image.sequence_index > 2).all()
+    for image in label_rest: db.add(models.Assignment(id=str(uuid.uuid4()), user_id=worker.id, image_id=image.id))
+    db.commit()
+    client.post("/api/projects/finalize", json={"employee_id": worker.id, "project_id": project.id}, headers=worker_headers)
+    second = client.post("/api/admin/approve-project", json={"project_id": project.id}, headers=admin_headers).json()
+    assert second["job_id"] # A new review round gets a new payout job
+    run_jobs(db)
+    assert balance(db, worker) == 13.0 # 4 images x 2 + 5 security, of which 9 was already paid
+
+
+def test_stale_payout_jobs_are_skipped_with_their_reason(db):
+    worker = make_employee(db)
+    project = make_project(db, worker, is_finalized=True, status="REJECTED", review_round=1)
+    result = run_project_payout(db, {"project_id": project.id, "review_round": 0})
+    assert result["skipped"] == "project was rejected after approval"
+
+    project.status, project.is_finalized = "IN_PROGRESS", False
+    db.commit()
+    assert run_project_payout(db, {"project_id": project.id, "review_round": 1})["skipped"] == "project is not finalized"
+
+    project.status, project.is_finalized = "SUBMITTED", True
+    db.commit()
+    result = run_project_payout(db, {"project_id": project.id, "review_round": 0})
+    assert result["skipped"] == "approval was for review round 0, project is on round 1"
+    assert balance(db, worker) == 0
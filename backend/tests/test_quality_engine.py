@@ -0,0 +1,154 @@
+import uuid
+
+import models
+import job_handlers # noqa: F401 (registers the handlers)
+from job_handlers import run_project_payout
+from job_queue import claim_next_job, execute_job
+from quality_engine import canonical, score_project, annotator_quality_summary
+from submission_codec import encode_submission, save_project_schema
+from conftest import make_employee, make_project, auth_headers
+
+
+def label_project(db, assignee=None, images=4):
+    """A project whose form has a single "label" field, so per-annotator scores cover just that field."""
+    project = make_project(db, assignee, images=images)
+    save_project_schema(db, project.id, {"fields": [{"name": "label", "type": "string"}]})
+    return project
+
+
+def project_images(db, project):
+    return db.query(models.Image).filter(models.Image.project_id == project.id).order_by(models.Image.sequence_index).all()
+
+
+def annotate(db, project, user, labels):
+    """One assignment per image in sequence order; None skips the image."""
+    for image, value in zip(project_images(db, project), labels):
+        if value is None: continue
+        schema_id, blob = encode_submission(db, project.id, {"label": value})
+        db.add(models.Assignment(id=str(uuid.uuid4()), user_id=user.id, image_id=image.id, schema_id=schema_id, submission_blob=blob))
+    db.commit()
+
+
+def set_gold(db, project, labels):
+    for image, value in zip(project_images(db, project), labels):
+        if value is None: continue
+        image.gold_schema_id, image.gold_blob = encode_submission(db, project.id, {"label": value})
+    db.commit()
+
+
+def field_row(result, field="label"):
+    return next(r for r in result["fields"] if r["field"] == field)
+
+
+def test_canonical_folds_case_spaces_and_record_order():
+    assert canonical("  Jane   DOE ") == canonical("jane doe")
+    assert canonical([{"name": "B", "dose": "1"}, {"name": "a", "dose": "2"}]) == canonical([{"dose": "2", "name": "A"}, {"name": "b", "dose": "1"}])
+    assert canonical("jane") != canonical("jane doe")
+
+
+def test_fleiss_kappa_agreement_and_gold_accuracy(db):
+    u1, u2 = make_employee(db), make_employee(db)
+    project = label_project(db, u1)
+    annotate(db, project, u1, ["x", "x", "y", "y"])
+    annotate(db, project, u2, ["X ", "y", "y", "y"]) # Formatting differences still agree
+    set_gold(db, project, ["x", "x", None, None])
+
+    result = score_project(db, project.id)
+    db.commit()
+    assert (result["annotations"], result["gold_images"]) == (8, 2)
+    row = field_row(result)
+    # p_o = 3/4; category shares x = 3/8, y = 5/8 give p_e = 34/64
+    assert (row["items"], row["agreement"], row["kappa"], row["unanimous"]) == (4, 0.75, round((0.75 - 34 / 64) / (1 - 34 / 64), 4), 0.75)
+    assert (row["gold_items"], row["gold_accuracy"]) == (4, 0.75)
+
+    stored = db.query(models.AnnotatorQuality).filter(models.AnnotatorQuality.project_id == project.id).all()
+    by_user = {q.user_id: q for q in stored}
+    assert set(by_user) == {u1.id, u2.id}
+    assert by_user[u1.id].gold_accuracy == 1.0 and by_user[u2.id].gold_accuracy == 0.5
+    assert db.query(models.FieldAgreement).filter(models.FieldAgreement.project_id == project.id, models.FieldAgreement.field == "label").one().kappa == row["kappa"]
+
+
+def test_images_with_one_annotation_do_not_count_towards_agreement(db):
+    u1, u2 = make_employee(db), make_employee(db)
+    project = label_project(db, u1, images=3)
+    annotate(db, project, u1, ["a", "b", "c"])
+    annotate(db, project, u2, ["a", None, None])
+
+    row = field_row(score_project(db, project.id))
+    assert (row["items"], row["agreement"], row["unanimous"]) == (1, 1.0, 1.0)
+    assert row["gold_accuracy"] is None
+
+
+def test_rescoring_replaces_the_stored_rows(db):
+    u1, u2 = make_employee(db), make_employee(db)
+    project = label_project(db, u1, images=2)
+    annotate(db, project, u1, ["a", "b"])
+    annotate(db, project, u2, ["a", "c"])
+    score_project(db, project.id)
+    db.commit()
+    db.query(models.Assignment).filter(models.Assignment.user_id == u2.id).delete()
+    db.commit()
+
+    score_project(db, project.id)
+    db.commit()
+    assert [q.user_id for q in db.query(models.AnnotatorQuality).filter(models.AnnotatorQuality.project_id == project.id)] == [u1.id]
+    assert db.query(models.FieldAgreement).filter(models.FieldAgreement.field == "label").one().items == 0
+
+
+def test_summary_is_weighted_by_items_across_projects(db):
+    for row in [("P1", 4, 1.0, 2, 0.5), ("P2", 1, 0.0, 0, None)]:
+        project_id, items, agreement, gold_items, gold_accuracy = row
+        make_project(db, images=0, project_id=project_id)
+        db.add(models.AnnotatorQuality(project_id=project_id, user_id="u1", items=items, agreement=agreement, gold_items=gold_items, gold_accuracy=gold_accuracy))
+    db.commit()
+
+    assert annotator_quality_summary(db, "u1") == {"compared_items": 5, "agreement": 0.8, "gold_items": 2, "gold_accuracy": 0.5}
+    assert annotator_quality_summary(db, "nobody") == {"compared_items": 0, "agreement": None, "gold_items": 0, "gold_accuracy": None}
+
+
+def test_payout_counts_only_the_assignees_labels_and_pays_co_annotators(db):
+    worker, co = make_employee(db), make_employee(db)
+    project = make_project(db, worker, images=4, salary_per_completion=2.0, security_amount=5.0, is_finalized=True, status="SUBMITTED")
+    db.add(models.ProjectAnnotator(project_id=project.id, user_id=co.id))
+    images = project_images(db, project)
+    for user, labelled in [(worker, images[:2]), (co, images[1:])]:
+        for image in labelled: db.add(models.Assignment(id=str(uuid.uuid4()), user_id=user.id, image_id=image.id))
+    db.commit()
+
+    result = run_project_payout(db, {"project_id": project.id, "review_round": 0})
+    db.commit()
+    # The co-annotator's three labels must not be paid to the assignee as well
+    assert result["payout"] == 2 * 2.0 + 5.0
+    assert result["co_annotator_payouts"] == {co.id: 6.0}
+    db.expire_all()
+    assert (db.get(models.Employee, worker.id).wallet_balance, db.get(models.Employee, co.id).wallet_balance) == (9.0, 6.0)
+    assert db.query(models.WalletTransaction).filter(models.WalletTransaction.employee_id == co.id).one().description == f"Project {project.id} approved (co-annotation)"
+
+
+def test_annotator_endpoints_and_quality_job(db, client):
+    admin, worker, co = make_employee(db, role="ADMIN"), make_employee(db), make_employee(db)
+    project = label_project(db, worker, images=2)
+    headers = auth_headers(client, admin.username)
+    base = f"/api/admin/projects/{project.id}/annotators"
+
+    assert client.post(base, json={"employee_id": worker.id}, headers=headers).status_code == 400
+    assert client.post(base, json={"employee_id": co.id}, headers=headers).status_code == 200
+    assert client.post(base, json={"employee_id": co.id}, headers=headers).status_code == 400
+    annotate(db, project, worker, ["a", "b"])
+    annotate(db, project, co, ["a", "c"])
+    listed = client.get(base, headers=headers).json()
+    assert [(a["employee_id"], a["role"], a["completed"]) for a in listed] == [(worker.id, "ASSIGNEE", 2), (co.id, "CO_ANNOTATOR", 2)]
+    roles = {p["id"]: p["role"] for p in client.get(f"/api/projects/available/{co.id}", headers=auth_headers(client, co.username)).json()}
+    assert roles == {project.id: "CO_ANNOTATOR"}
+
+    image = project_images(db, project)[1]
+    assert client.put(f"/api/admin/images/{image.id}/gold", json={"form_data": {"label": "c"}}, headers=headers).status_code == 200
+    assert client.post(f"/api/admin/projects/{project.id}/quality", headers=headers).status_code == 200
+    while (job := claim_next_job(db, "test-worker")): execute_job(db, job)
+    quality = client.get(f"/api/admin/projects/{project.id}/quality", headers=headers).json()
+    label_row = next(f for f in quality["fields"] if f["field"] == "label")
+    assert (label_row["items"], label_row["agreement"], label_row["gold_accuracy"]) == (2, 0.5, 0.5)
+    assert {a["employee_id"]: a["gold_accuracy"] for a in quality["annotators"]} == {worker.id: 0.0, co.id: 1.0}
+
+    assert client.delete(f"{base}/{co.id}", headers=headers).status_code == 200
+    assert client.delete(f"{base}/{co.id}", headers=headers).status_code == 404
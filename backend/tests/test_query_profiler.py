@@ -0,0 +1,113 @@
+import asyncio
+import logging
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import query_profiler
+from query_profiler import QueryProfilerMiddleware, QueryStats, install_query_listeners
+from conftest import auth_headers, make_employee
+
+
+@pytest.fixture
+def stats(engine):
+    install_query_listeners(engine)
+    stats = QueryStats()
+    token = query_profiler._current_stats.set(stats)
+    yield stats
+    query_profiler._current_stats.reset(token)
+
+
+def test_listeners_install_once(engine, stats):
+    install_query_listeners(engine)
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    assert stats.count == 1
+
+
+def test_failed_statement_does_not_skew_the_next_timing(engine, stats, monkeypatch):
+    clock = iter([10.0, 20.0, 20.5])
+    monkeypatch.setattr(query_profiler.time, "perf_counter", lambda: next(clock))
+    with engine.connect() as conn:
+        with pytest.raises(OperationalError):
+            conn.execute(text("SELECT * FROM no_such_table"))
+        conn.execute(text("SELECT 1"))
+        # Nothing from the failed statement is left behind on the pooled connection
+        assert not any(isinstance(v, list) and v for v in conn.info.values())
+    # The failed statement started at 10.0 but never finished; the next one ran from 20.0 to 20.5
+    assert stats.count == 1
+    assert stats.db_time == pytest.approx(0.5)
+    assert stats.statements == [(pytest.approx(0.5), "SELECT 1")]
+
+
+def test_statements_are_bounded_and_sorted(monkeypatch):
+    monkeypatch.setattr(query_profiler, "PROFILER_MAX_STATEMENTS", 3)
+    stats = QueryStats()
+    for i, duration in enumerate([0.1, 0.4, 0.2, 0.9]):
+        stats.add(duration, f"q{i}")
+    assert stats.count == 4
+    assert stats.db_time == pytest.approx(1.6)
+    assert [sql for _, sql in stats.statements] == ["q0", "q1", "q2"]
+    assert [sql for _, sql in stats.slowest(2)] == ["q1", "q2"]
+
+
+def _run_middleware(app, path="/x"):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "headers": []}
+    asyncio.run(QueryProfilerMiddleware(app)(scope, receive, send))
+    return sent
+
+
+def test_middleware_adds_server_timing_and_logs(engine, caplog):
+    install_query_listeners(engine)
+
+    async def app(scope, receive, send):
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    with caplog.at_level(logging.INFO, logger="query_profiler"):
+        sent = _run_middleware(app)
+    headers = dict(sent[0]["headers"])
+    assert b'desc="2 queries"' in headers[b"server-timing"]
+    record = caplog.records[-1].fields
+    assert record["event"] == "request"
+    assert (record["status"], record["queries"]) == (201, 2)
+    assert query_profiler.current_stats() is None
+
+
+def test_middleware_logs_statements_over_budget(engine, caplog, monkeypatch):
+    install_query_listeners(engine)
+    monkeypatch.setattr(query_profiler, "QUERY_BUDGET", 1)
+
+    async def app(scope, receive, send):
+        with engine.connect() as conn:
+            for i in range(3):
+                conn.execute(text(f"SELECT {i}"))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    with caplog.at_level(logging.INFO, logger="query_profiler"):
+        _run_middleware(app)
+    record = caplog.records[-1]
+    assert record.levelno == logging.WARNING
+    assert record.fields["event"] == "request_over_budget"
+    assert [s["sql"] for s in record.fields["statements"]] == ["SELECT 0", "SELECT 1", "SELECT 2"]
+
+
+def test_request_reports_its_query_count(client, engine, db):
+    install_query_listeners(engine)
+    user = make_employee(db)
+    response = client.get(f"/api/employees/me/{user.id}", headers=auth_headers(client, user.username))
+    assert response.status_code == 200
+    db_timing = response.headers["server-timing"].split(",")[0]
+    assert db_timing.startswith("db;dur=") and 'desc="0 queries"' not in db_timing
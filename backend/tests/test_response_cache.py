@@ -0,0 +1,91 @@
+import time
+
+import response_cache as rc
+from conftest import auth_headers, make_employee
+from response_cache import CachedResponse, ResponseCache, etag_matches, weak_etag
+
+
+def _entry(tags=(), ttl=60):
+    return CachedResponse(time.monotonic() + ttl, weak_etag(b"x"), [], b"x", tuple(tags))
+
+
+def test_etag_matching():
+    etag = weak_etag(b"body")
+    assert etag.startswith('W/"') and etag == weak_etag(b"body") != weak_etag(b"other")
+    assert etag_matches(etag, etag)
+    assert etag_matches(etag[2:], etag) # Strong form of the same opaque tag
+    assert etag_matches(f'"nope", {etag}', etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches('W/"nope"', etag)
+
+
+def test_tag_invalidation_and_generation_guard():
+    cache = ResponseCache(max_entries=10)
+    cache.put("a", _entry(("config",)), cache.generation)
+    cache.put("b", _entry(("user:1", "gamification")), cache.generation)
+    cache.invalidate("user:1")
+    assert cache.get("b") is None and cache.get("a") is not None
+    assert "gamification" not in cache._tags # Emptied tag sets are dropped
+
+    generation = cache.generation
+    cache.invalidate("config") # A write landed while "c" was being rendered
+    cache.put("c", _entry(("config",)), generation)
+    assert cache.get("c") is None
+
+
+def test_lru_bound_and_ttl():
+    cache = ResponseCache(max_entries=2)
+    for key in "abc": cache.put(key, _entry(("t",)), cache.generation)
+    assert cache.get("a") is None and cache.get("c") is not None
+    assert cache._tags["t"] == {"b", "c"}
+    cache.put("old", _entry(ttl=-1), cache.generation)
+    assert cache.get("old") is None and "old" not in cache._entries
+
+
+def test_hits_skip_the_route_and_revalidate_with_304(client, db):
+    make_employee(db, "Rohit", role="ADMIN", address="Old Street")
+    first = client.get("/api/system/config")
+    assert first.headers["x-cache"] == "MISS" and first.headers["cache-control"] == "no-cache"
+    etag = first.headers["etag"]
+
+    second = client.get("/api/system/config")
+    assert second.headers["x-cache"] == "HIT" and second.json() == first.json()
+    assert 'desc="0 queries"' in second.headers["server-timing"]
+
+    not_modified = client.get("/api/system/config", headers={"If-None-Match": etag})
+    assert (not_modified.status_code, not_modified.content) == (304, b"")
+
+
+def test_writes_invalidate_their_tags(client, db):
+    make_employee(db, "Rohit", role="ADMIN", full_name="Old Brand")
+    etag = client.get("/api/system/config").headers["etag"]
+    client.post("/api/admin/update-profile", json={"full_name": "New Brand", "mobile": "1", "address": "Here"}, headers=auth_headers(client, "Rohit"))
+    fresh = client.get("/api/system/config", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200 and fresh.json()["brand_name"] == "New Brand"
+    assert fresh.headers["etag"] != etag
+
+
+def test_per_user_entries_are_keyed_by_token_subject(client, db):
+    alice = make_employee(db, "alice", level=2)
+    bob = make_employee(db, "bob", level=5)
+    alice_headers, bob_headers = auth_headers(client, "alice"), auth_headers(client, "bob")
+    assert client.get("/api/gamification/status", headers=alice_headers).json()["level"] == 2
+    bob_view = client.get("/api/gamification/status", headers=bob_headers)
+    assert bob_view.json()["level"] == 5 and bob_view.headers["cache-control"] == "private, no-cache"
+    assert client.get("/api/gamification/status", headers=alice_headers).headers["x-cache"] == "HIT"
+    # No valid token: not cacheable, the route's own auth answers
+    anonymous = client.get("/api/gamification/status", headers={"Authorization": "Bearer junk"})
+    assert anonymous.status_code == 401 and "x-cache" not in anonymous.headers
+
+
+def test_cache_hits_keep_cors_headers(client, db):
+    origin = {"Origin": "https://example.com"}
+    assert client.get("/api/system/config", headers=origin).headers["x-cache"] == "MISS"
+    hit = client.get("/api/system/config", headers=origin)
+    assert hit.headers["x-cache"] == "HIT"
+    assert "access-control-allow-origin" in hit.headers
+
+
+def test_disabled_cache_passes_through(client, db, monkeypatch):
+    monkeypatch.setattr(rc, "RESPONSE_CACHE_ENABLED", False)
+    assert "x-cache" not in client.get("/api/system/config").headers
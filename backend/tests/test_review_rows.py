@@ -0,0 +1,81 @@
+import json
+import uuid
+
+import pytest
+
+import models
+import submission_codec
+from conftest import auth_headers, make_employee, make_project
+from submission_codec import decode_review_cursor, encode_review_cursor, encode_submission, ensure_default_schema, load_review_rows
+
+
+@pytest.fixture
+def batch(db):
+    """Five images (two sharing a sequence index): the assignee labelled 1 and 3, a co-annotator labelled 2."""
+    ensure_default_schema()
+    worker, other = make_employee(db), make_employee(db)
+    project = make_project(db, assignee=worker, images=4)
+    db.add(models.Image(id="zz-duplicate-seq", project_id=project.id, storage_url="/static/x.jpg", sequence_index=2))
+    db.commit()
+    images = db.query(models.Image).filter(models.Image.project_id == project.id).order_by(models.Image.sequence_index, models.Image.id).all()
+
+    def submit(user, image, label):
+        schema_id, blob = encode_submission(db, project.id, {"label": label})
+        db.add(models.Assignment(id=str(uuid.uuid4()), user_id=user.id, image_id=image.id, schema_id=schema_id, submission_blob=blob))
+
+    submit(worker, images[0], "first")
+    submit(other, images[1], "not the assignee's")
+    submit(worker, images[3], "third")
+    db.add(models.Assignment(id=str(uuid.uuid4()), user_id=worker.id, image_id=images[4].id, submission_data=json.dumps({"legacy": True})))
+    db.commit()
+    return project, worker, [img.id for img in images]
+
+
+def test_rows_join_only_the_assignees_submission(db, batch):
+    project, worker, image_ids = batch
+    rows = load_review_rows(db, project.id, worker.id)
+    assert [r["image_id"] for r in rows] == image_ids
+    assert [r["sequence"] for r in rows] == [1, 2, 2, 3, 4]
+    assert [r["data"].get("label") for r in rows] == ["first", None, None, "third", None]
+    assert [r["status"] for r in rows] == ["SUBMITTED", "PENDING", "PENDING", "SUBMITTED", "SUBMITTED"]
+    assert rows[4]["data"] == {"legacy": True}
+
+
+def test_keyset_pages_cover_rows_sharing_a_sequence(db, batch):
+    project, worker, image_ids = batch
+    seen, after = [], None
+    while True:
+        page = load_review_rows(db, project.id, worker.id, after=after, limit=2)
+        if not page: break
+        seen += [r["image_id"] for r in page]
+        after = (page[-1]["sequence"], page[-1]["image_id"])
+    assert seen == image_ids
+
+
+def test_review_cursor():
+    assert decode_review_cursor(encode_review_cursor(7, "img|with|pipes")) == (7, "img|with|pipes")
+    for bad in ("7", "x|img", "7|"):
+        with pytest.raises(ValueError):
+            decode_review_cursor(bad)
+
+
+def test_endpoint_pages_and_streams(client, db, batch, monkeypatch):
+    project, _, image_ids = batch
+    make_employee(db, "Rohit", role="ADMIN")
+    headers = auth_headers(client, "Rohit")
+    url = f"/api/admin/project-submissions/{project.id}"
+
+    assert [r["image_id"] for r in client.get(url, headers=headers).json()] == image_ids
+    first = client.get(url, params={"limit": 3}, headers=headers)
+    rest = client.get(url, params={"limit": 3, "cursor": first.headers["x-next-cursor"]}, headers=headers)
+    assert [r["image_id"] for r in first.json() + rest.json()] == image_ids
+    assert "x-next-cursor" not in rest.headers
+    assert client.get(url, params={"cursor": "nope"}, headers=headers).status_code == 400
+    assert client.get("/api/admin/project-submissions/missing", headers=headers).status_code == 404
+
+    monkeypatch.setattr(submission_codec, "REVIEW_STREAM_CHUNK", 2) # Several chunks, one session each
+    streamed = client.get(url, headers={**headers, "Accept": "application/x-ndjson"})
+    assert streamed.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [r["image_id"] for r in lines] == image_ids
+    assert lines[0]["data"]["label"] == "first"
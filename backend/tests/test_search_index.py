@@ -0,0 +1,106 @@
+import uuid
+
+from sqlalchemy import text
+
+import models
+import search_index
+from conftest import auth_headers, make_employee
+from fts_index import ensure_fts_table, to_match_query
+from search_index import ensure_search_indexes, search
+
+
+def _contact(db, name, message=""):
+    contact = models.Contact(id=str(uuid.uuid4()), name=name, email=f"{name.split()[0].lower()}@example.com", message=message)
+    db.add(contact)
+    db.commit()
+    return contact
+
+
+def _hits(db, q, **kwargs):
+    return [(item["type"], item["id"]) for item in search(db, q, **kwargs)["items"]]
+
+
+def test_to_match_query():
+    assert to_match_query("ramesh kum") == '"ramesh" "kum"*'
+    assert to_match_query('a"; DROP TABLE x --') == '"a" "DROP" "TABLE" "x"*'
+    assert to_match_query("  ?! ") == ""
+
+
+def test_indexes_existing_rows_and_follow_changes(db):
+    ramesh = make_employee(db, "ramesh_k", full_name="Ramesh Kumar")
+    ensure_search_indexes() # Built over the rows already there
+    assert _hits(db, "ramesh") == [("employee", ramesh.id)]
+
+    sunita = make_employee(db, "sunita_r", full_name="Sunita Rao")
+    assert _hits(db, "sunita") == [("employee", sunita.id)]
+    sunita.full_name = "Sunita Verma"
+    db.commit()
+    assert _hits(db, "rao") == [] and _hits(db, "verma") == [("employee", sunita.id)]
+    db.delete(sunita)
+    db.commit()
+    assert _hits(db, "sunita") == []
+
+
+def test_hits_survive_rowids_being_renumbered(db, engine):
+    ensure_search_indexes()
+    first = _contact(db, "Alpha Person", "first lead")
+    second = _contact(db, "Beta Person", "second lead")
+    # VACUUM may renumber the implicit rowid of tables without an INTEGER PRIMARY KEY; do it explicitly
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE contacts SET rowid = CASE id WHEN :a THEN 2000 ELSE 1000 END"), {"a": first.id})
+    assert _hits(db, "alpha") == [("contact", first.id)]
+    assert _hits(db, "beta") == [("contact", second.id)]
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.exec_driver_sql("VACUUM")
+    assert _hits(db, "alpha") == [("contact", first.id)]
+
+
+def test_old_rowid_layout_is_migrated(db, engine):
+    employee = make_employee(db, "legacy_user", full_name="Legacy Person")
+    columns = list(search_index.SEARCH_SOURCES["employee"]["columns"])
+    # The layout before the fix: external content joined on the implicit rowid
+    ensure_fts_table("employees_fts", "employees", columns, content_rowid="rowid")
+    ensure_search_indexes()
+    with engine.connect() as conn:
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'employees_fts'")).scalar()
+    assert "id UNINDEXED" in sql
+    assert _hits(db, "legacy") == [("employee", employee.id)]
+
+
+def test_index_is_rebuilt_when_the_source_is_recreated(db, engine):
+    ensure_search_indexes()
+    # What setup_database.py does: drop and recreate the table (its triggers go with it) and refill it
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP TABLE contacts")
+    models.Contact.__table__.create(bind=engine)
+    fresh = _contact(db, "Fresh Lead")
+    ensure_search_indexes()
+    assert _hits(db, "fresh") == [("contact", fresh.id)]
+    later = _contact(db, "Later Lead")
+    assert _hits(db, "later") == [("contact", later.id)]
+
+
+def test_search_pages_across_types(db):
+    ensure_search_indexes()
+    employee = make_employee(db, "kiran_p", full_name="Kiran Patel")
+    contact = _contact(db, "Kiran Shah")
+    assert set(_hits(db, "kiran")) == {("employee", employee.id), ("contact", contact.id)}
+    assert _hits(db, "kiran", types=["contact"]) == [("contact", contact.id)]
+    first = search(db, "kiran", limit=1)
+    second = search(db, "kiran", limit=1, offset=first["next_offset"])
+    assert first["next_offset"] == 1 and second["next_offset"] is None
+    assert {first["items"][0]["id"], second["items"][0]["id"]} == {employee.id, contact.id}
+
+
+def test_staff_and_lead_lists_search_and_page(client, db):
+    for i in range(5): make_employee(db, f"worker_{i}", full_name=f"Worker {i}")
+    make_employee(db, "ramesh_k", full_name="Ramesh Kumar")
+    make_employee(db, "Rohit", role="ADMIN")
+    _contact(db, "Ramesh Lead")
+    ensure_search_indexes()
+
+    assert [u["username"] for u in client.get("/api/employees/list", params={"q": "ramesh"}).json()] == ["ramesh_k"]
+    page = client.get("/api/employees/list", params={"limit": 4, "offset": 4}).json()
+    assert len(page) == 2 and "Rohit" not in [u["username"] for u in page]
+    contacts = client.get("/api/admin/contacts", params={"q": "ramesh"}, headers=auth_headers(client, "Rohit")).json()
+    assert [c["name"] for c in contacts] == ["Ramesh Lead"]
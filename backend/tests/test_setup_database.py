@@ -0,0 +1,71 @@
+import sqlite3
+import sys
+
+import pytest
+
+import setup_database
+
+SMALL = ["--employees", "30", "--projects", "40", "--images-per-batch", "2:4", "--ledger-per-employee", "5",
+         "--posts", "20", "--audit-logs", "50", "--days", "10"]
+
+
+def _generate(tmp_path, monkeypatch, name="synthetic.db", extra=()):
+    db_file = str(tmp_path / name)
+    monkeypatch.setattr(setup_database, "TIMESTAMP_POOL_SIZE", 1024) # The full pool takes seconds to format
+    monkeypatch.setattr(sys, "argv", ["setup_database.py", "--db", db_file, "--generate", *SMALL, *extra])
+    setup_database.main()
+    return sqlite3.connect(db_file)
+
+
+def _count(conn, table):
+    return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+@pytest.fixture
+def generated(tmp_path, monkeypatch, capsys):
+    conn = _generate(tmp_path, monkeypatch)
+    yield conn, capsys.readouterr().out
+    conn.close()
+
+
+def test_generate_reports_the_rows_it_wrote(generated):
+    conn, out = generated
+    assert "Error during setup" not in out
+    assert _count(conn, "employees") == 30 + 3 # Plus the seeded admins and Vipin
+    assert _count(conn, "projects") == 40
+    for table in ("images", "assignments", "wallet_transactions", "community_posts", "support_messages", "audit_logs"):
+        count = _count(conn, table)
+        assert count > 0
+        assert f"{table:<22}{count:>12,}" in out
+
+
+def test_generated_rows_are_consistent(generated):
+    conn, _ = generated
+    assert conn.execute("SELECT COUNT(*) FROM images WHERE sequence_index NOT BETWEEN 1 AND 4").fetchone()[0] == 0
+    # Denormalized counters and balances agree with the rows they summarize
+    assert conn.execute("""SELECT COUNT(*) FROM community_posts p
+        WHERE likes_count != (SELECT COUNT(*) FROM community_likes l WHERE l.post_id = p.id)""").fetchone()[0] == 0
+    assert conn.execute("""SELECT COUNT(*) FROM employees e WHERE e.username LIKE 'user%'
+        AND ABS(e.wallet_balance - (SELECT COALESCE(SUM(amount), 0) FROM wallet_transactions w WHERE w.employee_id = e.id)) > 0.001""").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM employees WHERE wallet_balance < 0").fetchone()[0] == 0
+    # Only assigned projects have submissions, all owned by the assignee
+    assert conn.execute("""SELECT COUNT(*) FROM assignments a JOIN images i ON i.id = a.image_id JOIN projects p ON p.id = i.project_id
+        WHERE p.assigned_to_id IS NULL OR p.assigned_to_id != a.user_id""").fetchone()[0] == 0
+
+
+def test_same_seed_gives_the_same_rows(tmp_path, monkeypatch):
+    first = _generate(tmp_path, monkeypatch, "a.db")
+    second = _generate(tmp_path, monkeypatch, "b.db")
+    third = _generate(tmp_path, monkeypatch, "c.db", extra=("--seed", "7"))
+    query = "SELECT id, assigned_to_id, status FROM projects ORDER BY id"
+    assert first.execute(query).fetchall() == second.execute(query).fetchall()
+    assert first.execute(query).fetchall() != third.execute(query).fetchall()
+    for conn in (first, second, third): conn.close()
+
+
+def test_submissions_decode_with_the_default_schema(generated):
+    from submission_codec import DEFAULT_FORM_DEFINITION, FormSchema
+    conn, _ = generated
+    form = FormSchema(1, DEFAULT_FORM_DEFINITION)
+    for (blob,) in conn.execute("SELECT submission_blob FROM assignments LIMIT 20"):
+        assert form.decode(blob)["name"].startswith("Patient ")
@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import pytest
+
+import models
+import speed_tracker
+from speed_tracker import LogHistogram, SpeedTracker
+from conftest import make_employee, make_project, auth_headers
+
+
+def test_log_histogram_quantiles_are_within_bucket_error():
+    sketch = LogHistogram()
+    for seconds in range(1, 1001): sketch.add(float(seconds))
+    assert sketch.quantile(0.5) == pytest.approx(500, rel=0.02)
+    assert sketch.quantile(0.99) == pytest.approx(990, rel=0.02)
+    assert sketch.rank(250) == pytest.approx(0.25, abs=0.02)
+
+
+def test_log_histograms_merge_and_round_trip():
+    a, b = LogHistogram(), LogHistogram()
+    a.add(2.0, count=3); b.add(2.0); b.add(40.0)
+    a.merge(b)
+    restored = LogHistogram.from_json(a.to_json())
+    assert restored.total == 5 and restored.counts == a.counts
+
+
+def test_checkpoint_merges_pending_samples_into_the_stored_sketch(db):
+    first, second = SpeedTracker(), SpeedTracker() # Two worker processes
+    first.record(1, 10.0); first.checkpoint()
+    second.record(2, 20.0); second.checkpoint()
+    first.load()
+    assert first.sketches["global"].total == 2
+    assert db.query(models.QuantileSketch.sample_count).filter(models.QuantileSketch.cohort == "global").scalar() == 2
+    assert first.speed_percentile(1, 15.0) == 50 # Level 1 has too few samples, so the global cohort is used
+
+
+def test_failed_checkpoint_keeps_its_samples(db, monkeypatch):
+    tracker = SpeedTracker()
+    tracker.record(1, 5.0)
+    monkeypatch.setattr(speed_tracker.database, "SessionLocal", _failing_session)
+    with pytest.raises(RuntimeError): tracker.checkpoint()
+    assert tracker.pending["global"].total == 1
+
+
+def test_stop_waits_for_a_running_checkpoint_before_the_final_one(db, monkeypatch):
+    tracker = SpeedTracker()
+    running, overlaps = [], []
+    checkpoint = tracker._checkpoint
+
+    def slow_checkpoint():
+        if running: overlaps.append(True)
+        running.append(True)
+        time.sleep(0.2)
+        checkpoint()
+        running.pop()
+
+    monkeypatch.setattr(tracker, "_checkpoint", slow_checkpoint)
+    monkeypatch.setattr(speed_tracker, "SPEED_CHECKPOINT_SECONDS", 0)
+
+    async def run():
+        await tracker.start()
+        await asyncio.sleep(0.05) # The loop's checkpoint is now running on a worker thread
+        await tracker.stop()
+
+    asyncio.run(run())
+    assert not overlaps
+
+
+def test_allocate_times_new_images_only(db, client):
+    worker = make_employee(db)
+    project = make_project(db, worker, images=2)
+    headers = auth_headers(client, worker.username)
+    timers = lambda: db.query(models.WorkTimer).filter(models.WorkTimer.user_id == worker.id).count()
+
+    served = client.post("/work/allocate", json={"employee_id": worker.id, "project_id": project.id}, headers=headers).json()["images"][0]
+    assert timers() == 1
+    client.post("/work/submit", json={"employee_id": worker.id, "image_id": served["id"], "form_data": {"label": "ok"}}, headers=headers)
+    db.expire_all()
+    timer = db.query(models.WorkTimer).filter(models.WorkTimer.image_id == served["id"]).one()
+    assert timer.served_at is None and timer.time_spent_seconds > 0
+
+    # Going back to the submitted image (or reviewing) must not reopen or add a timer
+    client.post("/work/allocate", json={"employee_id": worker.id, "project_id": project.id, "sequence_index": served["sequence"]}, headers=headers)
+    db.expire_all()
+    assert timers() == 1
+    assert db.query(models.WorkTimer.served_at).filter(models.WorkTimer.image_id == served["id"]).scalar() is None
+
+
+class _failing_session:
+    def query(self, *args): raise RuntimeError("database is locked")
+    def rollback(self): pass
+    def close(self): pass
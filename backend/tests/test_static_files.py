@@ -0,0 +1,91 @@
+import gzip
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+import static_files
+from static_files import ContentHashCache, OptimizedStaticFiles, cache_control_for, precompress_static
+
+CSS = ("body { color: #123456; }\n" * 100).encode()
+
+
+@pytest.fixture
+def static_dir(tmp_path):
+    (tmp_path / "css").mkdir()
+    (tmp_path / "css" / "app.css").write_bytes(CSS)
+    batch = tmp_path / "uploads" / "BATCH-abc"
+    batch.mkdir(parents=True)
+    (batch / "1.jpg").write_bytes(bytes(range(256)) * 8)
+    (tmp_path / "uploads" / "kyc").mkdir()
+    (tmp_path / "uploads" / "kyc" / "pan.jpg").write_bytes(b"id document")
+    return tmp_path
+
+
+@pytest.fixture
+def static_client(static_dir, monkeypatch):
+    monkeypatch.setattr(static_files, "content_hashes", ContentHashCache())
+    app = Starlette(routes=[Mount("/static", OptimizedStaticFiles(directory=str(static_dir)))])
+    with TestClient(app) as client:
+        yield client
+
+
+def test_cache_control_per_path():
+    assert cache_control_for("uploads/BATCH-x/3.jpg") == "public, max-age=31536000, immutable"
+    assert cache_control_for("uploads/avatar_1700000000_me.png") == "public, max-age=31536000, immutable"
+    assert cache_control_for("uploads/kyc/aadhar.jpg") == "private, no-cache"
+    assert cache_control_for("css/app.css") == "no-cache"
+
+
+def test_etag_is_a_content_hash(static_client, static_dir):
+    first = static_client.get("/static/uploads/BATCH-abc/1.jpg", headers={"Accept-Encoding": "identity"})
+    assert first.headers["cache-control"] == "public, max-age=31536000, immutable"
+    etag = first.headers["etag"]
+    assert static_client.get("/static/uploads/BATCH-abc/1.jpg", headers={"If-None-Match": etag}).status_code == 304
+
+    # Same bytes rewritten (new mtime): still the same ETag
+    path = static_dir / "uploads" / "BATCH-abc" / "1.jpg"
+    path.write_bytes(path.read_bytes())
+    os.utime(path, ns=(1, 1))
+    assert static_client.get("/static/uploads/BATCH-abc/1.jpg").headers["etag"] == etag
+    path.write_bytes(b"different")
+    assert static_client.get("/static/uploads/BATCH-abc/1.jpg").headers["etag"] != etag
+
+
+def test_private_documents_are_not_shared_cacheable(static_client):
+    assert static_client.get("/static/uploads/kyc/pan.jpg").headers["cache-control"] == "private, no-cache"
+
+
+def test_range_requests(static_client):
+    response = static_client.get("/static/uploads/BATCH-abc/1.jpg", headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == bytes(range(10, 20))
+    assert response.headers["content-range"] == "bytes 10-19/2048"
+
+
+def test_precompressed_variant_is_served_when_accepted(static_client, static_dir):
+    assert precompress_static(str(static_dir)) >= 1
+    assert gzip.decompress((static_dir / "css" / "app.css.gz").read_bytes()) == CSS
+    assert precompress_static(str(static_dir)) == 0 # Up to date
+
+    plain = static_client.get("/static/css/app.css", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers and plain.content == CSS
+    gzipped = static_client.get("/static/css/app.css", headers={"Accept-Encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip" and gzipped.content == CSS
+    assert gzipped.headers["vary"] == "Accept-Encoding"
+    assert gzipped.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+    assert "content-encoding" not in static_client.get("/static/css/app.css", headers={"Accept-Encoding": "gzip;q=0"}).headers
+
+
+def test_stale_variant_is_ignored_and_refreshed(static_client, static_dir):
+    precompress_static(str(static_dir))
+    source = static_dir / "css" / "app.css"
+    source.write_bytes(CSS + b"/* edited */\n" * 100)
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9)) # Newer than the .gz
+    response = static_client.get("/static/css/app.css", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers and response.content.endswith(b"/* edited */\n")
+    assert precompress_static(str(static_dir)) >= 1
+    assert static_client.get("/static/css/app.css", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
@@ -0,0 +1,118 @@
+import json
+
+import msgpack
+import pytest
+
+import models
+from conftest import auth_headers, make_employee, make_project
+from submission_codec import (DEFAULT_FORM_DEFINITION, UI_SAMPLE_SUBMISSIONS, FormSchema, SubmissionError, check_ui_forms,
+                              decode_submission, encode_submission, ensure_default_schema, migrate_legacy_submissions, registry,
+                              save_project_schema)
+
+PRESCRIPTION = {"name": "Jane", "notes": "", "medicines": [{"name": "Paracetamol", "dose": "500mg", "freq": "1-0-1", "days": "5"}]}
+
+RATING_FORM = {"fields": [
+    {"name": "rating", "type": "integer", "min": 1, "max": 5, "required": True},
+    {"name": "legible", "type": "boolean"},
+    {"name": "kind", "type": "enum", "choices": ["rx", "report"]},
+]}
+
+
+def test_round_trip_is_compact():
+    schema = FormSchema(1, DEFAULT_FORM_DEFINITION)
+    blob = schema.encode(PRESCRIPTION)
+    assert schema.decode(blob) == {**PRESCRIPTION, "label": None}
+    assert len(blob) < len(json.dumps(PRESCRIPTION))
+    assert msgpack.unpackb(blob)[2] == [["Paracetamol", "500mg", "1-0-1", "5"]] # Values only, in field order
+
+
+@pytest.mark.parametrize("data,error", [
+    ({"nmae": "typo"}, "Unknown field(s): nmae"),
+    ({"name": 5}, "'name' must be a string"),
+    ({"name": "x" * 201}, "'name' is too long"),
+    ({"medicines": "Paracetamol"}, "'medicines' must be a list"),
+    ({"medicines": [{"name": "A", "colour": "red"}]}, "Unknown field(s): colour"),
+    ({"medicines": [{"days": 5}]}, "'medicines[0].days' must be a string"),
+    ("not a form", "'form' must be an object"),
+])
+def test_default_schema_rejects_malformed_data(data, error):
+    with pytest.raises(SubmissionError) as excinfo:
+        FormSchema(1, DEFAULT_FORM_DEFINITION).encode(data)
+    assert str(excinfo.value) == error
+
+
+def test_typed_fields():
+    schema = FormSchema(2, RATING_FORM)
+    assert schema.decode(schema.encode({"rating": 4, "legible": True, "kind": "rx"})) == {"rating": 4, "legible": True, "kind": "rx"}
+    for data in ({}, {"rating": True}, {"rating": 9}, {"rating": 3, "legible": "yes"}, {"rating": 3, "kind": "xray"}):
+        with pytest.raises(SubmissionError):
+            schema.encode(data)
+
+
+@pytest.mark.parametrize("definition", [
+    {"fields": []},
+    {"fields": [{"name": "a", "type": "string"}, {"name": "a", "type": "string"}]},
+    {"fields": [{"name": "a", "type": "date"}]},
+    {"fields": [{"name": "a", "type": "enum"}]},
+    {"fields": [{"name": "a", "type": "records", "fields": [{"name": "b", "type": "records", "fields": [{"name": "c", "type": "string"}]}]}]},
+])
+def test_malformed_definitions_are_rejected(definition):
+    with pytest.raises(SubmissionError):
+        FormSchema(1, definition)
+
+
+def test_default_schema_accepts_every_ui(db):
+    ensure_default_schema()
+    assert check_ui_forms(db) == {}
+    assert set(UI_SAMPLE_SUBMISSIONS) == {"dashboard.html", "employee_landing.html"}
+
+
+def test_stored_default_without_label_gets_a_new_version(db):
+    old_fields = [f for f in DEFAULT_FORM_DEFINITION["fields"] if f["name"] != "label"]
+    db.add(models.FormSchema(project_id=None, definition=json.dumps({"fields": old_fields})))
+    db.commit()
+    old_id, old_blob = encode_submission(db, None, PRESCRIPTION)
+    assert check_ui_forms(db) == {"employee_landing.html": "Unknown field(s): label"}
+
+    registry.forget()
+    ensure_default_schema()
+    new_id, _ = encode_submission(db, None, {"label": "Jane"})
+    assert new_id != old_id
+    assert decode_submission(db, old_id, old_blob) == PRESCRIPTION # Older rows decode with their own version
+    assert check_ui_forms(db) == {}
+
+
+def test_project_schema_rejecting_a_ui_is_reported(db):
+    ensure_default_schema()
+    project = make_project(db, images=0)
+    save_project_schema(db, project.id, RATING_FORM)
+    failures = check_ui_forms(db, project.id)
+    assert set(failures) == {"dashboard.html", "employee_landing.html"}
+    assert check_ui_forms(db) == {} # The default is untouched
+
+
+def test_landing_page_label_submissions_are_accepted(client, db):
+    worker = make_employee(db)
+    project = make_project(db, assignee=worker, images=1)
+    image = db.query(models.Image).filter(models.Image.project_id == project.id).one()
+    headers = auth_headers(client, worker.username)
+    response = client.post("/work/submit", json={"employee_id": worker.id, "image_id": image.id, "form_data": {"label": "Jane Doe"}}, headers=headers)
+    assert response.status_code == 200
+    saved = client.get(f"/work/get_submission/{worker.id}/{image.id}", headers=headers).json()["data"]
+    assert saved["label"] == "Jane Doe"
+    rejected = client.post("/work/submit", json={"employee_id": worker.id, "image_id": image.id, "form_data": {"lable": "typo"}}, headers=headers)
+    assert (rejected.status_code, rejected.json()["detail"]) == (400, "Unknown field(s): lable")
+
+
+def test_legacy_json_rows_are_migrated_when_they_fit(db):
+    worker = make_employee(db)
+    project = make_project(db, assignee=worker, images=3)
+    images = db.query(models.Image).filter(models.Image.project_id == project.id).order_by(models.Image.sequence_index).all()
+    for image, data in zip(images, [json.dumps(PRESCRIPTION), json.dumps({"free": "text"}), "{broken"]):
+        db.add(models.Assignment(id=f"a-{image.sequence_index}", user_id=worker.id, image_id=image.id, submission_data=data))
+    db.commit()
+    assert migrate_legacy_submissions(batch=2) == {"converted": 1, "skipped": 2}
+    rows = {a.id: a for a in db.query(models.Assignment)}
+    assert decode_submission(db, rows["a-1"].schema_id, rows["a-1"].submission_blob, rows["a-1"].submission_data) == {**PRESCRIPTION, "label": None}
+    assert decode_submission(db, None, None, rows["a-2"].submission_data) == {"free": "text"} # Still readable as JSON
+    assert decode_submission(db, None, None, rows["a-3"].submission_data) == {}
@@ -0,0 +1,73 @@
+import sqlite3
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect
+
+import models
+from conftest import make_employee, auth_headers
+
+
+def add_messages(db, user, timestamps):
+    for i, ts in enumerate(timestamps):
+        db.add(models.SupportMessage(id=str(uuid.uuid4()), user_id=user.id, message=f"m{i}", timestamp=ts, is_read=False, is_from_admin=False))
+    db.commit()
+
+
+def test_pages_do_not_skip_or_repeat_messages_sharing_a_timestamp(db, client):
+    user = make_employee(db)
+    flush = datetime(2026, 1, 1, 10, 0, 0, 123456) # One group commit: five messages, one timestamp
+    add_messages(db, user, [flush] * 5 + [flush + timedelta(seconds=1), flush + timedelta(seconds=2)])
+    headers = auth_headers(client, user.username)
+
+    page = client.get("/api/support/my-history", params={"limit": 2}, headers=headers).json()
+    backward = page
+    while page:
+        page = client.get("/api/support/my-history", params={"limit": 2, "before": page[0]["cursor"]}, headers=headers).json()
+        backward = page + backward
+    assert sorted(m["content"] for m in backward) == [f"m{i}" for i in range(7)]
+
+    page = client.get("/api/support/my-history", params={"limit": 1, "before": backward[1]["cursor"]}, headers=headers).json()
+    forward = page
+    while page:
+        page = client.get("/api/support/my-history", params={"limit": 2, "since": page[-1]["cursor"]}, headers=headers).json()
+        forward += page
+    assert [m["id"] for m in forward] == [m["id"] for m in backward]
+
+
+def test_cursor_compares_against_timestamps_stored_without_microseconds(db, client):
+    user = make_employee(db)
+    add_messages(db, user, [datetime(2026, 1, 1, 10, 0, 0)] * 3) # How CURRENT_TIMESTAMP rows are stored
+    headers = auth_headers(client, user.username)
+    first = client.get("/api/support/my-history", params={"limit": 1}, headers=headers).json()
+    older = client.get("/api/support/my-history", params={"before": first[0]["cursor"]}, headers=headers).json()
+    assert len(older) == 2 and first[0]["id"] not in {m["id"] for m in older}
+
+
+def test_bare_timestamp_and_invalid_cursors(db, client):
+    user = make_employee(db)
+    add_messages(db, user, [datetime(2026, 1, 1, 10, 0, 0, 1), datetime(2026, 1, 1, 11, 0, 0, 1)])
+    headers = auth_headers(client, user.username)
+    newer = client.get("/api/support/my-history", params={"since": "2026-01-01T10:30:00"}, headers=headers).json()
+    assert [m["content"] for m in newer] == ["m1"]
+    assert client.get("/api/support/my-history", params={"since": "yesterday"}, headers=headers).status_code == 400
+
+
+def test_migration_adds_listed_columns_with_defaults_to_an_old_schema(tmp_path):
+    import main
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE projects (id TEXT PRIMARY KEY, is_finalized BOOLEAN, deadline TIMESTAMP, is_approved BOOLEAN, completed_at TIMESTAMP)")
+    conn.execute("INSERT INTO projects (id) VALUES ('P1')")
+    conn.commit(); conn.close()
+    old = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=old) # Creates the missing tables, leaves projects alone
+    main.migrate_schema(old)
+    main.migrate_schema(old) # Idempotent on every boot
+
+    columns = {c["name"] for c in inspect(old).get_columns("projects")}
+    assert {"review_round", "auto_assign", "assigned_at", "split_from_id"} <= columns
+    with old.connect() as c:
+        assert c.exec_driver_sql("SELECT review_round, auto_assign FROM projects").fetchone() == (0, 0)
+    assert "ix_projects_open_deadline" in {i["name"] for i in inspect(old).get_indexes("projects")}
+    old.dispose()